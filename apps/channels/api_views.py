@@ -56,6 +56,7 @@ import django_filters
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from apps.epg.models import EPGData
+from apps.output.cache import invalidate_output_cache
 from apps.vod.models import Movie, Series
 from django.db.models import Q
 from django.http import StreamingHttpResponse, FileResponse, Http404
@@ -551,6 +552,7 @@ class ChannelViewSet(viewsets.ModelViewSet):
                     fields=list(validated_updates[0][1].keys()),
                     batch_size=100
                 )
+                invalidate_output_cache()  # bulk_update doesn't send signals
 
         # Return the updated objects (already in memory)
         serialized_channels = ChannelSerializer(
@@ -704,6 +706,7 @@ class ChannelViewSet(viewsets.ModelViewSet):
             for channel_id in channel_ids:
                 Channel.objects.filter(id=channel_id).update(channel_number=channel_num)
                 channel_num = channel_num + 1
+            invalidate_output_cache()
 
         return Response(
             {"message": "Channels have been auto-assigned!"}, status=status.HTTP_200_OK
@@ -865,6 +868,7 @@ class ChannelViewSet(viewsets.ModelViewSet):
                     ChannelProfileMembership(channel_profile=profile, channel=channel, enabled=True)
                     for profile in profiles
                 ])
+        invalidate_output_cache()
 
         # Send WebSocket notification for single channel creation
         from core.utils import send_websocket_update
@@ -1726,6 +1730,7 @@ class BulkUpdateChannelMembershipAPIView(APIView):
                     membership_dict[channel_id].enabled = enabled_status
 
             ChannelProfileMembership.objects.bulk_update(memberships, ["enabled"])
+            invalidate_output_cache()
 
             return Response({"status": "success"}, status=status.HTTP_200_OK)
 
@@ -17,6 +17,116 @@ logger = logging.getLogger(__name__)
 from apps.m3u.models import M3UAccount
 
 
+# Reserve the first (stream, M3U profile) candidate with a free connection slot in one
+# atomic call. KEYS[1] is the channel_stream key; ARGV is the mode followed by
+# stream_id, profile_id, max_streams triples in priority order.
+#
+# "new" returns the channel's active stream if it already has one. "switch" moves the
+# channel's existing slot to the chosen candidate, counting the channel's own slot as
+# free on its current profile. "check" (or "switch" for a channel that isn't streaming)
+# only finds the first candidate with capacity without reserving it. "probe" takes a
+# connection on the first candidate with capacity without mapping it to a channel, for
+# short-lived test connections that are given back with release_profile_slot.
+# Returns {stream_id, profile_id, reserved} or an empty list when every profile is full.
+RESERVE_STREAM_SLOT_SCRIPT = """
+local mode = ARGV[1]
+local current = false
+local current_profile = false
+if #KEYS > 0 then
+    current = redis.call('GET', KEYS[1])
+end
+if current then
+    current_profile = redis.call('GET', 'stream_profile:' .. current)
+end
+
+if mode == 'new' and current_profile then
+    return {current, current_profile, 0}
+end
+
+for i = 2, #ARGV, 3 do
+    local stream_id, profile_id, max_streams = ARGV[i], ARGV[i + 1], tonumber(ARGV[i + 2])
+    local connections_key = 'profile_connections:' .. profile_id
+    local connections = tonumber(redis.call('GET', connections_key) or '0')
+    if current_profile == profile_id then
+        connections = connections - 1
+    end
+
+    if max_streams == 0 or connections < max_streams then
+        if mode == 'check' or (mode == 'switch' and not current) then
+            return {stream_id, profile_id, 0}
+        end
+
+        if mode == 'probe' then
+            if max_streams == 0 then
+                return {stream_id, profile_id, 0}
+            end
+            redis.call('INCR', connections_key)
+            return {stream_id, profile_id, 1}
+        end
+
+        if current_profile then
+            redis.call('DEL', 'stream_profile:' .. current)
+            local old_key = 'profile_connections:' .. current_profile
+            if tonumber(redis.call('GET', old_key) or '0') > 0 then
+                redis.call('DECR', old_key)
+            end
+        end
+
+        redis.call('SET', KEYS[1], stream_id)
+        redis.call('SET', 'stream_profile:' .. stream_id, profile_id)
+        if max_streams > 0 then
+            redis.call('INCR', connections_key)
+        end
+        return {stream_id, profile_id, 1}
+    end
+end
+
+return {}
+"""
+
+
+def reserve_stream_slot(redis_client, channel_id, candidates, mode="new"):
+    """
+    Atomically reserve a connection slot for a channel.
+
+    Args:
+        redis_client: Redis client
+        channel_id: Channel primary key, or None in "check" mode
+        candidates: Ordered (stream_id, profile_id, max_streams) tuples
+        mode: "new", "switch", "check" or "probe", see RESERVE_STREAM_SLOT_SCRIPT
+
+    Returns:
+        Optional[Tuple[int, int, bool]]: (stream_id, profile_id, reserved), or None if all profiles are full
+    """
+    args = [mode]
+    for stream_id, profile_id, max_streams in candidates:
+        args.extend([stream_id, profile_id, max_streams])
+
+    keys = [f"channel_stream:{channel_id}"] if channel_id is not None else []
+    script = redis_client.register_script(RESERVE_STREAM_SLOT_SCRIPT)
+    result = script(keys=keys, args=args)
+    if not result:
+        return None
+
+    stream_id, profile_id, reserved = result
+    return int(stream_id), int(profile_id), bool(reserved)
+
+
+RELEASE_PROFILE_SLOT_SCRIPT = """
+local connections = tonumber(redis.call('GET', KEYS[1]) or '0')
+if connections > 0 then
+    return redis.call('DECR', KEYS[1])
+end
+return 0
+"""
+
+
+def release_profile_slot(redis_client, profile_id):
+    """Atomically release a connection slot reserved in "probe" mode"""
+    script = redis_client.register_script(RELEASE_PROFILE_SLOT_SCRIPT)
+    return script(keys=[f"profile_connections:{profile_id}"])
+
+
 # Add fallback functions if Redis isn't available
 def get_total_viewers(channel_id):
     """Get viewer count from Redis or return 0 if Redis isn't available"""
@@ -356,39 +466,24 @@ class Channel(models.Model):
         Returns:
             Tuple[Optional[int], Optional[int], Optional[str]]: (stream_id, profile_id, error_reason)
         """
-        redis_client = RedisClient.get_client()
-        error_reason = None
+        from .tune_plan import get_tune_plan, reserve_from_plan
 
-        # Check if this channel has any streams
-        if not self.streams.exists():
-            error_reason = "No streams assigned to channel"
-            return None, None, error_reason
+        # Candidates come from the cached tune plan, so this is Redis work only
+        return reserve_from_plan(get_tune_plan(self.uuid, channel=self))
 
-        # Check if a stream is already active for this channel
-        stream_id_bytes = redis_client.get(f"channel_stream:{self.id}")
-        if stream_id_bytes:
-            try:
-                stream_id = int(stream_id_bytes)
-                profile_id_bytes = redis_client.get(f"stream_profile:{stream_id}")
-                if profile_id_bytes:
-                    try:
-                        profile_id = int(profile_id_bytes)
-                        return stream_id, profile_id, None
-                    except (ValueError, TypeError):
-                        logger.debug(
-                            f"Invalid profile ID retrieved from Redis: {profile_id_bytes}"
-                        )
-            except (ValueError, TypeError):
-                logger.debug(
-                    f"Invalid stream ID retrieved from Redis: {stream_id_bytes}"
-                )
-
-        # No existing active stream, attempt to assign a new one
-        has_streams_but_maxed_out = False
-        has_active_profiles = False
-
-        # Iterate through channel streams and their profiles
-        for stream in self.streams.all().order_by("channelstream__order"):
+    def get_stream_candidates(self):
+        """
+        List the (stream, M3U profile) options for this channel in priority order.
+
+        Streams follow the channel order and each stream's active profiles start with the
+        default one. Streams without an active M3U account or default profile are skipped.
+        """
+        streams = self.streams.select_related(
+            "m3u_account", "m3u_account__user_agent"
+        ).prefetch_related("m3u_account__profiles")
+
+        candidates = []
+        for stream in streams.order_by("channelstream__order"):
             # Retrieve the M3U account associated with the stream.
             m3u_account = stream.m3u_account
             if not m3u_account:
@@ -398,7 +493,7 @@ class Channel(models.Model):
                 logger.debug(f"M3U account {m3u_account.id} is inactive, skipping.")
                 continue
 
-            m3u_profiles = m3u_account.profiles.filter(is_active=True)
+            m3u_profiles = [obj for obj in m3u_account.profiles.all() if obj.is_active]
             default_profile = next(
                 (obj for obj in m3u_profiles if obj.is_default), None
             )
@@ -410,49 +505,9 @@ class Channel(models.Model):
             profiles = [default_profile] + [
                 obj for obj in m3u_profiles if not obj.is_default
             ]
+            candidates.extend((stream, profile) for profile in profiles)
 
-            for profile in profiles:
-                has_active_profiles = True
-
-                profile_connections_key = f"profile_connections:{profile.id}"
-                current_connections = int(
-                    redis_client.get(profile_connections_key) or 0
-                )
-
-                # Check if profile has available slots (or unlimited connections)
-                if (
-                    profile.max_streams == 0
-                    or current_connections < profile.max_streams
-                ):
-                    # Start a new stream
-                    redis_client.set(f"channel_stream:{self.id}", stream.id)
-                    redis_client.set(f"stream_profile:{stream.id}", profile.id)
-
-                    # Increment connection count for profiles with limits
-                    if profile.max_streams > 0:
-                        redis_client.incr(profile_connections_key)
-
-                    return (
-                        stream.id,
-                        profile.id,
-                        None,
-                    )  # Return newly assigned stream and matched profile
-                else:
-                    # This profile is at max connections
-                    has_streams_but_maxed_out = True
-                    logger.debug(
-                        f"Profile {profile.id} at max connections: {current_connections}/{profile.max_streams}"
-                    )
-
-        # No available streams - determine specific reason
-        if has_streams_but_maxed_out:
-            error_reason = "All active M3U profiles have reached maximum connection limits"
-        elif has_active_profiles:
-            error_reason = "No compatible active profile found for any assigned stream"
-        else:
-            error_reason = "No active profiles found for any assigned stream"
-
-        return None, None, error_reason
+        return candidates
 
     def release_stream(self):
         """
@@ -492,6 +547,31 @@ class Channel(models.Model):
         if current_count > 0:
             redis_client.decr(profile_connections_key)
 
+    def switch_stream_slot(self, stream_id, m3u_profile_id):
+        """
+        Move this channel's connection slot to the stream and M3U profile it is switching to.
+
+        Args:
+            stream_id: The ID of the stream being switched to
+            m3u_profile_id: The ID of the M3U account profile to connect with
+
+        Returns:
+            bool: True if the slot moved (or the channel isn't streaming), False if the profile is full
+        """
+        from apps.m3u.models import M3UAccountProfile
+
+        redis_client = RedisClient.get_client()
+        profile = M3UAccountProfile.objects.get(id=m3u_profile_id)
+        result = reserve_stream_slot(
+            redis_client, self.id, [(stream_id, profile.id, profile.max_streams)], mode="switch"
+        )
+        if not result:
+            logger.warning(f"No free connection on profile {m3u_profile_id} to switch channel {self.id} to stream {stream_id}")
+            return False
+
+        logger.info(f"Moved channel {self.id} slot to stream {stream_id} on profile {m3u_profile_id}")
+        return True
+
     def update_stream_profile(self, new_profile_id):
         """
         Updates the profile for the current stream and adjusts connection counts.
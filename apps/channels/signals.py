@@ -4,8 +4,12 @@ from django.db.models.signals import m2m_changed, pre_save, post_save, post_dele
 from django.dispatch import receiver
 from django.utils.timezone import now
 from celery.result import AsyncResult
-from .models import Channel, Stream, ChannelProfile, ChannelProfileMembership, Recording
+from .models import Channel, Stream, ChannelStream, ChannelGroup, ChannelProfile, ChannelProfileMembership, Logo, Recording
+from .tune_plan import invalidate_tune_plans
+from apps.accounts.models import User
+from apps.output.cache import invalidate_output_cache
 from apps.m3u.models import M3UAccount
+from core.models import CoreSettings, StreamProfile, UserAgent
 from apps.epg.tasks import parse_programs_for_tvg_id
 import logging, requests, time
 from .tasks import run_recording, prefetch_recording_artwork
@@ -30,6 +34,54 @@ def update_channel_tvg_id_and_logo(sender, instance, action, reverse, model, pk_
                 instance.tvg_id = streams_with_tvg.first().tvg_id
                 instance.save(update_fields=['tvg_id'])
 
+# Fields a tune plan depends on; saves limited to other fields keep plans valid
+TUNE_PLAN_FIELDS = {
+    Channel: {'stream_profile', 'uuid'},
+    Stream: {'url', 'm3u_account'},
+}
+
+@receiver(m2m_changed, sender=Channel.streams.through)
+@receiver([post_save, post_delete], sender=ChannelStream)
+@receiver([post_save, post_delete], sender=Stream)
+@receiver([post_save, post_delete], sender=Channel)
+def invalidate_channel_tune_plans(sender, **kwargs):
+    """Channel, stream and stream order changes make cached tune plans stale"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not set(update_fields) & TUNE_PLAN_FIELDS.get(sender, set(update_fields)):
+        return  # e.g. stream stats or EPG/logo updates
+    invalidate_tune_plans()
+
+@receiver([post_save, post_delete], sender=UserAgent)
+@receiver([post_save, post_delete], sender=StreamProfile)
+@receiver([post_save, post_delete], sender=CoreSettings)
+def invalidate_settings_tune_plans(sender, **kwargs):
+    """User agents, stream profiles and the defaults in core settings are baked into tune plans"""
+    invalidate_tune_plans()
+
+# Fields generated M3U playlists and guides depend on; saves limited to other fields keep cached outputs valid
+OUTPUT_FIELDS = {
+    Channel: {'name', 'channel_number', 'logo', 'channel_group', 'tvg_id', 'tvc_guide_stationid', 'user_level', 'uuid', 'epg_data'},
+    Stream: {'url'},
+    User: {'user_level'},
+}
+
+@receiver(m2m_changed, sender=Channel.streams.through)
+@receiver(m2m_changed, sender=User.channel_profiles.through)
+@receiver([post_save, post_delete], sender=ChannelStream)
+@receiver([post_save, post_delete], sender=Stream)
+@receiver([post_save, post_delete], sender=Channel)
+@receiver([post_save, post_delete], sender=ChannelGroup)
+@receiver([post_save, post_delete], sender=Logo)
+@receiver([post_save, post_delete], sender=ChannelProfile)
+@receiver([post_save, post_delete], sender=ChannelProfileMembership)
+@receiver([post_save, post_delete], sender=User)
+def invalidate_generated_outputs(sender, **kwargs):
+    """Changes to channels, their groups, logos, streams or profiles make cached playlists and guides stale"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not set(update_fields) & OUTPUT_FIELDS.get(sender, set(update_fields)):
+        return  # e.g. stream stats or last login updates
+    invalidate_output_cache()
+
 @receiver(pre_save, sender=Stream)
 def set_default_m3u_account(sender, instance, **kwargs):
     """
@@ -18,6 +18,7 @@ from rapidfuzz import fuzz
 
 from apps.channels.models import Channel
 from apps.epg.models import EPGData
+from apps.output.cache import invalidate_output_cache
 from core.models import CoreSettings
 
 from channels.layers import get_channel_layer
@@ -2720,6 +2721,8 @@ def bulk_create_channels_from_streams(self, stream_ids, channel_profile_ids=None
                 if channel_profile_memberships:
                     ChannelProfileMembership.objects.bulk_create(channel_profile_memberships, ignore_conflicts=True)
 
+        invalidate_output_cache()  # Bulk creates don't send signals
+
         # Send completion update
         send_websocket_update('updates', 'update', {
             'type': 'bulk_channel_creation_progress',
@@ -2807,6 +2810,7 @@ def set_channels_names_from_epg(self, channel_ids):
             # Bulk update the batch
             if batch_updates:
                 Channel.objects.bulk_update(batch_updates, ['name'])
+                invalidate_output_cache()
 
             # Send progress update
             progress = min(i + batch_size, total_channels)
@@ -2933,6 +2937,7 @@ def set_channels_logos_from_epg(self, channel_ids):
             # Bulk update the batch
             if batch_updates:
                 Channel.objects.bulk_update(batch_updates, ['logo'])
+                invalidate_output_cache()
 
             # Send progress update
             progress = min(i + batch_size, total_channels)
@@ -3031,6 +3036,7 @@ def set_channels_tvg_ids_from_epg(self, channel_ids):
             # Bulk update the batch
             if batch_updates:
                 Channel.objects.bulk_update(batch_updates, ['tvg_id'])
+                invalidate_output_cache()
 
             # Send progress update
             progress = min(i + batch_size, total_channels)
@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from apps.channels.models import Channel, ChannelStream, Stream
+from apps.channels.tune_plan import get_tune_plan
+from apps.m3u.models import M3UAccount
+from core.models import UserAgent
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, *keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        return True
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+
+class TunePlanTests(TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch("apps.channels.tune_plan.RedisClient.get_client", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.account = M3UAccount.objects.create(name="Provider", server_url="http://example.com/list.m3u")
+        self.profile = self.account.profiles.get(is_default=True)
+        self.stream = Stream.objects.create(name="Stream", url="http://example.com/1.ts", m3u_account=self.account)
+        self.channel = Channel.objects.create(channel_number=1, name="Channel")
+        ChannelStream.objects.create(channel=self.channel, stream=self.stream, order=0)
+
+    def test_cached_plan_needs_no_queries(self):
+        plan = get_tune_plan(self.channel.uuid)
+        self.assertEqual(plan["candidates"], [[self.stream.id, self.profile.id, self.profile.max_streams]])
+        self.assertEqual(plan["streams"], {str(self.stream.id): "http://example.com/1.ts"})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_tune_plan(self.channel.uuid), plan)
+
+    def test_relevant_changes_invalidate_plans(self):
+        get_tune_plan(self.channel.uuid)
+
+        # Stats updates don't affect tuning
+        self.stream.save(update_fields=["stream_stats"])
+        with self.assertNumQueries(0):
+            get_tune_plan(self.channel.uuid)
+
+        self.stream.url = "http://example.com/2.ts"
+        self.stream.save()
+        plan = get_tune_plan(self.channel.uuid)
+        self.assertEqual(plan["streams"], {str(self.stream.id): "http://example.com/2.ts"})
+
+        user_agent = UserAgent.objects.get(user_agent=plan["profiles"][str(self.profile.id)]["user_agent"])
+        user_agent.user_agent = "Edited/1.0"
+        user_agent.save()
+        plan = get_tune_plan(self.channel.uuid)
+        self.assertEqual(plan["profiles"][str(self.profile.id)]["user_agent"], "Edited/1.0")
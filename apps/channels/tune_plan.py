@@ -0,0 +1,145 @@
+"""
+Cached per-channel tune plans.
+
+A tune plan holds everything needed to start a channel: the ordered stream/profile
+candidates, each stream's URL, each M3U profile's URL transform and user agent, and
+the channel's stream profile. With a cached plan a tune only needs Redis. Any change
+to channels, streams or M3U accounts bumps a global plan version (see signals.py),
+and stale plans are rebuilt on their next use.
+"""
+
+import json
+import logging
+
+from django.core.exceptions import ValidationError
+from core.models import CoreSettings, UserAgent
+from core.utils import RedisClient
+
+logger = logging.getLogger(__name__)
+
+TUNE_PLAN_VERSION_KEY = "tune_plan:version"
+TUNE_PLAN_TTL = 600  # Safety net for changes made without signals, e.g. bulk updates
+
+
+def tune_plan_key(channel_uuid):
+    return f"tune_plan:{channel_uuid}"
+
+
+def build_tune_plan(channel, version):
+    """Build the tune plan for a channel from the database"""
+    default_user_agent = None
+
+    candidates = []
+    streams = {}
+    profiles = {}
+    for stream, profile in channel.get_stream_candidates():
+        candidates.append([stream.id, profile.id, profile.max_streams])
+        streams[str(stream.id)] = stream.url
+
+        if str(profile.id) not in profiles:
+            user_agent = stream.m3u_account.user_agent
+            if user_agent is None:
+                if default_user_agent is None:
+                    default_user_agent = UserAgent.objects.get(id=CoreSettings.get_default_user_agent_id())
+                user_agent = default_user_agent
+
+            profiles[str(profile.id)] = {
+                "search_pattern": profile.search_pattern,
+                "replace_pattern": profile.replace_pattern,
+                "user_agent": user_agent.user_agent,
+            }
+
+    stream_profile = channel.get_stream_profile()
+
+    return {
+        "version": version,
+        "channel_id": channel.id,
+        "has_streams": channel.streams.exists(),
+        "candidates": candidates,
+        "streams": streams,
+        "profiles": profiles,
+        "stream_profile_id": stream_profile.id,
+        "transcode": not stream_profile.is_proxy(),
+    }
+
+
+def get_tune_plan(channel_uuid, channel=None):
+    """
+    Return the tune plan for a channel, rebuilding it if missing or out of date.
+
+    Args:
+        channel_uuid: Channel UUID
+        channel: The Channel, if already loaded, to avoid a lookup on rebuild
+
+    Returns:
+        Optional[dict]: The plan, or None if channel_uuid isn't a channel
+    """
+    redis_client = RedisClient.get_client()
+    key = tune_plan_key(channel_uuid)
+
+    version = 0
+    try:
+        cached, version = redis_client.mget(key, TUNE_PLAN_VERSION_KEY)
+        version = int(version or 0)
+        if cached:
+            plan = json.loads(cached)
+            if plan.get("version") == version:
+                return plan
+    except Exception as e:
+        logger.warning(f"Failed to read tune plan for channel {channel_uuid}: {e}")
+
+    if channel is None:
+        from .models import Channel
+
+        try:
+            channel = Channel.objects.filter(uuid=channel_uuid).first()
+        except (ValueError, ValidationError):
+            channel = None  # Not a UUID, e.g. a stream hash
+        if channel is None:
+            return None
+
+    plan = build_tune_plan(channel, version)
+
+    try:
+        redis_client.set(key, json.dumps(plan), ex=TUNE_PLAN_TTL)
+    except Exception as e:
+        logger.warning(f"Failed to cache tune plan for channel {channel_uuid}: {e}")
+
+    return plan
+
+
+def reserve_from_plan(plan):
+    """
+    Keep the channel's active stream or reserve the first free slot among its candidates,
+    trying candidates with a healthy stream and M3U profile first.
+
+    Returns:
+        Tuple[Optional[int], Optional[int], Optional[str]]: (stream_id, profile_id, error_reason)
+    """
+    from .models import reserve_stream_slot
+    from apps.proxy.ts_proxy.stream_health import StreamHealth
+
+    # Check if this channel has any streams
+    if not plan["has_streams"]:
+        return None, None, "No streams assigned to channel"
+
+    redis_client = RedisClient.get_client()
+    candidates = StreamHealth.order_candidates(redis_client, plan["candidates"])
+    result = reserve_stream_slot(redis_client, plan["channel_id"], candidates)
+    if result:
+        stream_id, profile_id, _ = result
+        return stream_id, profile_id, None
+
+    if not plan["candidates"]:
+        return None, None, "No active profiles found for any assigned stream"
+
+    logger.debug(f"All {len(plan['candidates'])} candidate profiles for channel {plan['channel_id']} are at max connections")
+    return None, None, "All active M3U profiles have reached maximum connection limits"
+
+
+def invalidate_tune_plans():
+    """Mark every cached tune plan as stale"""
+    try:
+        RedisClient.get_client().incr(TUNE_PLAN_VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"Failed to invalidate tune plans: {e}")
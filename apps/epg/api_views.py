@@ -1,11 +1,14 @@
+import json
 import logging, os
-from rest_framework import viewsets, status
+from rest_framework import serializers, viewsets, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import action
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import timedelta
 from .models import EPGSource, ProgramData, EPGData  # Added ProgramData
 from .serializers import (
@@ -14,6 +17,10 @@ from .serializers import (
     EPGDataSerializer,
 )  # Updated serializer
 from .tasks import refresh_epg_data
+from .fragments import drop_fragments
+from .grid import get_dummy_programs
+from .now_next import drop_now_next
+from apps.output.cache import invalidate_epg_cache
 from apps.accounts.permissions import (
     Authenticated,
     permission_classes_by_action,
@@ -22,6 +29,9 @@ from apps.accounts.permissions import (
 
 logger = logging.getLogger(__name__)
 
+GRID_MAX_WINDOW = timedelta(days=7)  # Longest time window one grid request may ask for
+GRID_BATCH_SIZE = 2000  # Programs serialized per streamed chunk
+
 
 # ─────────────────────────────
 # 1) EPG Source API (CRUD)
@@ -107,12 +117,32 @@ class ProgramViewSet(viewsets.ModelViewSet):
         logger.debug("Listing all EPG programs.")
         return super().list(request, *args, **kwargs)
 
+    # Edited programmes are rendered from the database until the next refresh
+    def perform_create(self, serializer):
+        program = serializer.save()
+        drop_fragments([program.epg_id])
+        drop_now_next([program.epg_id])
+        invalidate_epg_cache()
+
+    def perform_update(self, serializer):
+        old_epg_id = serializer.instance.epg_id
+        program = serializer.save()
+        drop_fragments({old_epg_id, program.epg_id})
+        drop_now_next({old_epg_id, program.epg_id})
+        invalidate_epg_cache()
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        drop_fragments([instance.epg_id])
+        drop_now_next([instance.epg_id])
+        invalidate_epg_cache()
+
 
 # ─────────────────────────────
 # 3) EPG Grid View
 # ─────────────────────────────
 class EPGGridAPIView(APIView):
-    """Returns all programs airing in the next 24 hours including currently running ones and recent ones"""
+    """Returns programs airing in a time window, by default the last hour through the next 24 hours, paged by channel"""
 
     def get_permissions(self):
         try:
@@ -123,238 +153,125 @@ class EPGGridAPIView(APIView):
             return [Authenticated()]
 
     @swagger_auto_schema(
-        operation_description="Retrieve programs from the previous hour, currently running and upcoming for the next 24 hours",
+        operation_description=(
+            "Retrieve programs airing between start and end (default: from the previous hour through the next 24 hours) "
+            "for channels channel_offset to channel_offset + channel_limit, ordered by channel number. "
+            "Programs of an EPG shared by several channels are returned on the page of its first channel. "
+            "next_offset is the channel_offset of the next page, or null on the last one."
+        ),
+        manual_parameters=[
+            openapi.Parameter("start", openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+            openapi.Parameter("end", openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+            openapi.Parameter("channel_offset", openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+            openapi.Parameter("channel_limit", openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        ],
         responses={200: ProgramDataSerializer(many=True)},
     )
     def get(self, request, format=None):
-        # Use current time instead of midnight
-        now = timezone.now()
-        one_hour_ago = now - timedelta(hours=1)
-        twenty_four_hours_later = now + timedelta(hours=24)
-        logger.debug(
-            f"EPGGridAPIView: Querying programs between {one_hour_ago} and {twenty_four_hours_later}."
-        )
+        from apps.channels.models import Channel
 
-        # Use select_related to prefetch EPGData and include programs from the last hour
-        programs = ProgramData.objects.select_related("epg").filter(
-            # Programs that end after one hour ago (includes recently ended programs)
-            end_time__gt=one_hour_ago,
-            # AND start before the end time window
-            start_time__lt=twenty_four_hours_later,
+        now = timezone.now()
+        try:
+            start, end = self.get_window(request, now)
+            channel_offset = int(request.query_params.get("channel_offset", 0))
+            channel_limit = request.query_params.get("channel_limit")
+            channel_limit = int(channel_limit) if channel_limit else None
+            if channel_offset < 0 or (channel_limit is not None and channel_limit < 1):
+                raise ValueError("channel_offset must be positive and channel_limit at least 1")
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        ordered_channels = Channel.objects.order_by("channel_number", "id")
+        total_channels = ordered_channels.count()
+        channel_end = channel_offset + channel_limit if channel_limit else total_channels
+        channels = list(
+            ordered_channels.select_related("epg_data__epg_source")[channel_offset:channel_end]
         )
-        count = programs.count()
+        next_offset = channel_end if channel_end < total_channels else None
+
+        # Programs of an EPG shared by several channels go out once, on the page of its first channel
+        epg_ids = {channel.epg_data_id for channel in channels if channel.epg_data_id}
+        if channel_offset and epg_ids:
+            epg_ids -= set(ordered_channels[:channel_offset].values_list("epg_data_id", flat=True))
+
+        # Channels with no EPG data get standard dummy programs, ones on dummy EPG sources custom ones
+        dummy_channels = [
+            channel for channel in channels
+            if channel.epg_data is None
+            or (channel.epg_data.epg_source and channel.epg_data.epg_source.source_type == "dummy")
+        ]
         logger.debug(
-            f"EPGGridAPIView: Found {count} program(s), including recently ended, currently running, and upcoming shows."
+            f"EPGGridAPIView: Returning programs between {start} and {end} for channels "
+            f"{channel_offset}-{channel_offset + len(channels)} of {total_channels} "
+            f"({len(epg_ids)} EPG entries, {len(dummy_channels)} dummy channels)."
         )
 
-        # Generate dummy programs for channels that have no EPG data OR dummy EPG sources
-        from apps.channels.models import Channel
-        from apps.epg.models import EPGSource
-        from django.db.models import Q
-
-        # Get channels with no EPG data at all (standard dummy)
-        channels_without_epg = Channel.objects.filter(Q(epg_data__isnull=True))
-
-        # Get channels with custom dummy EPG sources (generate on-demand with patterns)
-        channels_with_custom_dummy = Channel.objects.filter(
-            epg_data__epg_source__source_type='dummy'
-        ).distinct()
-
-        # Log what we found
-        without_count = channels_without_epg.count()
-        custom_count = channels_with_custom_dummy.count()
-
-        if without_count > 0:
-            channel_names = [f"{ch.name} (ID: {ch.id})" for ch in channels_without_epg]
-            logger.debug(
-                f"EPGGridAPIView: Channels needing standard dummy EPG: {', '.join(channel_names)}"
-            )
-
-        if custom_count > 0:
-            channel_names = [f"{ch.name} (ID: {ch.id})" for ch in channels_with_custom_dummy]
-            logger.debug(
-                f"EPGGridAPIView: Channels needing custom dummy EPG: {', '.join(channel_names)}"
-            )
-
-        logger.debug(
-            f"EPGGridAPIView: Found {without_count} channels needing standard dummy, {custom_count} needing custom dummy EPG."
+        return StreamingHttpResponse(
+            self.stream_programs(epg_ids, dummy_channels, start, end, total_channels, next_offset),
+            content_type="application/json",
         )
 
-        # Serialize the regular programs
-        serialized_programs = ProgramDataSerializer(programs, many=True).data
-
-        # Humorous program descriptions based on time of day - same as in output/views.py
-        time_descriptions = {
-            (0, 4): [
-                "Late Night with {channel} - Where insomniacs unite!",
-                "The 'Why Am I Still Awake?' Show on {channel}",
-                "Counting Sheep - A {channel} production for the sleepless",
-            ],
-            (4, 8): [
-                "Dawn Patrol - Rise and shine with {channel}!",
-                "Early Bird Special - Coffee not included",
-                "Morning Zombies - Before coffee viewing on {channel}",
-            ],
-            (8, 12): [
-                "Mid-Morning Meetings - Pretend you're paying attention while watching {channel}",
-                "The 'I Should Be Working' Hour on {channel}",
-                "Productivity Killer - {channel}'s daytime programming",
-            ],
-            (12, 16): [
-                "Lunchtime Laziness with {channel}",
-                "The Afternoon Slump - Brought to you by {channel}",
-                "Post-Lunch Food Coma Theater on {channel}",
-            ],
-            (16, 20): [
-                "Rush Hour - {channel}'s alternative to traffic",
-                "The 'What's For Dinner?' Debate on {channel}",
-                "Evening Escapism - {channel}'s remedy for reality",
-            ],
-            (20, 24): [
-                "Prime Time Placeholder - {channel}'s finest not-programming",
-                "The 'Netflix Was Too Complicated' Show on {channel}",
-                "Family Argument Avoider - Courtesy of {channel}",
-            ],
-        }
-
-        # Generate and append dummy programs
-        dummy_programs = []
-
-        # Import the function from output.views
-        from apps.output.views import generate_dummy_programs as gen_dummy_progs
-
-        # Handle channels with CUSTOM dummy EPG sources (with patterns)
-        for channel in channels_with_custom_dummy:
-            # For dummy EPGs, ALWAYS use channel UUID to ensure unique programs per channel
-            # This prevents multiple channels assigned to the same dummy EPG from showing identical data
-            # Each channel gets its own unique program data even if they share the same EPG source
-            dummy_tvg_id = str(channel.uuid)
-
+    @staticmethod
+    def get_window(request, now):
+        """Parse the start and end query parameters, defaulting to one hour ago and 24 hours from now"""
+        window = []
+        for name, default in (("start", now - timedelta(hours=1)), ("end", now + timedelta(hours=24))):
+            value = request.query_params.get(name)
+            if not value:
+                window.append(default)
+                continue
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError(f"Invalid {name} datetime: {value}")
+            window.append(parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed))
+
+        start, end = window
+        if end <= start:
+            raise ValueError("end must be after start")
+        if end - start > GRID_MAX_WINDOW:
+            raise ValueError(f"The window may span at most {GRID_MAX_WINDOW.days} days")
+        return start, end
+
+    @staticmethod
+    def stream_programs(epg_ids, dummy_channels, start, end, total_channels, next_offset):
+        """Yield the grid response as JSON, a batch of programs at a time"""
+        datetime_field = serializers.DateTimeField()
+        separator = ""
+        yield '{"data":['
+
+        programs = ProgramData.objects.filter(
+            epg_id__in=epg_ids,
+            # Programs that end after the window starts (includes recently ended programs)
+            end_time__gt=start,
+            # AND start before the window ends
+            start_time__lt=end,
+        ).values("id", "start_time", "end_time", "title", "sub_title", "description", "tvg_id")
+
+        batch = []
+        for program in programs.iterator(chunk_size=GRID_BATCH_SIZE):
+            program["start_time"] = datetime_field.to_representation(program["start_time"])
+            program["end_time"] = datetime_field.to_representation(program["end_time"])
+            batch.append(program)
+            if len(batch) >= GRID_BATCH_SIZE:
+                yield separator + json.dumps(batch)[1:-1]
+                separator = ","
+                batch = []
+
+        for channel in dummy_channels:
             try:
-                # Get the custom dummy EPG source
-                epg_source = channel.epg_data.epg_source if channel.epg_data else None
-
-                logger.debug(f"Generating custom dummy programs for channel: {channel.name} (ID: {channel.id})")
-
-                # Determine which name to parse based on custom properties
-                name_to_parse = channel.name
-                if epg_source and epg_source.custom_properties:
-                    custom_props = epg_source.custom_properties
-                    name_source = custom_props.get('name_source')
-
-                    if name_source == 'stream':
-                        # Get the stream index (1-based from user, convert to 0-based)
-                        stream_index = custom_props.get('stream_index', 1) - 1
-
-                        # Get streams ordered by channelstream order
-                        channel_streams = channel.streams.all().order_by('channelstream__order')
-
-                        if channel_streams.exists() and 0 <= stream_index < channel_streams.count():
-                            stream = list(channel_streams)[stream_index]
-                            name_to_parse = stream.name
-                            logger.debug(f"Using stream name for parsing: {name_to_parse} (stream index: {stream_index})")
-                        else:
-                            logger.warning(f"Stream index {stream_index} not found for channel {channel.name}, falling back to channel name")
-                    elif name_source == 'channel':
-                        logger.debug(f"Using channel name for parsing: {name_to_parse}")
-
-                # Generate programs using custom patterns from the dummy EPG source
-                # Use the same tvg_id that will be set in the program data
-                generated = gen_dummy_progs(
-                    channel_id=dummy_tvg_id,
-                    channel_name=name_to_parse,
-                    num_days=1,
-                    program_length_hours=4,
-                    epg_source=epg_source
-                )
-
-                # Custom dummy should always return data (either from patterns or fallback)
-                if generated:
-                    logger.debug(f"Generated {len(generated)} custom dummy programs for {channel.name}")
-                    # Convert generated programs to API format
-                    for program in generated:
-                        dummy_program = {
-                            "id": f"dummy-custom-{channel.id}-{program['start_time'].hour}",
-                            "epg": {"tvg_id": dummy_tvg_id, "name": channel.name},
-                            "start_time": program['start_time'].isoformat(),
-                            "end_time": program['end_time'].isoformat(),
-                            "title": program['title'],
-                            "description": program['description'],
-                            "tvg_id": dummy_tvg_id,
-                            "sub_title": None,
-                            "custom_properties": None,
-                        }
-                        dummy_programs.append(dummy_program)
-                else:
-                    logger.warning(f"No programs generated for custom dummy EPG channel: {channel.name}")
-
+                batch.extend(get_dummy_programs(channel, start, end))
             except Exception as e:
                 logger.error(
-                    f"Error creating custom dummy programs for channel {channel.name} (ID: {channel.id}): {str(e)}"
+                    f"Error creating dummy programs for channel {channel.name} (ID: {channel.id}): {str(e)}"
                 )
-
-        # Handle channels with NO EPG data (standard dummy with humorous descriptions)
-        for channel in channels_without_epg:
-            # For channels with no EPG, use UUID to ensure uniqueness (matches frontend logic)
-            # The frontend uses: tvgRecord?.tvg_id ?? channel.uuid
-            # Since there's no EPG data, it will fall back to UUID
-            dummy_tvg_id = str(channel.uuid)
-
-            try:
-                logger.debug(f"Generating standard dummy programs for channel: {channel.name} (ID: {channel.id})")
-
-                # Create programs every 4 hours for the next 24 hours with humorous descriptions
-                for hour_offset in range(0, 24, 4):
-                    # Use timedelta for time arithmetic instead of replace() to avoid hour overflow
-                    start_time = now + timedelta(hours=hour_offset)
-                    # Set minutes/seconds to zero for clean time blocks
-                    start_time = start_time.replace(minute=0, second=0, microsecond=0)
-                    end_time = start_time + timedelta(hours=4)
-
-                    # Get the hour for selecting a description
-                    hour = start_time.hour
-                    day = 0  # Use 0 as we're only doing 1 day
-
-                    # Find the appropriate time slot for description
-                    for time_range, descriptions in time_descriptions.items():
-                        start_range, end_range = time_range
-                        if start_range <= hour < end_range:
-                            # Pick a description using the sum of the hour and day as seed
-                            # This makes it somewhat random but consistent for the same timeslot
-                            description = descriptions[
-                                (hour + day) % len(descriptions)
-                            ].format(channel=channel.name)
-                            break
-                    else:
-                        # Fallback description if somehow no range matches
-                        description = f"Placeholder program for {channel.name} - EPG data went on vacation"
-
-                    # Create a dummy program in the same format as regular programs
-                    dummy_program = {
-                        "id": f"dummy-standard-{channel.id}-{hour_offset}",
-                        "epg": {"tvg_id": dummy_tvg_id, "name": channel.name},
-                        "start_time": start_time.isoformat(),
-                        "end_time": end_time.isoformat(),
-                        "title": f"{channel.name}",
-                        "description": description,
-                        "tvg_id": dummy_tvg_id,
-                        "sub_title": None,
-                        "custom_properties": None,
-                    }
-                    dummy_programs.append(dummy_program)
-
-            except Exception as e:
-                logger.error(
-                    f"Error creating standard dummy programs for channel {channel.name} (ID: {channel.id}): {str(e)}"
-                )
-
-        # Combine regular and dummy programs
-        all_programs = list(serialized_programs) + dummy_programs
-        logger.debug(
-            f"EPGGridAPIView: Returning {len(all_programs)} total programs (including {len(dummy_programs)} dummy programs)."
-        )
-
-        return Response({"data": all_programs}, status=status.HTTP_200_OK)
+            if len(batch) >= GRID_BATCH_SIZE:
+                yield separator + json.dumps(batch)[1:-1]
+                separator = ","
+                batch = []
+
+        if batch:
+            yield separator + json.dumps(batch)[1:-1]
+        yield f'],"total_channels":{total_channels},"next_offset":{json.dumps(next_offset)}}}'
 
 
 # ─────────────────────────────
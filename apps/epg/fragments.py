@@ -0,0 +1,461 @@
+"""
+Pre-rendered XMLTV programme fragments.
+
+Rendering the <programme> elements of a full guide on request means reading every
+ProgramData row of every channel. Instead, each EPGData's programmes are rendered
+once after an EPG refresh and stored in Redis, zlib-compressed, as one fragment per
+UTC day. /output/epg then streams the stored bytes, substituting the channel id each
+output channel uses (tvg_id, gracenote id, channel number or XC number) for a
+placeholder. Several channels mapped to the same EPGData share its fragments.
+
+A refresh fingerprints each EPGData's parsed programmes, and only EPGData whose
+fingerprint changed are rendered again. Each fragment day carries an index of
+programme start times and offsets, so the first and last day of a ?days= window can
+be sliced without rendering anything.
+"""
+
+import hashlib
+import html
+import json
+import logging
+import zlib
+from array import array
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from core.utils import RedisClient
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_FORMAT = 1  # Bump when render_programme output changes to re-render every fragment
+FRAGMENT_TTL = 7 * 24 * 3600  # Refreshed on every EPG refresh, even for unchanged fragments
+RENDER_BATCH_SIZE = 100  # EPGData rendered per query
+
+CHANNEL_PLACEHOLDER = "\x00channel\x00"  # Replaced by the output channel id; XML can't contain NUL
+
+
+def fragment_key(epg_id):
+    return f"epg:fragments:{epg_id}"
+
+
+def render_programme(prog, channel_id):
+    """Render one programme as a list of XMLTV lines"""
+    start_str = prog.start_time.strftime("%Y%m%d%H%M%S %z")
+    stop_str = prog.end_time.strftime("%Y%m%d%H%M%S %z")
+
+    program_xml = [f'  <programme start="{start_str}" stop="{stop_str}" channel="{channel_id}">']
+    program_xml.append(f'    <title>{html.escape(prog.title)}</title>')
+
+    # Add subtitle if available
+    if prog.sub_title:
+        program_xml.append(f"    <sub-title>{html.escape(prog.sub_title)}</sub-title>")
+
+    # Add description if available
+    if prog.description:
+        program_xml.append(f"    <desc>{html.escape(prog.description)}</desc>")
+
+    # Process custom properties if available
+    if prog.custom_properties:
+        custom_data = prog.custom_properties or {}
+
+        # Add categories if available
+        if "categories" in custom_data and custom_data["categories"]:
+            for category in custom_data["categories"]:
+                program_xml.append(f"    <category>{html.escape(category)}</category>")
+
+        # Add keywords if available
+        if "keywords" in custom_data and custom_data["keywords"]:
+            for keyword in custom_data["keywords"]:
+                program_xml.append(f"    <keyword>{html.escape(keyword)}</keyword>")
+
+        # Handle episode numbering - multiple formats supported
+        # Prioritize onscreen_episode over standalone episode for onscreen system
+        if "onscreen_episode" in custom_data:
+            program_xml.append(f'    <episode-num system="onscreen">{html.escape(custom_data["onscreen_episode"])}</episode-num>')
+        elif "episode" in custom_data:
+            program_xml.append(f'    <episode-num system="onscreen">E{custom_data["episode"]}</episode-num>')
+
+        # Handle dd_progid format
+        if 'dd_progid' in custom_data:
+            program_xml.append(f'    <episode-num system="dd_progid">{html.escape(custom_data["dd_progid"])}</episode-num>')
+
+        # Handle external database IDs
+        for system in ['thetvdb.com', 'themoviedb.org', 'imdb.com']:
+            if f'{system}_id' in custom_data:
+                program_xml.append(f'    <episode-num system="{system}">{html.escape(custom_data[f"{system}_id"])}</episode-num>')
+
+        # Add season and episode numbers in xmltv_ns format if available
+        if "season" in custom_data and "episode" in custom_data:
+            season = (
+                int(custom_data["season"]) - 1
+                if str(custom_data["season"]).isdigit()
+                else 0
+            )
+            episode = (
+                int(custom_data["episode"]) - 1
+                if str(custom_data["episode"]).isdigit()
+                else 0
+            )
+            program_xml.append(f'    <episode-num system="xmltv_ns">{season}.{episode}.</episode-num>')
+
+        # Add language information
+        if "language" in custom_data:
+            program_xml.append(f'    <language>{html.escape(custom_data["language"])}</language>')
+
+        if "original_language" in custom_data:
+            program_xml.append(f'    <orig-language>{html.escape(custom_data["original_language"])}</orig-language>')
+
+        # Add length information
+        if "length" in custom_data and isinstance(custom_data["length"], dict):
+            length_value = custom_data["length"].get("value", "")
+            length_units = custom_data["length"].get("units", "minutes")
+            program_xml.append(f'    <length units="{html.escape(length_units)}">{html.escape(str(length_value))}</length>')
+
+        # Add video information
+        if "video" in custom_data and isinstance(custom_data["video"], dict):
+            program_xml.append("    <video>")
+            for attr in ['present', 'colour', 'aspect', 'quality']:
+                if attr in custom_data["video"]:
+                    program_xml.append(f"      <{attr}>{html.escape(custom_data['video'][attr])}</{attr}>")
+            program_xml.append("    </video>")
+
+        # Add audio information
+        if "audio" in custom_data and isinstance(custom_data["audio"], dict):
+            program_xml.append("    <audio>")
+            for attr in ['present', 'stereo']:
+                if attr in custom_data["audio"]:
+                    program_xml.append(f"      <{attr}>{html.escape(custom_data['audio'][attr])}</{attr}>")
+            program_xml.append("    </audio>")
+
+        # Add subtitles information
+        if "subtitles" in custom_data and isinstance(custom_data["subtitles"], list):
+            for subtitle in custom_data["subtitles"]:
+                if isinstance(subtitle, dict):
+                    subtitle_type = subtitle.get("type", "")
+                    type_attr = f' type="{html.escape(subtitle_type)}"' if subtitle_type else ""
+                    program_xml.append(f"    <subtitles{type_attr}>")
+                    if "language" in subtitle:
+                        program_xml.append(f"      <language>{html.escape(subtitle['language'])}</language>")
+                    program_xml.append("    </subtitles>")
+
+        # Add rating if available
+        if "rating" in custom_data:
+            rating_system = custom_data.get("rating_system", "TV Parental Guidelines")
+            program_xml.append(f'    <rating system="{html.escape(rating_system)}">')
+            program_xml.append(f'      <value>{html.escape(custom_data["rating"])}</value>')
+            program_xml.append(f"    </rating>")
+
+        # Add star ratings
+        if "star_ratings" in custom_data and isinstance(custom_data["star_ratings"], list):
+            for star_rating in custom_data["star_ratings"]:
+                if isinstance(star_rating, dict) and "value" in star_rating:
+                    system_attr = f' system="{html.escape(star_rating["system"])}"' if "system" in star_rating else ""
+                    program_xml.append(f"    <star-rating{system_attr}>")
+                    program_xml.append(f"      <value>{html.escape(star_rating['value'])}</value>")
+                    program_xml.append("    </star-rating>")
+
+        # Add reviews
+        if "reviews" in custom_data and isinstance(custom_data["reviews"], list):
+            for review in custom_data["reviews"]:
+                if isinstance(review, dict) and "content" in review:
+                    review_type = review.get("type", "text")
+                    attrs = [f'type="{html.escape(review_type)}"']
+                    if "source" in review:
+                        attrs.append(f'source="{html.escape(review["source"])}"')
+                    if "reviewer" in review:
+                        attrs.append(f'reviewer="{html.escape(review["reviewer"])}"')
+                    attr_str = " ".join(attrs)
+                    program_xml.append(f'    <review {attr_str}>{html.escape(review["content"])}</review>')
+
+        # Add images
+        if "images" in custom_data and isinstance(custom_data["images"], list):
+            for image in custom_data["images"]:
+                if isinstance(image, dict) and "url" in image:
+                    attrs = []
+                    for attr in ['type', 'size', 'orient', 'system']:
+                        if attr in image:
+                            attrs.append(f'{attr}="{html.escape(image[attr])}"')
+                    attr_str = " " + " ".join(attrs) if attrs else ""
+                    program_xml.append(f'    <image{attr_str}>{html.escape(image["url"])}</image>')
+
+        # Add enhanced credits handling
+        if "credits" in custom_data:
+            program_xml.append("    <credits>")
+            credits = custom_data["credits"]
+
+            # Handle different credit types
+            for role in ['director', 'writer', 'adapter', 'producer', 'composer', 'editor', 'presenter', 'commentator', 'guest']:
+                if role in credits:
+                    people = credits[role]
+                    if isinstance(people, list):
+                        for person in people:
+                            program_xml.append(f"      <{role}>{html.escape(person)}</{role}>")
+                    else:
+                        program_xml.append(f"      <{role}>{html.escape(people)}</{role}>")
+
+            # Handle actors separately to include role and guest attributes
+            if "actor" in credits:
+                actors = credits["actor"]
+                if isinstance(actors, list):
+                    for actor in actors:
+                        if isinstance(actor, dict):
+                            name = actor.get("name", "")
+                            role_attr = f' role="{html.escape(actor["role"])}"' if "role" in actor else ""
+                            guest_attr = ' guest="yes"' if actor.get("guest") else ""
+                            program_xml.append(f"      <actor{role_attr}{guest_attr}>{html.escape(name)}</actor>")
+                        else:
+                            program_xml.append(f"      <actor>{html.escape(actor)}</actor>")
+                else:
+                    program_xml.append(f"      <actor>{html.escape(actors)}</actor>")
+
+            program_xml.append("    </credits>")
+
+        # Add program date if available (full date, not just year)
+        if "date" in custom_data:
+            program_xml.append(f'    <date>{html.escape(custom_data["date"])}</date>')
+
+        # Add country if available
+        if "country" in custom_data:
+            program_xml.append(f'    <country>{html.escape(custom_data["country"])}</country>')
+
+        # Add icon if available
+        if "icon" in custom_data:
+            program_xml.append(f'    <icon src="{html.escape(custom_data["icon"])}" />')
+
+        # Add special flags as proper tags with enhanced handling
+        if custom_data.get("previously_shown", False):
+            prev_shown_details = custom_data.get("previously_shown_details", {})
+            attrs = []
+            if "start" in prev_shown_details:
+                attrs.append(f'start="{html.escape(prev_shown_details["start"])}"')
+            if "channel" in prev_shown_details:
+                attrs.append(f'channel="{html.escape(prev_shown_details["channel"])}"')
+            attr_str = " " + " ".join(attrs) if attrs else ""
+            program_xml.append(f"    <previously-shown{attr_str} />")
+
+        if custom_data.get("premiere", False):
+            premiere_text = custom_data.get("premiere_text", "")
+            if premiere_text:
+                program_xml.append(f"    <premiere>{html.escape(premiere_text)}</premiere>")
+            else:
+                program_xml.append("    <premiere />")
+
+        if custom_data.get("last_chance", False):
+            last_chance_text = custom_data.get("last_chance_text", "")
+            if last_chance_text:
+                program_xml.append(f"    <last-chance>{html.escape(last_chance_text)}</last-chance>")
+            else:
+                program_xml.append("    <last-chance />")
+
+        if custom_data.get("new", False):
+            program_xml.append("    <new />")
+
+        if custom_data.get('live', False):
+            program_xml.append('    <live />')
+
+    program_xml.append("  </programme>")
+    return program_xml
+
+
+class FragmentFingerprints:
+    """Fingerprints the programmes parsed for each EPGData to detect which ones changed"""
+
+    def __init__(self):
+        self._digests = {}
+
+    def add(self, program):
+        digest = self._digests.get(program.epg_id)
+        if digest is None:
+            digest = self._digests[program.epg_id] = hashlib.sha1(str(FRAGMENT_FORMAT).encode())
+        digest.update(json.dumps([
+            program.start_time.isoformat(),
+            program.end_time.isoformat(),
+            program.title,
+            program.sub_title,
+            program.description,
+            program.custom_properties,
+        ], sort_keys=True, default=str).encode("utf-8"))
+
+    def hexdigests(self, epg_ids):
+        """Fingerprint of each EPGData; EPGData without programmes get the empty fingerprint"""
+        empty = hashlib.sha1(str(FRAGMENT_FORMAT).encode()).hexdigest()
+        return {
+            epg_id: self._digests[epg_id].hexdigest() if epg_id in self._digests else empty
+            for epg_id in epg_ids
+        }
+
+
+def _day_key(start_time):
+    return start_time.astimezone(dt_timezone.utc).strftime("%Y%m%d")
+
+
+def _store(pipe, epg_id, days, fingerprint):
+    """Queue writing one EPGData's rendered days: {day: (lines, index)}"""
+    key = fragment_key(epg_id)
+    mapping = {"fp": fingerprint or ""}
+    for day, (lines, index) in days.items():
+        mapping[f"d:{day}"] = zlib.compress("".join(lines).encode("utf-8"), 6)
+        mapping[f"i:{day}"] = index.tobytes()
+    pipe.delete(key)
+    pipe.hset(key, mapping=mapping)
+    pipe.expire(key, FRAGMENT_TTL)
+
+
+def render_fragments(epg_ids, fingerprints=None):
+    """
+    Render and store the fragments of the given EPGData.
+
+    Args:
+        epg_ids: EPGData IDs to render
+        fingerprints: Optional {epg_id: fingerprint} stored with each fragment
+    """
+    from .models import ProgramData
+
+    epg_ids = list(epg_ids)
+    fingerprints = fingerprints or {}
+    redis_client = RedisClient.get_client()
+
+    for i in range(0, len(epg_ids), RENDER_BATCH_SIZE):
+        batch = epg_ids[i:i + RENDER_BATCH_SIZE]
+        rendered = {epg_id: {} for epg_id in batch}
+
+        programs = ProgramData.objects.filter(epg_id__in=batch).order_by('epg_id', 'start_time', 'id')
+        for prog in programs.iterator(chunk_size=2000):
+            days = rendered[prog.epg_id]
+            day = _day_key(prog.start_time)
+            if day not in days:
+                days[day] = ([], array('q'))
+            lines, index = days[day]
+
+            # Index entries: start timestamp, then the programme's character offset in the
+            # decoded day, which is how iter_fragments slices it
+            offset = index[-1] + len(lines[-1]) if lines else 0
+            index.extend((int(prog.start_time.timestamp()), offset))
+            lines.append('\n'.join(render_programme(prog, CHANNEL_PLACEHOLDER)) + '\n')
+
+        pipe = redis_client.pipeline()
+        for epg_id in batch:
+            _store(pipe, epg_id, rendered[epg_id], fingerprints.get(epg_id))
+        pipe.execute()
+
+    return len(epg_ids)
+
+
+def rebuild_fragments(fingerprints, stale_ids=()):
+    """
+    Render the fragments of EPGData whose fingerprint changed since they were last rendered.
+
+    Args:
+        fingerprints: {epg_id: fingerprint} for every mapped EPGData of a source
+        stale_ids: EPGData whose fragments should be dropped
+
+    Returns:
+        int: Number of EPGData rendered
+    """
+    try:
+        redis_client = RedisClient.get_client()
+        epg_ids = list(fingerprints)
+
+        pipe = redis_client.pipeline(transaction=False)
+        for epg_id in epg_ids:
+            pipe.hget(fragment_key(epg_id), "fp")
+        stored = pipe.execute()
+
+        changed = []
+        pipe = redis_client.pipeline(transaction=False)
+        for epg_id, fingerprint in zip(epg_ids, stored):
+            if fingerprint is not None and fingerprint.decode("utf-8") == fingerprints[epg_id]:
+                pipe.expire(fragment_key(epg_id), FRAGMENT_TTL)
+            else:
+                changed.append(epg_id)
+        pipe.execute()
+
+        drop_fragments(stale_ids)
+        rendered = render_fragments(changed, fingerprints)
+        logger.info(f"Rendered XMLTV fragments for {rendered} of {len(epg_ids)} EPG entries")
+        return rendered
+    except Exception as e:
+        logger.error(f"Error rendering XMLTV fragments: {e}", exc_info=True)
+        return 0
+
+
+def drop_fragments(epg_ids):
+    """Drop fragments so the guide renders these EPGData from the database until re-rendered"""
+    epg_ids = list(epg_ids)
+    if not epg_ids:
+        return
+    try:
+        RedisClient.get_client().delete(*(fragment_key(epg_id) for epg_id in epg_ids))
+    except Exception as e:
+        logger.warning(f"Failed to drop XMLTV fragments: {e}")
+
+
+def get_fragments(epg_id):
+    """
+    Load the stored fragments of one EPGData.
+
+    Returns:
+        Optional[dict]: {field: bytes}, or None if the EPGData hasn't been rendered
+    """
+    try:
+        fragments = RedisClient.get_client().hgetall(fragment_key(epg_id))
+    except Exception as e:
+        logger.warning(f"Failed to read XMLTV fragments for EPG {epg_id}: {e}")
+        return None
+    return fragments or None
+
+
+def get_fragments_many(epg_ids):
+    """
+    Load the stored fragments of several EPGData in one pipelined round trip.
+
+    Returns:
+        dict: {epg_id: fragments} for the EPGData that have been rendered
+    """
+    epg_ids = list(dict.fromkeys(epg_ids))
+    if not epg_ids:
+        return {}
+    try:
+        pipe = RedisClient.get_client().pipeline(transaction=False)
+        for epg_id in epg_ids:
+            pipe.hgetall(fragment_key(epg_id))
+        results = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to read XMLTV fragments for {len(epg_ids)} EPG entries: {e}")
+        return {}
+    return {epg_id: fragments for epg_id, fragments in zip(epg_ids, results) if fragments}
+
+
+def iter_fragments(fragments, channel_id, start=None, end=None):
+    """
+    Yield the programmes of loaded fragments for one output channel, in start time order.
+
+    Args:
+        fragments: Result of get_fragments or an entry of get_fragments_many
+        channel_id: Value of the programme channel attribute
+        start, end: Only programmes starting in [start, end), when given
+    """
+    days = sorted(field[2:].decode("utf-8") for field in fragments if field.startswith(b"d:"))
+    start_ts = start.timestamp() if start else None
+    end_ts = end.timestamp() if end else None
+
+    for day in days:
+        day_start = datetime.strptime(day, "%Y%m%d").replace(tzinfo=dt_timezone.utc)
+        day_start_ts = day_start.timestamp()
+        day_end_ts = (day_start + timedelta(days=1)).timestamp()
+        if (end_ts is not None and day_start_ts >= end_ts) or (start_ts is not None and day_end_ts <= start_ts):
+            continue
+
+        body = zlib.decompress(fragments[f"d:{day}".encode()]).decode("utf-8")
+        if (start_ts is not None and day_start_ts < start_ts) or (end_ts is not None and day_end_ts > end_ts):
+            # Day straddles the window edge: keep only programmes starting inside it
+            index = array('q')
+            index.frombytes(fragments[f"i:{day}".encode()])
+            offsets = list(index[1::2]) + [len(body)]
+            body = "".join(
+                body[offsets[n]:offsets[n + 1]]
+                for n, programme_start in enumerate(index[0::2])
+                if (start_ts is None or programme_start >= start_ts) and (end_ts is None or programme_start < end_ts)
+            )
+
+        if body:
+            yield body.replace(CHANNEL_PLACEHOLDER, channel_id)
@@ -0,0 +1,194 @@
+"""
+Dummy programmes for the EPG grid.
+
+Channels without EPG data, and channels mapped to a custom dummy EPG source, are
+shown in the guide with generated programmes. Generating them for thousands of
+channels on every grid request is slow, so each channel's programmes are cached in
+Redis for the UTC day. Keys include everything the programmes are generated from,
+so renaming a channel or editing a dummy source's patterns generates them again.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from core.utils import RedisClient
+
+logger = logging.getLogger(__name__)
+
+DUMMY_HOURS = 48  # Generated per cache entry, so windows starting later in the day are still covered
+DUMMY_PROGRAM_HOURS = 4
+DUMMY_CACHE_TTL = 26 * 3600  # Keys include the day; the TTL only frees old ones
+
+# Humorous program descriptions based on time of day - same as in output/views.py
+TIME_DESCRIPTIONS = {
+    (0, 4): [
+        "Late Night with {channel} - Where insomniacs unite!",
+        "The 'Why Am I Still Awake?' Show on {channel}",
+        "Counting Sheep - A {channel} production for the sleepless",
+    ],
+    (4, 8): [
+        "Dawn Patrol - Rise and shine with {channel}!",
+        "Early Bird Special - Coffee not included",
+        "Morning Zombies - Before coffee viewing on {channel}",
+    ],
+    (8, 12): [
+        "Mid-Morning Meetings - Pretend you're paying attention while watching {channel}",
+        "The 'I Should Be Working' Hour on {channel}",
+        "Productivity Killer - {channel}'s daytime programming",
+    ],
+    (12, 16): [
+        "Lunchtime Laziness with {channel}",
+        "The Afternoon Slump - Brought to you by {channel}",
+        "Post-Lunch Food Coma Theater on {channel}",
+    ],
+    (16, 20): [
+        "Rush Hour - {channel}'s alternative to traffic",
+        "The 'What's For Dinner?' Debate on {channel}",
+        "Evening Escapism - {channel}'s remedy for reality",
+    ],
+    (20, 24): [
+        "Prime Time Placeholder - {channel}'s finest not-programming",
+        "The 'Netflix Was Too Complicated' Show on {channel}",
+        "Family Argument Avoider - Courtesy of {channel}",
+    ],
+}
+
+
+def dummy_program(program_id, channel, start_time, end_time, title, description):
+    """A generated programme in the grid API format"""
+    # For dummy EPGs, ALWAYS use channel UUID to ensure unique programs per channel
+    # The frontend uses: tvgRecord?.tvg_id ?? channel.uuid
+    dummy_tvg_id = str(channel.uuid)
+    return {
+        "id": program_id,
+        "epg": {"tvg_id": dummy_tvg_id, "name": channel.name},
+        "start_time": start_time.isoformat(),
+        "end_time": end_time.isoformat(),
+        "title": title,
+        "description": description,
+        "tvg_id": dummy_tvg_id,
+        "sub_title": None,
+        "custom_properties": None,
+    }
+
+
+def build_standard_dummy_programs(channel, now):
+    """Programmes every 4 hours with humorous descriptions, for channels with no EPG data"""
+    programs = []
+    first_start = now.replace(minute=0, second=0, microsecond=0)
+    for hour_offset in range(0, DUMMY_HOURS, DUMMY_PROGRAM_HOURS):
+        start_time = first_start + timedelta(hours=hour_offset)
+        end_time = start_time + timedelta(hours=DUMMY_PROGRAM_HOURS)
+
+        # Find the appropriate time slot for description
+        hour = start_time.hour
+        for (start_range, end_range), descriptions in TIME_DESCRIPTIONS.items():
+            if start_range <= hour < end_range:
+                description = descriptions[hour % len(descriptions)].format(channel=channel.name)
+                break
+        else:
+            # Fallback description if somehow no range matches
+            description = f"Placeholder program for {channel.name} - EPG data went on vacation"
+
+        programs.append(dummy_program(
+            f"dummy-standard-{channel.id}-{hour_offset}", channel, start_time, end_time, channel.name, description
+        ))
+    return programs
+
+
+def custom_dummy_name(channel, epg_source):
+    """The name a custom dummy EPG source parses: the channel's, or one of its streams'"""
+    custom_props = epg_source.custom_properties or {}
+    if custom_props.get('name_source') != 'stream':
+        return channel.name
+
+    # Get the stream index (1-based from user, convert to 0-based)
+    stream_index = custom_props.get('stream_index', 1) - 1
+    channel_streams = list(channel.streams.all().order_by('channelstream__order'))
+    if 0 <= stream_index < len(channel_streams):
+        return channel_streams[stream_index].name
+
+    logger.warning(f"Stream index {stream_index} not found for channel {channel.name}, falling back to channel name")
+    return channel.name
+
+
+def build_custom_dummy_programs(channel, epg_source, name_to_parse):
+    """Programmes generated from a custom dummy EPG source's patterns"""
+    from apps.output.views import generate_dummy_programs
+
+    generated = generate_dummy_programs(
+        channel_id=str(channel.uuid),
+        channel_name=name_to_parse,
+        num_days=DUMMY_HOURS // 24,
+        program_length_hours=DUMMY_PROGRAM_HOURS,
+        epg_source=epg_source,
+    )
+    if not generated:
+        logger.warning(f"No programs generated for custom dummy EPG channel: {channel.name}")
+
+    return [
+        dummy_program(
+            f"dummy-custom-{channel.id}-{int(program['start_time'].timestamp())}",
+            channel,
+            program['start_time'],
+            program['end_time'],
+            program['title'],
+            program['description'],
+        )
+        for program in generated
+    ]
+
+
+def dummy_cache_key(channel, now, *inputs):
+    """Cache key for one channel's generated programmes on the UTC day of now"""
+    fingerprint = hashlib.sha1(
+        json.dumps([channel.name, str(channel.uuid), *inputs], sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return f"epg:grid_dummy:{channel.id}:{now:%Y%m%d}:{fingerprint}"
+
+
+def get_dummy_programs(channel, start, end, now=None):
+    """
+    Return a channel's generated programmes that overlap start..end, from the cache when possible.
+
+    The channel must have no EPG data or be mapped to a dummy EPG source.
+
+    Returns:
+        list: Programmes in the grid API format
+    """
+    now = now or timezone.now()
+    epg_source = channel.epg_data.epg_source if channel.epg_data else None
+
+    if epg_source is not None:
+        name_to_parse = custom_dummy_name(channel, epg_source)
+        key = dummy_cache_key(channel, now, "custom", epg_source.id, epg_source.custom_properties, name_to_parse)
+    else:
+        key = dummy_cache_key(channel, now, "standard")
+
+    redis_client = RedisClient.get_client()
+    programs = None
+    try:
+        cached = redis_client.get(key)
+        if cached is not None:
+            programs = json.loads(cached)
+    except Exception as e:
+        logger.warning(f"Failed to read cached dummy programs for channel {channel.id}: {e}")
+
+    if programs is None:
+        if epg_source is not None:
+            programs = build_custom_dummy_programs(channel, epg_source, name_to_parse)
+        else:
+            programs = build_standard_dummy_programs(channel, now)
+        try:
+            redis_client.set(key, json.dumps(programs), ex=DUMMY_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"Failed to cache dummy programs for channel {channel.id}: {e}")
+
+    return [
+        program for program in programs
+        if datetime.fromisoformat(program["end_time"]) > start and datetime.fromisoformat(program["start_time"]) < end
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.9 on 2026-10-17 07:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epg', '0021_epgsource_priority'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='programdata',
+            index=models.Index(fields=['epg', 'start_time'], name='epg_program_epg_id_ea0608_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='programdata',
+            index=models.Index(fields=['epg', 'end_time'], name='epg_program_epg_id_491ed7_idx'),
+        ),
+    ]
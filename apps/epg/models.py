@@ -164,5 +164,12 @@ class ProgramData(models.Model):
     tvg_id = models.CharField(max_length=255, null=True, blank=True)
     custom_properties = models.JSONField(default=dict, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Time-window lookups per channel: now/next, short EPG and the guide grid
+            models.Index(fields=['epg', 'start_time']),
+            models.Index(fields=['epg', 'end_time']),
+        ]
+
     def __str__(self):
         return f"{self.title} ({self.start_time} - {self.end_time})"
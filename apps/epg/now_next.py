@@ -0,0 +1,115 @@
+"""
+Now/next programme cache.
+
+XC short EPG requests only need the programme on air and the few after it, but are
+made for every channel an app shows. A periodic task (and every EPG refresh) stores
+the upcoming programmes of each mapped EPGData in Redis, so those requests read one
+key instead of querying ProgramData. Readers drop programmes that have ended since
+the last refresh and fall back to the database when too few remain.
+"""
+
+import json
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+from core.utils import RedisClient
+
+logger = logging.getLogger(__name__)
+
+NOW_NEXT_INTERVAL = 300  # Seconds between refreshes (see CELERY_BEAT_SCHEDULE)
+NOW_NEXT_HORIZON = timedelta(hours=6)  # Programmes starting within this window are cached
+NOW_NEXT_SIZE = 12  # Most programmes cached per EPGData
+NOW_NEXT_TTL = NOW_NEXT_INTERVAL * 3
+REFRESH_BATCH_SIZE = 500  # EPGData refreshed per query
+
+
+def now_next_key(epg_id):
+    return f"epg:now_next:{epg_id}"
+
+
+def refresh_now_next(epg_ids=None):
+    """
+    Cache the upcoming programmes of the given EPGData, or of every EPGData mapped to a channel.
+
+    Returns:
+        int: Number of EPGData refreshed
+    """
+    from apps.channels.models import Channel
+    from .models import ProgramData
+
+    if epg_ids is None:
+        epg_ids = Channel.objects.filter(epg_data__isnull=False).values_list('epg_data_id', flat=True).distinct()
+    epg_ids = list(epg_ids)
+
+    now = timezone.now()
+    redis_client = RedisClient.get_client()
+
+    for i in range(0, len(epg_ids), REFRESH_BATCH_SIZE):
+        batch = epg_ids[i:i + REFRESH_BATCH_SIZE]
+        upcoming = {epg_id: [] for epg_id in batch}
+
+        programs = ProgramData.objects.filter(
+            epg_id__in=batch,
+            end_time__gt=now,
+            start_time__lt=now + NOW_NEXT_HORIZON,
+        ).order_by('epg_id', 'start_time').values_list('epg_id', 'id', 'start_time', 'end_time', 'title', 'description')
+
+        for epg_id, program_id, start_time, end_time, title, description in programs.iterator(chunk_size=5000):
+            if len(upcoming[epg_id]) < NOW_NEXT_SIZE:
+                upcoming[epg_id].append([program_id, start_time.timestamp(), end_time.timestamp(), title, description])
+
+        pipe = redis_client.pipeline(transaction=False)
+        for epg_id, entries in upcoming.items():
+            pipe.set(now_next_key(epg_id), json.dumps(entries), ex=NOW_NEXT_TTL)
+        pipe.execute()
+
+    logger.debug(f"Refreshed now/next programmes for {len(epg_ids)} EPG entries")
+    return len(epg_ids)
+
+
+def drop_now_next(epg_ids):
+    """Drop cached now/next programmes so readers use the database until the next refresh"""
+    epg_ids = list(epg_ids)
+    if not epg_ids:
+        return
+    try:
+        RedisClient.get_client().delete(*(now_next_key(epg_id) for epg_id in epg_ids))
+    except Exception as e:
+        logger.warning(f"Failed to drop now/next programmes: {e}")
+
+
+def get_now_next(epg_id, limit, now=None):
+    """
+    Return the programme on air and the ones after it, limit in total.
+
+    Returns:
+        Optional[list]: Unsaved ProgramData instances, or None if the cache can't answer
+    """
+    from .models import ProgramData
+
+    try:
+        cached = RedisClient.get_client().get(now_next_key(epg_id))
+    except Exception as e:
+        logger.warning(f"Failed to read now/next programmes for EPG {epg_id}: {e}")
+        return None
+    if cached is None:
+        return None
+
+    now = (now or timezone.now()).timestamp()
+    entries = [entry for entry in json.loads(cached) if entry[2] > now][:limit]
+    if len(entries) < limit:
+        return None  # Past the cached horizon or size, let the database answer
+
+    return [
+        ProgramData(
+            id=program_id,
+            epg_id=epg_id,
+            start_time=datetime.fromtimestamp(start, tz=dt_timezone.utc),
+            end_time=datetime.fromtimestamp(end, tz=dt_timezone.utc),
+            title=title,
+            description=description,
+        )
+        for program_id, start, end, title, description in entries
+    ]
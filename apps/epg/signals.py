@@ -4,6 +4,7 @@ from .models import EPGSource, EPGData
 from .tasks import refresh_epg_data, delete_epg_refresh_task_by_id
 from django_celery_beat.models import PeriodicTask, IntervalSchedule
 from core.utils import is_protected_path, send_websocket_update
+from apps.output.cache import invalidate_epg_cache
 import json
 import logging
 import os
@@ -194,3 +195,18 @@ def delete_cached_files(sender, instance, **kwargs):
                 logger.info(f"Deleted extracted file: {instance.extracted_file_path}")
             except OSError as e:
                 logger.error(f"Error deleting extracted file {instance.extracted_file_path}: {e}")
+
+# Fields generated guides depend on; status updates during refreshes keep cached guides valid
+GUIDE_FIELDS = {
+    EPGSource: {'custom_properties', 'is_active', 'source_type'},
+    EPGData: {'name', 'icon_url', 'tvg_id'},
+}
+
+@receiver([post_save, post_delete], sender=EPGSource)
+@receiver([post_save, post_delete], sender=EPGData)
+def invalidate_generated_guides(sender, **kwargs):
+    """Changes to EPG sources and entries, e.g. dummy EPG patterns, make cached guides stale"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not set(update_fields) & GUIDE_FIELDS[sender]:
+        return
+    invalidate_epg_cache()
@@ -24,6 +24,9 @@ from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 
 from .models import EPGSource, EPGData, ProgramData
+from .fragments import FragmentFingerprints, rebuild_fragments, render_fragments, drop_fragments
+from .now_next import refresh_now_next, drop_now_next
+from apps.output.cache import invalidate_epg_cache
 from core.utils import acquire_task_lock, release_task_lock, send_websocket_update, cleanup_memory, log_system_event
 
 logger = logging.getLogger(__name__)
@@ -146,6 +149,15 @@ def refresh_all_epg_data():
     return "EPG data refreshed."
 
 
+@shared_task
+def refresh_epg_now_next():
+    """Periodically re-cache the on-air and next programmes of every mapped channel"""
+    try:
+        refresh_now_next()
+    except Exception as e:
+        logger.error(f"Error refreshing now/next programmes: {e}", exc_info=True)
+
+
 @shared_task
 def refresh_epg_data(source_id):
     if not acquire_task_lock('refresh_epg_data', source_id):
@@ -1359,6 +1371,16 @@ def parse_programs_for_tvg_id(epg_id):
 
 
         logger.info(f"Completed program parsing for tvg_id={epg.tvg_id}.")
+
+        # Pre-render the new programmes; the next source refresh fingerprints them
+        try:
+            render_fragments([epg.id])
+            refresh_now_next([epg.id])
+        except Exception as e:
+            logger.error(f"Error rendering XMLTV fragments for tvg_id={epg.tvg_id}: {e}", exc_info=True)
+            drop_fragments([epg.id])
+            drop_now_next([epg.id])
+        invalidate_epg_cache()
     finally:
         # Reset internal caches and pools that lxml might be keeping
         try:
@@ -1502,6 +1524,7 @@ def parse_programs_for_source(epg_source, tvg_id=None):
         # where clients might see empty/partial EPG data during the transition
         all_programs_to_create = []
         programs_by_channel = {tvg_id: 0 for tvg_id in mapped_tvg_ids}  # Track count per channel
+        fingerprints = FragmentFingerprints()  # Detects which channels' programmes changed
         total_programs = 0
         skipped_programs = 0
         last_progress_update = 0
@@ -1548,7 +1571,7 @@ def parse_programs_for_source(epg_source, tvg_id=None):
                     custom_properties_json = custom_props if custom_props else None
 
                     epg_id = tvg_id_to_epg_id[channel_id]
-                    all_programs_to_create.append(ProgramData(
+                    program = ProgramData(
                         epg_id=epg_id,
                         start_time=start_time,
                         end_time=end_time,
@@ -1557,7 +1580,9 @@ def parse_programs_for_source(epg_source, tvg_id=None):
                         sub_title=sub_title,
                         tvg_id=channel_id,
                         custom_properties=custom_properties_json
-                    ))
+                    )
+                    all_programs_to_create.append(program)
+                    fingerprints.add(program)
                     total_programs += 1
                     programs_by_channel[channel_id] += 1
 
@@ -1674,6 +1699,15 @@ def parse_programs_for_source(epg_source, tvg_id=None):
         logger.info(f"Completed parsing programs for source: {epg_source.name} - "
                f"{total_programs:,} programs for {channels_with_programs} channels, "
                f"skipped {skipped_programs:,} programs for unmapped channels")
+
+        # Pre-render the XMLTV programmes of channels whose programmes changed
+        rebuild_fragments(fingerprints.hexdigests(mapped_epg_ids), stale_ids=unmapped_epg_ids)
+        invalidate_epg_cache()
+        try:
+            refresh_now_next(mapped_epg_ids)  # Programme IDs changed
+        except Exception as e:
+            logger.error(f"Error refreshing now/next programmes for source {epg_source.name}: {e}", exc_info=True)
+            drop_now_next(mapped_epg_ids)
         return True
 
     except Exception as e:
@@ -1698,6 +1732,7 @@ def parse_programs_for_source(epg_source, tvg_id=None):
         # Explicitly release any remaining large data structures
         programs_to_create = None
         programs_by_channel = None
+        fingerprints = None
         mapped_epg_ids = None
         mapped_tvg_ids = None
         tvg_id_to_epg_id = None
@@ -1776,6 +1811,11 @@ def fetch_schedules_direct(source):
                     logger.info(f"Created ProgramData '{title}' for tvg_id '{tvg_id}'.")
                 else:
                     logger.info(f"Updated ProgramData '{title}' for tvg_id '{tvg_id}'.")
+
+            # Render from the database until this channel is pre-rendered again
+            drop_fragments([epg_data.id])
+            drop_now_next([epg_data.id])
+            invalidate_epg_cache()
     except Exception as e:
         logger.error(f"Error fetching Schedules Direct data from {source.name}: {e}", exc_info=True)
 
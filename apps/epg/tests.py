@@ -0,0 +1,58 @@
+import json
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.accounts.models import User
+from apps.channels.models import Channel
+from apps.epg.models import EPGData, ProgramData
+
+
+class EPGGridAPITest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username="admin", user_level=10))
+        self.epg = EPGData.objects.create(tvg_id="news.example", name="News")
+        now = timezone.now()
+        for hour in range(-3, 30):
+            ProgramData.objects.create(
+                epg=self.epg,
+                start_time=now + timedelta(hours=hour),
+                end_time=now + timedelta(hours=hour + 1),
+                title=f"Show {hour}",
+                tvg_id="news.example",
+            )
+        for number in (1, 2):
+            channel = Channel.objects.create(channel_number=number, name=f"News {number}")
+            Channel.objects.filter(id=channel.id).update(epg_data=self.epg)  # Skip the programme refresh signal
+        self.unmapped = Channel.objects.create(channel_number=3, name="Unmapped")
+
+    def get_grid(self, query=""):
+        response = self.client.get(f"/api/epg/grid/{query}")
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b"".join(response.streaming_content))
+
+    def test_grid_pages_by_channel(self):
+        full = self.get_grid()
+        self.assertIsNone(full["next_offset"])
+        self.assertEqual(full["total_channels"], 3)
+
+        first = self.get_grid("?channel_offset=0&channel_limit=2")
+        second = self.get_grid("?channel_offset=2&channel_limit=2")
+        self.assertEqual(first["next_offset"], 2)
+        self.assertIsNone(second["next_offset"])
+        # The shared EPG's programmes are only sent with its first channel
+        self.assertEqual({p["tvg_id"] for p in first["data"]}, {"news.example"})
+        self.assertEqual({p["tvg_id"] for p in second["data"]}, {str(self.unmapped.uuid)})
+        self.assertEqual(len(first["data"]) + len(second["data"]), len(full["data"]))
+        # Recently ended, running and the next 24 hours of programmes
+        self.assertEqual(len(first["data"]), 26)
+
+    def test_grid_time_window(self):
+        start = timezone.now() + timedelta(hours=5, minutes=30)
+        query = f"?start={(start).isoformat()}&end={(start + timedelta(hours=2)).isoformat()}".replace("+", "%2B")
+        titles = sorted(p["title"] for p in self.get_grid(query)["data"] if p["tvg_id"] == "news.example")
+        self.assertEqual(titles, ["Show 5", "Show 6", "Show 7"])
+        self.assertEqual(self.client.get("/api/epg/grid/?start=soon").status_code, 400)
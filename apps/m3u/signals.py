@@ -1,7 +1,8 @@
 # apps/m3u/signals.py
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
-from .models import M3UAccount
+from .models import M3UAccount, M3UAccountProfile
+from apps.channels.tune_plan import invalidate_tune_plans
 from .tasks import refresh_single_m3u_account, refresh_m3u_groups, delete_m3u_refresh_task_by_id
 from django_celery_beat.models import PeriodicTask, IntervalSchedule
 import json
@@ -9,6 +10,21 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Fields a channel tune plan depends on; saves limited to other fields (e.g. refresh status) keep plans valid
+TUNE_PLAN_FIELDS = {
+    M3UAccount: {'is_active', 'user_agent'},
+    M3UAccountProfile: {'is_active', 'is_default', 'max_streams', 'search_pattern', 'replace_pattern'},
+}
+
+@receiver([post_save, post_delete], sender=M3UAccountProfile)
+@receiver([post_save, post_delete], sender=M3UAccount)
+def invalidate_account_tune_plans(sender, **kwargs):
+    """Account, profile and user agent changes make cached channel tune plans stale"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not set(update_fields) & TUNE_PLAN_FIELDS[sender]:
+        return
+    invalidate_tune_plans()
+
 @receiver(post_save, sender=M3UAccount)
 def refresh_account_on_save(sender, instance, created, **kwargs):
     """
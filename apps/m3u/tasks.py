@@ -14,6 +14,8 @@ from django.core.cache import cache
 from django.db import transaction
 from .models import M3UAccount
 from apps.channels.models import Stream, ChannelGroup, ChannelGroupM3UAccount
+from apps.channels.tune_plan import invalidate_tune_plans
+from apps.output.cache import invalidate_output_cache
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.utils import timezone
@@ -2137,6 +2139,7 @@ def sync_auto_channels(account_id, scan_start_time=None):
         logger.info(
             f"Auto channel sync complete for account {account.name}: {channels_created} created, {channels_updated} updated, {channels_deleted} deleted"
         )
+        invalidate_output_cache()  # Channels and memberships were partly created and renumbered in bulk
         return f"Auto sync: {channels_created} channels created, {channels_updated} updated, {channels_deleted} deleted"
 
     except Exception as e:
@@ -2852,6 +2855,10 @@ def refresh_single_m3u_account(account_id):
             total_processed=streams_processed,
         )
 
+        # Stream URLs were bulk updated without signals, so cached tune plans and playlists may be stale
+        invalidate_tune_plans()
+        invalidate_output_cache()
+
         # Send final update with complete metrics and explicitly include success status
         send_m3u_update(
             account_id,
@@ -0,0 +1,389 @@
+"""
+Shared render cache for generated M3U playlists and XMLTV guides.
+
+Rendered output is stored once in Redis, gzip-compressed, for all workers. It is
+served as-is to clients that accept gzip and decompressed for the rest. While one
+worker renders a given key, concurrent requests for the same key wait briefly for its
+result instead of rendering the same output again (single flight). Renders run in a
+greenlet of their own, so they finish and reach the cache at their own pace rather
+than at the pace of the client that triggered them.
+
+Keys include a content version per output kind kept in Redis. Saving or deleting
+the channels, groups, logos, profiles and streams outputs are built from bumps the
+M3U and EPG versions (see apps/channels/signals.py), and EPG refreshes bump the EPG
+version, so every worker stops serving stale bodies at once while unchanged outputs
+are served without touching the database.
+
+The version also yields a (weak) ETag and Last-Modified for every output, so polling
+clients that send If-None-Match or If-Modified-Since get a 304 without a body.
+Cached bodies are served gzip- or, when the brotli package is installed,
+brotli-compressed to clients that accept it.
+"""
+
+import contextvars
+import gzip
+import hashlib
+import logging
+import time
+import uuid
+import zlib
+
+import gevent
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from core.utils import RedisClient
+from gevent.queue import Queue
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_KINDS = ("m3u", "epg")
+M3U_CACHE_TTL = 300  # Safety net for changes made without signals, e.g. bulk updates
+EPG_CACHE_TTL = 300
+XC_NUMBERS_TTL = 24 * 3600  # Maps are keyed by render version; the TTL only frees unused ones
+
+OUTPUT_LOCK_TTL = 600  # Longest a render may hold its single-flight lock
+OUTPUT_LOCK_WAIT = 5  # Longest a request waits for another worker's render before rendering itself
+
+RENDER_DONE = object()  # Queued after the last chunk of a render
+
+# Delete a render lock only if it still holds our token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def get_output_version(kind):
+    """
+    Return the content version of an output kind and when it last changed.
+
+    Returns:
+        Tuple[Optional[int], Optional[float]]: (version, unix time), or (None, None) if Redis is unavailable
+    """
+    try:
+        redis_client = RedisClient.get_client()
+        version, modified = redis_client.mget(f"output:{kind}:version", f"output:{kind}:modified")
+        if modified is None:
+            # Never invalidated yet: start the clock now, the same for every worker
+            redis_client.set(f"output:{kind}:modified", time.time(), nx=True)
+            modified = redis_client.get(f"output:{kind}:modified")
+        return int(version or 0), float(modified)
+    except Exception as e:
+        logger.warning(f"Failed to read {kind} render version: {e}")
+        return None, None
+
+
+def invalidate_output_cache(kinds=OUTPUT_KINDS):
+    """Mark every cached output of the given kinds as stale"""
+    try:
+        pipe = RedisClient.get_client().pipeline()
+        for kind in kinds:
+            pipe.incr(f"output:{kind}:version")
+            pipe.set(f"output:{kind}:modified", time.time())
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to invalidate {'/'.join(kinds)} render cache: {e}")
+
+
+def invalidate_epg_cache():
+    """Mark every cached guide as stale after programme or EPG source changes"""
+    invalidate_output_cache(("epg",))
+
+
+def query_digest(query_string):
+    """Hash of a request's query string for cache keys; XC clients pass their password in it"""
+    return hashlib.sha1(query_string.encode("utf-8")).hexdigest()
+
+
+def m3u_cache_key(version, base_url, profile_name, user, query_string):
+    """Cache key for one rendered playlist; the base URL is part of every line"""
+    return f"output:m3u:{version}:{base_url}:{profile_name or 'all'}:{user.username if user else 'anonymous'}:{query_digest(query_string)}"
+
+
+def epg_cache_key(version, base_url, profile_name, user, query_string):
+    """Cache key for one rendered guide; logo URLs include the base URL"""
+    return f"output:epg:{version}:{base_url}:{profile_name or 'all'}:{user.username if user else 'anonymous'}:{query_digest(query_string)}"
+
+
+def xc_live_streams_cache_key(version, base_url, user_level, profile_ids, category_id):
+    """Cache key for one XC live stream catalogue; logo URLs include the base URL"""
+    profiles = ",".join(map(str, profile_ids)) or "all"
+    return f"output:xc_live:{version}:{base_url}:{user_level}:{profiles}:{category_id or 'all'}"
+
+
+def xc_channel_numbers_key(version, user_level, profile_ids):
+    """Cache key for the XC channel number map of one user level and profile set"""
+    profiles = ",".join(map(str, profile_ids)) or "all"
+    return f"output:xc_numbers:{version}:{user_level}:{profiles}"
+
+
+def get_xc_channel_numbers(key, channel_id=None):
+    """
+    Read a cached XC channel number map, or one channel's number from it.
+
+    Returns:
+        Optional[Union[dict, int]]: The map, or the channel's number; None if not cached
+    """
+    try:
+        redis_client = RedisClient.get_client()
+        if channel_id is not None:
+            number = redis_client.hget(key, channel_id)
+            return int(number) if number is not None else None
+        cached = redis_client.hgetall(key)
+    except Exception as e:
+        logger.warning(f"Failed to read XC channel numbers {key}: {e}")
+        return None
+
+    if not cached:
+        return None
+    cached.pop(b"built", None)
+    return {int(channel_id): int(number) for channel_id, number in cached.items()}
+
+
+def cache_xc_channel_numbers(key, channel_num_map):
+    """Store an XC channel number map as a Redis hash of channel ID -> number"""
+    try:
+        pipe = RedisClient.get_client().pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping={"built": 1, **channel_num_map})  # "built" keeps maps without channels cached
+        pipe.expire(key, XC_NUMBERS_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to cache XC channel numbers {key}: {e}")
+
+
+def output_etag(cache_key, *parts):
+    """
+    ETag for the output cached under cache_key; parts add other inputs such as the time.
+
+    The ETag is weak because the same output is sent gzip-, brotli- or uncompressed under it.
+    """
+    return 'W/"%s"' % hashlib.sha1(":".join([cache_key, *map(str, parts)]).encode("utf-8")).hexdigest()
+
+
+def set_validators(response, etag, last_modified):
+    """Add ETag and Last-Modified headers to an output response"""
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def not_modified_response(request, etag, last_modified):
+    """Return a 304 response if the client's copy matches etag or last_modified, else None"""
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified) if last_modified else None)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+class OutputCompressor:
+    """Gzip-compresses output incrementally as it is streamed to the first client"""
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31: gzip container
+        self._parts = []
+        self.size = 0
+
+    def add(self, chunk):
+        data = chunk.encode("utf-8")
+        self.size += len(data)
+        compressed = self._compressor.compress(data)
+        if compressed:
+            self._parts.append(compressed)
+
+    def finish(self):
+        self._parts.append(self._compressor.flush())
+        return b"".join(self._parts)
+
+
+def get_cached_output(key):
+    """
+    Return a cached render.
+
+    Returns:
+        Optional[Tuple[bytes, dict]]: (gzip body, metadata), or None if not cached
+    """
+    try:
+        cached = RedisClient.get_client().hgetall(key)
+    except Exception as e:
+        logger.warning(f"Failed to read cached output {key}: {e}")
+        return None
+
+    if not cached or b"body" not in cached:
+        return None
+
+    body = cached.pop(b"body")
+    return body, {name.decode("utf-8"): value.decode("utf-8") for name, value in cached.items()}
+
+
+def cache_output(key, body, ttl, **metadata):
+    """Store a gzip-compressed render with its metadata for ttl seconds"""
+    try:
+        pipe = RedisClient.get_client().pipeline()
+        pipe.delete(key, f"{key}:br")
+        pipe.hset(key, mapping={"body": body, **{name: str(value) for name, value in metadata.items()}})
+        pipe.expire(key, ttl)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to cache output {key}: {e}")
+
+
+def acquire_render_lock(key):
+    """
+    Try to become the only worker rendering key.
+
+    Returns:
+        Optional[str]: A token for release_render_lock, or None if another request holds the lock
+    """
+    token = uuid.uuid4().hex
+    try:
+        if RedisClient.get_client().set(f"{key}:lock", token, nx=True, ex=OUTPUT_LOCK_TTL):
+            return token
+        return None
+    except Exception as e:
+        logger.warning(f"Failed to take render lock for {key}: {e}")
+        return token  # Without Redis, render without coordination
+
+
+def release_render_lock(key, token):
+    """Release the render lock for key if token still holds it"""
+    try:
+        redis_client = RedisClient.get_client()
+        redis_client.register_script(RELEASE_LOCK_SCRIPT)(keys=[f"{key}:lock"], args=[token])
+    except Exception as e:
+        logger.warning(f"Failed to release render lock for {key}: {e}")
+
+
+def wait_for_cached_output(key, timeout=OUTPUT_LOCK_WAIT):
+    """Wait for the request holding the render lock for key to cache its result"""
+    redis_client = RedisClient.get_client()
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        cached = get_cached_output(key)
+        if cached:
+            return cached
+        if not redis_client.exists(f"{key}:lock"):
+            return get_cached_output(key)  # The render finished, or failed without caching
+        gevent.sleep(0.25)  # Yield to other requests in this worker while waiting
+
+    logger.warning(f"Gave up waiting for another worker to render {key}")
+    return None
+
+
+def render_output(key, token, chunks, ttl, finish=None):
+    """
+    Render output into the shared cache in a greenlet of its own while streaming it to the requesting client.
+
+    The render doesn't wait for the client: chunks it hasn't read yet are queued, and the
+    output is cached and the render lock released even if the client is slow or disconnects.
+
+    Args:
+        key: Cache key, or None to only stream the output
+        token: Render lock token from acquire_render_lock to release when done, or None
+        chunks: Iterable of str chunks, consumed in the render greenlet
+        ttl: Seconds to cache the output for
+        finish: Optional callable run after the last chunk, returning metadata to cache with the output
+
+    Returns:
+        Iterator[str]: The chunks, for a StreamingHttpResponse
+    """
+    queue = Queue()
+    caller_connection = connections[DEFAULT_DB_ALIAS]
+
+    def render():
+        compressor = OutputCompressor()
+        try:
+            for chunk in chunks:
+                compressor.add(chunk)
+                queue.put(chunk)
+                gevent.sleep(0)  # Let the client take what is ready
+            metadata = finish() if finish else {}
+            if key:
+                body = compressor.finish()
+                cache_output(key, body, ttl, **metadata)
+                logger.debug(f"Cached output {key} ({compressor.size} bytes, {len(body)} compressed)")
+            queue.put(RENDER_DONE)
+        except Exception as e:
+            logger.error(f"Failed to render output {key}: {e}")
+            queue.put(e)
+        finally:
+            if token:
+                release_render_lock(key, token)
+            # Close the connection the render opened for itself, if any
+            if connections[DEFAULT_DB_ALIAS] is not caller_connection:
+                connections[DEFAULT_DB_ALIAS].close()
+
+    greenlet = gevent.Greenlet(render)
+    if caller_connection.in_atomic_block:
+        # A render started inside a transaction (e.g. in tests) must see its data, so it shares the
+        # caller's context and database connection; otherwise it gets a connection of its own
+        greenlet.gr_context = contextvars.copy_context()
+    greenlet.start()
+
+    def stream():
+        while True:
+            chunk = queue.get()
+            if chunk is RENDER_DONE:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    return stream()
+
+
+def accepted_encodings(request):
+    """Content codings the client accepts, ignoring ones it marks with q=0"""
+    encodings = set()
+    for coding in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        name, _, params = coding.partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+
+def get_brotli_body(key, body):
+    """Return the brotli variant of a cached gzip body, compressing it on first use"""
+    redis_client = RedisClient.get_client()
+    try:
+        cached = redis_client.get(f"{key}:br")
+        if cached is not None:
+            return cached
+    except Exception as e:
+        logger.warning(f"Failed to read brotli output {key}: {e}")
+
+    br_body = brotli.compress(gzip.decompress(body), quality=5)
+    try:
+        ttl = redis_client.ttl(key)
+        if ttl > 0:
+            redis_client.set(f"{key}:br", br_body, ex=ttl)
+    except Exception as e:
+        logger.warning(f"Failed to cache brotli output {key}: {e}")
+    return br_body
+
+
+def cached_output_response(request, key, body, content_type):
+    """Build a response from a gzip-compressed cached body, in the best coding the client accepts"""
+    encodings = accepted_encodings(request)
+    if brotli is not None and "br" in encodings:
+        response = HttpResponse(get_brotli_body(key, body), content_type=content_type)
+        response["Content-Encoding"] = "br"
+    elif "gzip" in encodings:
+        response = HttpResponse(body, content_type=content_type)
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(gzip.decompress(body), content_type=content_type)
+    response["Vary"] = "Accept-Encoding"
+    return response
@@ -1,6 +1,24 @@
-from django.test import TestCase, Client
+from django.db import connection
+from django.test import TestCase, Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+import gzip
+from datetime import timedelta
+from unittest import mock
+
+import gevent
+
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.channels.models import Channel, ChannelGroup, Logo
+from apps.epg.fragments import drop_fragments, get_fragments, render_fragments
+from apps.epg.models import EPGData, ProgramData
+from apps.output.cache import get_cached_output, get_output_version, m3u_cache_key
+from apps.output.views import generate_epg, generate_m3u, get_xc_channel_number, xc_get_live_streams
+from core.utils import RedisClient
+
 class OutputM3UTest(TestCase):
     def setUp(self):
         self.client = Client()
@@ -37,3 +55,124 @@ class OutputM3UTest(TestCase):
 
         self.assertEqual(response.status_code, 403, "POST with body should return 403 Forbidden")
         self.assertIn("POST requests with body are not allowed, body is:", response.content.decode())
+
+
+class M3URenderCacheTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def render(self):
+        response = generate_m3u(self.factory.get("/output/m3u"))
+        if response.streaming:
+            return b"".join(response.streaming_content).decode()
+        return response.content.decode()
+
+    def test_channel_changes_invalidate_cached_playlist(self):
+        channel = Channel.objects.create(channel_number=1, name="Before")
+        self.assertIn(",Before\n", self.render())
+        # Served from the render cache until a channel changes
+        self.assertIn(",Before\n", self.render())
+
+        channel.name = "After"
+        channel.save()
+        self.assertIn(",After\n", self.render())
+
+    def test_render_completes_without_the_client(self):
+        Channel.objects.create(channel_number=1, name="Cached")
+        request = self.factory.get("/output/m3u")
+        key = m3u_cache_key(get_output_version("m3u")[0], "http://testserver", None, None, "")
+
+        generate_m3u(request)  # The client goes away without reading anything
+        for _ in range(100):
+            if get_cached_output(key):
+                break
+            gevent.sleep(0.05)
+        self.assertIn(b",Cached\n", gzip.decompress(get_cached_output(key)[0]))
+        self.assertFalse(RedisClient.get_client().exists(f"{key}:lock"))
+
+    def test_unchanged_playlist_is_not_modified(self):
+        channel = Channel.objects.create(channel_number=1, name="Before")
+        etag = generate_m3u(self.factory.get("/output/m3u"))["ETag"]
+        self.assertTrue(etag.startswith('W/"'))  # Shared by the gzip, brotli and identity bodies
+
+        response = generate_m3u(self.factory.get("/output/m3u", HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 304)
+
+        channel.name = "After"
+        channel.save()
+        response = generate_m3u(self.factory.get("/output/m3u", HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class EPGFragmentTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.factory = RequestFactory()
+        self.epg = EPGData.objects.create(tvg_id="news.example", name="News")
+        channel = Channel.objects.create(channel_number=7, name="News")
+        Channel.objects.filter(id=channel.id).update(epg_data=self.epg)  # Skip the programme refresh signal
+
+        start = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=2)
+        for hour in range(0, 72, 3):
+            ProgramData.objects.create(
+                epg=self.epg,
+                start_time=start + timedelta(hours=hour),
+                end_time=start + timedelta(hours=hour + 3),
+                title=f"Show {hour} & more",
+                description="Desc",
+                custom_properties={"categories": ["News"], "season": "2", "episode": "5", "new": True},
+            )
+        self.addCleanup(drop_fragments, [self.epg.id])
+
+    def render(self, query=""):
+        # Bypass the shared output cache so each render goes through the generator
+        with mock.patch("apps.output.views.get_cached_output", return_value=None), \
+                mock.patch("apps.output.cache.cache_output"):
+            return b"".join(generate_epg(self.factory.get(f"/output/epg{query}")).streaming_content).decode()
+
+    def test_fragments_match_database_render(self):
+        for query in ("", "?days=1"):
+            drop_fragments([self.epg.id])
+            expected = self.render(query)
+            render_fragments([self.epg.id])
+            self.assertIsNotNone(get_fragments(self.epg.id))
+            self.assertEqual(self.render(query), expected)
+            self.assertIn('channel="7"', expected)
+        self.assertLess(self.render("?days=1").count("<programme "), self.render().count("<programme "))
+
+    def test_queries_do_not_grow_with_channels(self):
+        render_fragments([self.epg.id])
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.render()
+            return len(queries)
+
+        self.render()  # Warm up settings lookups cached per process
+        few = count_queries()
+        for number in range(8, 28):
+            logo = Logo.objects.create(name=f"News {number}", url=f"http://logos.example/{number}.png")
+            channel = Channel.objects.create(channel_number=number, name=f"News {number}", logo=logo)
+            Channel.objects.filter(id=channel.id).update(epg_data=self.epg)
+        self.assertEqual(count_queries(), few)
+
+
+class XCLiveStreamsTest(TestCase):
+    def test_category_listing_uses_full_list_numbers(self):
+        news = ChannelGroup.objects.create(name="News")
+        sports = ChannelGroup.objects.create(name="Sports")
+        Channel.objects.create(channel_number=5, name="Sports 5", channel_group=sports)
+        Channel.objects.create(channel_number=5.1, name="News 5.1", channel_group=news)
+        user = User.objects.create(username="xc", user_level=10)
+        request = RequestFactory().get("/player_api.php")
+
+        full = {stream["name"]: stream["num"] for stream in xc_get_live_streams(request, user)}
+        self.assertEqual(full, {"Sports 5": 5, "News 5.1": 6})
+        self.assertEqual([stream["num"] for stream in xc_get_live_streams(request, user, str(news.id))], [6])
+        # Short EPG lookups read the same shared map
+        self.assertEqual(get_xc_channel_number(user, Channel.objects.get(name="News 5.1")), 6)
+
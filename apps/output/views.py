@@ -2,10 +2,12 @@ import ipaddress
 from django.http import HttpResponse, JsonResponse, Http404, HttpResponseForbidden, StreamingHttpResponse
 from rest_framework.response import Response
 from django.urls import reverse
-from apps.channels.models import Channel, ChannelProfile, ChannelGroup
+from apps.channels.models import Channel, ChannelProfile, ChannelGroup, ChannelStream
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from apps.epg.models import ProgramData
+from apps.epg.fragments import get_fragments_many, iter_fragments, render_programme
+from apps.epg.now_next import get_now_next
 from apps.accounts.models import User
 from core.models import CoreSettings, NETWORK_ACCESS
 from dispatcharr.utils import network_access_allowed
@@ -19,15 +21,40 @@ from tzlocal import get_localzone
 from urllib.parse import urlparse
 import base64
 import logging
+from django.db.models import Exists, OuterRef, Prefetch
 from django.db.models.functions import Lower
 import os
 from apps.m3u.utils import calculate_tuner_count
 import regex
 from core.utils import log_system_event
 import hashlib
+from .cache import (
+    EPG_CACHE_TTL,
+    M3U_CACHE_TTL,
+    OutputCompressor,
+    acquire_render_lock,
+    cache_output,
+    cache_xc_channel_numbers,
+    cached_output_response,
+    epg_cache_key,
+    get_cached_output,
+    get_output_version,
+    get_xc_channel_numbers,
+    m3u_cache_key,
+    not_modified_response,
+    output_etag,
+    render_output,
+    set_validators,
+    wait_for_cached_output,
+    xc_channel_numbers_key,
+    xc_live_streams_cache_key,
+)
 
 logger = logging.getLogger(__name__)
 
+M3U_BATCH_SIZE = 1000  # Channels loaded and written out per batch when generating M3U playlists
+EPG_CHANNEL_BATCH_SIZE = 100  # Channels written out, and whose programme fragments are loaded, per batch in XMLTV guides
+
 def get_client_identifier(request):
     """Get client information including IP, user agent, and a unique hash identifier
 
@@ -112,22 +139,35 @@ def generate_m3u(request, profile_name=None, user=None):
     # Check if this is a POST request and the body is not empty (which we don't want to allow)
     logger.debug("Generating M3U for profile: %s, user: %s, method: %s", profile_name, user.username if user else "Anonymous", request.method)
 
-    # Check cache for recent identical request (helps with double-GET from browsers)
-    from django.core.cache import cache
-    cache_params = f"{profile_name or 'all'}:{user.username if user else 'anonymous'}:{request.GET.urlencode()}"
-    content_cache_key = f"m3u_content:{cache_params}"
-
-    cached_content = cache.get(content_cache_key)
-    if cached_content:
-        logger.debug("Serving M3U from cache")
-        response = HttpResponse(cached_content, content_type="audio/x-mpegurl")
-        response["Content-Disposition"] = 'attachment; filename="channels.m3u"'
-        return response
     # Check if this is a POST request with data (which we don't want to allow)
     if request.method == "POST" and request.body:
         if request.body.decode() != '{}':
             return HttpResponseForbidden("POST requests with body are not allowed, body is: {}".format(request.body.decode()))
 
+    def cached_response(cached):
+        logger.debug("Serving M3U from cache")
+        body, metadata = cached
+        log_m3u_download(request, profile_name, user, int(metadata.get("channels", 0)))
+        response = cached_output_response(request, content_cache_key, body, "audio/x-mpegurl")
+        response["Content-Disposition"] = 'attachment; filename="channels.m3u"'
+        response["Cache-Control"] = "no-cache"
+        return set_validators(response, etag, last_modified)
+
+    # Serve a cached render of this playlist unless channels changed since (see apps/output/cache.py).
+    # Clients polling with the playlist's ETag get a 304 until it changes.
+    base_url = build_absolute_uri_with_port(request, '')
+    render_version, last_modified = get_output_version("m3u")
+    content_cache_key = None
+    if render_version is not None:
+        content_cache_key = m3u_cache_key(render_version, base_url, profile_name, user, request.GET.urlencode())
+        etag = output_etag(content_cache_key)
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified:
+            return not_modified
+        cached = get_cached_output(content_cache_key)
+        if cached:
+            return cached_response(cached)
+
     if user is not None:
         if user.user_level == 0:
             user_profile_count = user.channel_profiles.count()
@@ -173,6 +213,16 @@ def generate_m3u(request, profile_name=None, user=None):
     # Options: 'channel_number' (default), 'tvg_id', 'gracenote'
     tvg_id_source = request.GET.get('tvg_id_source', 'channel_number').lower()
 
+    # Load each channel's group and logo with the channel, and its streams in one
+    # extra query per batch when direct URLs are needed
+    channels = channels.select_related('channel_group', 'logo')
+    if use_direct_urls:
+        channels = channels.prefetch_related(Prefetch(
+            'channelstream_set',
+            queryset=ChannelStream.objects.select_related('stream').only('channel_id', 'order', 'stream__url').order_by('order'),
+            to_attr='ordered_channel_streams',
+        ))
+
     # Build EPG URL with query parameters if needed
     # Check if this is an XC API request (has username/password in GET params and user is authenticated)
     xc_username = request.GET.get('username')
@@ -180,7 +230,6 @@ def generate_m3u(request, profile_name=None, user=None):
 
     if user is not None and xc_username and xc_password:
         # This is an XC API request - use XC-style EPG URL
-        base_url = build_absolute_uri_with_port(request, '')
         epg_url = f"{base_url}/xmltv.php?username={xc_username}&password={xc_password}"
     else:
         # Regular request - use standard EPG endpoint
@@ -195,79 +244,104 @@ def generate_m3u(request, profile_name=None, user=None):
         else:
             epg_url = epg_base_url
 
-    # Add x-tvg-url and url-tvg attribute for EPG URL
-    m3u_content = f'#EXTM3U x-tvg-url="{epg_url}" url-tvg="{epg_url}"\n'
+    # URLs that only differ by ID are built once and filled in per channel
+    logo_cache_url = base_url + reverse('api:channels:logo-cache', args=['LOGO_ID'])
+    proxy_stream_url = f"{base_url}/proxy/ts/stream/"
 
-    # Start building M3U content
-    for channel in channels:
-        group_title = channel.channel_group.name if channel.channel_group else "Default"
+    channel_count = 0
 
-        # Format channel number as integer if it has no decimal component
-        if channel.channel_number is not None:
-            if channel.channel_number == int(channel.channel_number):
-                formatted_channel_number = int(channel.channel_number)
-            else:
-                formatted_channel_number = channel.channel_number
-        else:
-            formatted_channel_number = ""
+    def m3u_generator():
+        nonlocal channel_count
 
-        # Determine the tvg-id based on the selected source
-        if tvg_id_source == 'tvg_id' and channel.tvg_id:
-            tvg_id = channel.tvg_id
-        elif tvg_id_source == 'gracenote' and channel.tvc_guide_stationid:
-            tvg_id = channel.tvc_guide_stationid
-        else:
-            # Default to channel number (original behavior)
-            tvg_id = str(formatted_channel_number) if formatted_channel_number != "" else str(channel.id)
+        # Add x-tvg-url and url-tvg attribute for EPG URL
+        yield f'#EXTM3U x-tvg-url="{epg_url}" url-tvg="{epg_url}"\n'
 
-        tvg_name = channel.name
+        lines = []
+        for channel in channels.iterator(chunk_size=M3U_BATCH_SIZE):
+            group_title = channel.channel_group.name if channel.channel_group else "Default"
 
-        tvg_logo = ""
-        if channel.logo:
-            if use_cached_logos:
-                # Use cached logo as before
-                tvg_logo = build_absolute_uri_with_port(request, reverse('api:channels:logo-cache', args=[channel.logo.id]))
-            else:
-                # Try to find direct logo URL from channel's streams
-                direct_logo = channel.logo.url if channel.logo.url.startswith(('http://', 'https://')) else None
-                # If direct logo found, use it; otherwise fall back to cached version
-                if direct_logo:
-                    tvg_logo = direct_logo
+            # Format channel number as integer if it has no decimal component
+            if channel.channel_number is not None:
+                if channel.channel_number == int(channel.channel_number):
+                    formatted_channel_number = int(channel.channel_number)
                 else:
-                    tvg_logo = build_absolute_uri_with_port(request, reverse('api:channels:logo-cache', args=[channel.logo.id]))
+                    formatted_channel_number = channel.channel_number
+            else:
+                formatted_channel_number = ""
 
-        # create possible gracenote id insertion
-        tvc_guide_stationid = ""
-        if channel.tvc_guide_stationid:
-            tvc_guide_stationid = (
-                f'tvc-guide-stationid="{channel.tvc_guide_stationid}" '
-            )
+            # Determine the tvg-id based on the selected source
+            if tvg_id_source == 'tvg_id' and channel.tvg_id:
+                tvg_id = channel.tvg_id
+            elif tvg_id_source == 'gracenote' and channel.tvc_guide_stationid:
+                tvg_id = channel.tvc_guide_stationid
+            else:
+                # Default to channel number (original behavior)
+                tvg_id = str(formatted_channel_number) if formatted_channel_number != "" else str(channel.id)
 
-        extinf_line = (
-            f'#EXTINF:-1 tvg-id="{tvg_id}" tvg-name="{tvg_name}" tvg-logo="{tvg_logo}" '
-            f'tvg-chno="{formatted_channel_number}" {tvc_guide_stationid}group-title="{group_title}",{channel.name}\n'
-        )
+            tvg_name = channel.name
 
-        # Determine the stream URL based on the direct parameter
-        if use_direct_urls:
-            # Try to get the first stream's direct URL
-            first_stream = channel.streams.order_by('channelstream__order').first()
-            if first_stream and first_stream.url:
-                # Use the direct stream URL
-                stream_url = first_stream.url
-            else:
-                # Fall back to proxy URL if no direct URL available
-                stream_url = build_absolute_uri_with_port(request, f"/proxy/ts/stream/{channel.uuid}")
-        else:
-            # Standard behavior - use proxy URL
-            stream_url = build_absolute_uri_with_port(request, f"/proxy/ts/stream/{channel.uuid}")
+            tvg_logo = ""
+            if channel.logo:
+                # Use the direct logo URL if requested and available, otherwise the cached logo
+                if not use_cached_logos and channel.logo.url.startswith(('http://', 'https://')):
+                    tvg_logo = channel.logo.url
+                else:
+                    tvg_logo = logo_cache_url.replace('LOGO_ID', str(channel.logo.id))
 
-        m3u_content += extinf_line + stream_url + "\n"
+            # create possible gracenote id insertion
+            tvc_guide_stationid = ""
+            if channel.tvc_guide_stationid:
+                tvc_guide_stationid = (
+                    f'tvc-guide-stationid="{channel.tvc_guide_stationid}" '
+                )
+
+            lines.append(
+                f'#EXTINF:-1 tvg-id="{tvg_id}" tvg-name="{tvg_name}" tvg-logo="{tvg_logo}" '
+                f'tvg-chno="{formatted_channel_number}" {tvc_guide_stationid}group-title="{group_title}",{channel.name}\n'
+            )
 
-    # Cache the generated content for 2 seconds to handle double-GET requests
-    cache.set(content_cache_key, m3u_content, 2)
+            # Use the first stream's direct URL if requested, falling back to the proxy URL
+            stream_url = None
+            if use_direct_urls and channel.ordered_channel_streams:
+                stream_url = channel.ordered_channel_streams[0].stream.url
+            lines.append((stream_url or f"{proxy_stream_url}{channel.uuid}") + "\n")
+            channel_count += 1
+
+            if len(lines) >= M3U_BATCH_SIZE:
+                yield "".join(lines)
+                lines = []
+
+        if lines:
+            yield "".join(lines)
+
+    def finish_render():
+        log_m3u_download(request, profile_name, user, channel_count)
+        return {"channels": channel_count}
+
+    # If another request is rendering this playlist right now, wait briefly for that render instead of repeating it
+    render_lock = None
+    if content_cache_key:
+        render_lock = acquire_render_lock(content_cache_key)
+        if not render_lock:
+            cached = wait_for_cached_output(content_cache_key)
+            if cached:
+                return cached_response(cached)
+
+    # The render fills the shared cache and releases the lock whether or not this client keeps reading
+    response = StreamingHttpResponse(
+        render_output(content_cache_key, render_lock, m3u_generator(), M3U_CACHE_TTL, finish_render),
+        content_type="audio/x-mpegurl",
+    )
+    response["Content-Disposition"] = 'attachment; filename="channels.m3u"'
+    response["Cache-Control"] = "no-cache"
+    if content_cache_key:
+        set_validators(response, etag, last_modified)
+    return response
 
-    # Log system event for M3U download (with deduplication based on client)
+
+def log_m3u_download(request, profile_name, user, channel_count):
+    """Log system event for M3U download (with deduplication based on client)"""
+    from django.core.cache import cache
     client_id, client_ip, user_agent = get_client_identifier(request)
     event_cache_key = f"m3u_download:{user.username if user else 'anonymous'}:{profile_name or 'all'}:{client_id}"
     if not cache.get(event_cache_key):
@@ -275,16 +349,12 @@ def generate_m3u(request, profile_name=None, user=None):
             event_type='m3u_download',
             profile=profile_name or 'all',
             user=user.username if user else 'anonymous',
-            channels=channels.count(),
+            channels=channel_count,
             client_ip=client_ip,
             user_agent=user_agent,
         )
         cache.set(event_cache_key, True, 2)  # Prevent duplicate events for 2 seconds
 
-    response = HttpResponse(m3u_content, content_type="audio/x-mpegurl")
-    response["Content-Disposition"] = 'attachment; filename="channels.m3u"'
-    return response
-
 
 def generate_fallback_programs(channel_id, channel_name, now, num_days, program_length_hours, fallback_title, fallback_description):
     """
@@ -1234,50 +1304,51 @@ def generate_epg(request, profile_name=None, user=None):
     by their associated EPGData record.
     This version filters data based on the 'days' parameter and sends keep-alives during processing.
     """
-    # Check cache for recent identical request (helps with double-GET from browsers)
+    # Check the shared cache for a recent identical request (see apps/output/cache.py).
+    # If another request is rendering it right now, wait briefly for that render instead of repeating it.
     from django.core.cache import cache
-    cache_params = f"{profile_name or 'all'}:{user.username if user else 'anonymous'}:{request.GET.urlencode()}"
-    content_cache_key = f"epg_content:{cache_params}"
-
-    cached_content = cache.get(content_cache_key)
-    if cached_content:
+    render_version, last_modified = get_output_version("epg")
+    content_cache_key = epg_cache_key(render_version, build_absolute_uri_with_port(request, ''), profile_name, user, request.GET.urlencode())
+
+    # The guide also moves with the clock (days windows, dummy programmes), so its
+    # validators change at least hourly even without content changes
+    hour = int(time.time() // 3600)
+    etag = output_etag(content_cache_key, hour)
+    if last_modified is not None:
+        last_modified = max(last_modified, hour * 3600)
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified:
+            return not_modified
+
+    cached = get_cached_output(content_cache_key)
+    render_lock = None
+    if not cached:
+        render_lock = acquire_render_lock(content_cache_key)
+        if not render_lock:
+            cached = wait_for_cached_output(content_cache_key)
+    if cached:
         logger.debug("Serving EPG from cache")
-        response = HttpResponse(cached_content, content_type="application/xml")
+        response = cached_output_response(request, content_cache_key, cached[0], "application/xml")
         response["Content-Disposition"] = 'attachment; filename="Dispatcharr.xml"'
         response["Cache-Control"] = "no-cache"
+        if last_modified is not None:
+            set_validators(response, etag, last_modified)
         return response
 
     def epg_generator():
         """Generator function that yields EPG data with keep-alives during processing"""
         # Send initial HTTP headers as comments (these will be ignored by XML parsers but keep connection alive)
 
-        xml_lines = []
-        xml_lines.append('<?xml version="1.0" encoding="UTF-8"?>')
-        xml_lines.append(
-            '<tv generator-info-name="Dispatcharr" generator-info-url="https://github.com/Dispatcharr/Dispatcharr">'
+        # Send the header before any query runs
+        yield (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<tv generator-info-name="Dispatcharr" generator-info-url="https://github.com/Dispatcharr/Dispatcharr">\n'
         )
+        xml_lines = []
 
         # Get channels based on user/profile
         if user is not None:
-            if user.user_level == 0:
-                user_profile_count = user.channel_profiles.count()
-
-                # If user has ALL profiles or NO profiles, give unrestricted access
-                if user_profile_count == 0:
-                    # No profile filtering - user sees all channels based on user_level
-                    channels = Channel.objects.filter(user_level__lte=user.user_level).order_by("channel_number")
-                else:
-                    # User has specific limited profiles assigned
-                    filters = {
-                        "channelprofilemembership__enabled": True,
-                        "user_level__lte": user.user_level,
-                        "channelprofilemembership__channel_profile__in": user.channel_profiles.all()
-                    }
-                    channels = Channel.objects.filter(**filters).distinct().order_by("channel_number")
-            else:
-                channels = Channel.objects.filter(user_level__lte=user.user_level).order_by(
-                    "channel_number"
-                )
+            channels = xc_get_user_channels(user)
         else:
             if profile_name is not None:
                 try:
@@ -1292,8 +1363,14 @@ def generate_epg(request, profile_name=None, user=None):
             else:
                 channels = Channel.objects.all().order_by("channel_number")
 
+        # Load each channel's logo and EPG source with the channel, and whether its EPG has stored programmes
+        channels = channels.select_related('logo', 'epg_data__epg_source').annotate(
+            has_programs=Exists(ProgramData.objects.filter(epg_id=OuterRef('epg_data_id')))
+        )
+
         # Check if the request wants to use direct logo URLs instead of cache
         use_cached_logos = request.GET.get('cachedlogos', 'true').lower() != 'false'
+        logo_cache_url = build_absolute_uri_with_port(request, reverse('api:channels:logo-cache', args=['LOGO_ID']))
 
         # Get the source to use for tvg-id value
         # Options: 'channel_number' (default), 'tvg_id', 'gracenote'
@@ -1320,24 +1397,8 @@ def generate_epg(request, profile_name=None, user=None):
         # XC clients require integer channel numbers, so we need to ensure no conflicts
         channel_num_map = {}
         if user is not None:
-            # This is an XC client - build collision-free mapping
-            used_numbers = set()
-
-            # First pass: assign integers for channels that already have integer numbers
-            for channel in channels:
-                if channel.channel_number == int(channel.channel_number):
-                    num = int(channel.channel_number)
-                    channel_num_map[channel.id] = num
-                    used_numbers.add(num)
-
-            # Second pass: assign integers for channels with float numbers
-            for channel in channels:
-                if channel.channel_number != int(channel.channel_number):
-                    candidate = int(channel.channel_number)
-                    while candidate in used_numbers:
-                        candidate += 1
-                    channel_num_map[channel.id] = candidate
-                    used_numbers.add(candidate)
+            # XC client - use the user's shared collision-free mapping
+            channel_num_map = get_xc_channel_number_map(user)
 
         # Process channels for the <channel> section
         for channel in channels:
@@ -1345,7 +1406,7 @@ def generate_epg(request, profile_name=None, user=None):
             # For regular clients (user is None), use original formatting logic
             if user is not None:
                 # XC client - use collision-free integer
-                formatted_channel_number = channel_num_map[channel.id]
+                formatted_channel_number = channel_num_map.get(channel.id, int(channel.channel_number))
             else:
                 # Regular client - format channel number as integer if it has no decimal component
                 if channel.channel_number is not None:
@@ -1425,7 +1486,7 @@ def generate_epg(request, profile_name=None, user=None):
             if not tvg_logo and channel.logo:
                 if use_cached_logos:
                     # Use cached logo as before
-                    tvg_logo = build_absolute_uri_with_port(request, reverse('api:channels:logo-cache', args=[channel.logo.id]))
+                    tvg_logo = logo_cache_url.replace('LOGO_ID', str(channel.logo.id))
                 else:
                     # Try to find direct logo URL from channel's streams
                     direct_logo = channel.logo.url if channel.logo.url.startswith(('http://', 'https://')) else None
@@ -1433,20 +1494,32 @@ def generate_epg(request, profile_name=None, user=None):
                     if direct_logo:
                         tvg_logo = direct_logo
                     else:
-                        tvg_logo = build_absolute_uri_with_port(request, reverse('api:channels:logo-cache', args=[channel.logo.id]))
+                        tvg_logo = logo_cache_url.replace('LOGO_ID', str(channel.logo.id))
             display_name = channel.name
             xml_lines.append(f'  <channel id="{channel_id}">')
             xml_lines.append(f'    <display-name>{html.escape(display_name)}</display-name>')
             xml_lines.append(f'    <icon src="{html.escape(tvg_logo)}" />')
             xml_lines.append("  </channel>")
 
-        # Send all channel definitions
-        channel_xml = '\n'.join(xml_lines) + '\n'
-        yield channel_xml
-        xml_lines = []  # Clear to save memory
-
-        # Process programs for each channel
-        for channel in channels:
+            # Send channel definitions a batch at a time
+            if len(xml_lines) >= EPG_CHANNEL_BATCH_SIZE * 4:
+                yield '\n'.join(xml_lines) + '\n'
+                xml_lines = []
+
+        if xml_lines:
+            yield '\n'.join(xml_lines) + '\n'
+            xml_lines = []  # Clear to save memory
+
+        # Process programs for each channel, loading the pre-rendered fragments of a batch of channels at once
+        channel_list = list(channels)
+        fragments_by_epg = {}
+        for position, channel in enumerate(channel_list):
+            if position % EPG_CHANNEL_BATCH_SIZE == 0:
+                fragments_by_epg = get_fragments_many(
+                    batch_channel.epg_data_id
+                    for batch_channel in channel_list[position:position + EPG_CHANNEL_BATCH_SIZE]
+                    if batch_channel.epg_data_id
+                )
 
             # Use the same channel ID determination for program entries
             if tvg_id_source == 'tvg_id' and channel.tvg_id:
@@ -1458,7 +1531,7 @@ def generate_epg(request, profile_name=None, user=None):
                 # For regular clients (user is None), use original formatting logic
                 if user is not None:
                     # XC client - use collision-free integer from map
-                    formatted_channel_number = channel_num_map[channel.id]
+                    formatted_channel_number = channel_num_map.get(channel.id, int(channel.channel_number))
                 else:
                     # Regular client - format channel number as before
                     if channel.channel_number is not None:
@@ -1544,7 +1617,7 @@ def generate_epg(request, profile_name=None, user=None):
                 # Check if this is a dummy EPG with no programs (generate on-demand)
                 if channel.epg_data.epg_source and channel.epg_data.epg_source.source_type == 'dummy':
                     # This is a custom dummy EPG - check if it has programs
-                    if not channel.epg_data.programs.exists():
+                    if not channel.has_programs:
                         # No programs stored, generate on-demand using custom patterns
                         # Use actual channel name for pattern matching
                         program_length_hours = 4
@@ -1591,7 +1664,14 @@ def generate_epg(request, profile_name=None, user=None):
 
                         continue  # Skip to next channel
 
-                # For real EPG data - filter only if days parameter was specified
+                # Stream the pre-rendered fragments of real EPG data when available
+                fragments = fragments_by_epg.get(channel.epg_data_id)
+                if fragments is not None:
+                    for body in iter_fragments(fragments, channel_id, now if num_days > 0 else None, cutoff_date):
+                        yield body
+                    continue
+
+                # Not rendered yet - render from the database
                 if num_days > 0:
                     programs_qs = channel.epg_data.programs.filter(
                         start_time__gte=now,
@@ -1618,223 +1698,8 @@ def generate_epg(request, profile_name=None, user=None):
 
                     # Process each program in the chunk
                     for prog in program_chunk:
-                        start_str = prog.start_time.strftime("%Y%m%d%H%M%S %z")
-                        stop_str = prog.end_time.strftime("%Y%m%d%H%M%S %z")
-
-                        program_xml = [f'  <programme start="{start_str}" stop="{stop_str}" channel="{channel_id}">']
-                        program_xml.append(f'    <title>{html.escape(prog.title)}</title>')
-
-                        # Add subtitle if available
-                        if prog.sub_title:
-                            program_xml.append(f"    <sub-title>{html.escape(prog.sub_title)}</sub-title>")
-
-                        # Add description if available
-                        if prog.description:
-                            program_xml.append(f"    <desc>{html.escape(prog.description)}</desc>")
-
-                        # Process custom properties if available
-                        if prog.custom_properties:
-                            custom_data = prog.custom_properties or {}
-
-                            # Add categories if available
-                            if "categories" in custom_data and custom_data["categories"]:
-                                for category in custom_data["categories"]:
-                                    program_xml.append(f"    <category>{html.escape(category)}</category>")
-
-                            # Add keywords if available
-                            if "keywords" in custom_data and custom_data["keywords"]:
-                                for keyword in custom_data["keywords"]:
-                                    program_xml.append(f"    <keyword>{html.escape(keyword)}</keyword>")
-
-                            # Handle episode numbering - multiple formats supported
-                            # Prioritize onscreen_episode over standalone episode for onscreen system
-                            if "onscreen_episode" in custom_data:
-                                program_xml.append(f'    <episode-num system="onscreen">{html.escape(custom_data["onscreen_episode"])}</episode-num>')
-                            elif "episode" in custom_data:
-                                program_xml.append(f'    <episode-num system="onscreen">E{custom_data["episode"]}</episode-num>')
-
-                            # Handle dd_progid format
-                            if 'dd_progid' in custom_data:
-                                program_xml.append(f'    <episode-num system="dd_progid">{html.escape(custom_data["dd_progid"])}</episode-num>')
-
-                            # Handle external database IDs
-                            for system in ['thetvdb.com', 'themoviedb.org', 'imdb.com']:
-                                if f'{system}_id' in custom_data:
-                                    program_xml.append(f'    <episode-num system="{system}">{html.escape(custom_data[f"{system}_id"])}</episode-num>')
-
-                            # Add season and episode numbers in xmltv_ns format if available
-                            if "season" in custom_data and "episode" in custom_data:
-                                season = (
-                                    int(custom_data["season"]) - 1
-                                    if str(custom_data["season"]).isdigit()
-                                    else 0
-                                )
-                                episode = (
-                                    int(custom_data["episode"]) - 1
-                                    if str(custom_data["episode"]).isdigit()
-                                    else 0
-                                )
-                                program_xml.append(f'    <episode-num system="xmltv_ns">{season}.{episode}.</episode-num>')
-
-                            # Add language information
-                            if "language" in custom_data:
-                                program_xml.append(f'    <language>{html.escape(custom_data["language"])}</language>')
-
-                            if "original_language" in custom_data:
-                                program_xml.append(f'    <orig-language>{html.escape(custom_data["original_language"])}</orig-language>')
-
-                            # Add length information
-                            if "length" in custom_data and isinstance(custom_data["length"], dict):
-                                length_value = custom_data["length"].get("value", "")
-                                length_units = custom_data["length"].get("units", "minutes")
-                                program_xml.append(f'    <length units="{html.escape(length_units)}">{html.escape(str(length_value))}</length>')
-
-                            # Add video information
-                            if "video" in custom_data and isinstance(custom_data["video"], dict):
-                                program_xml.append("    <video>")
-                                for attr in ['present', 'colour', 'aspect', 'quality']:
-                                    if attr in custom_data["video"]:
-                                        program_xml.append(f"      <{attr}>{html.escape(custom_data['video'][attr])}</{attr}>")
-                                program_xml.append("    </video>")
-
-                            # Add audio information
-                            if "audio" in custom_data and isinstance(custom_data["audio"], dict):
-                                program_xml.append("    <audio>")
-                                for attr in ['present', 'stereo']:
-                                    if attr in custom_data["audio"]:
-                                        program_xml.append(f"      <{attr}>{html.escape(custom_data['audio'][attr])}</{attr}>")
-                                program_xml.append("    </audio>")
-
-                            # Add subtitles information
-                            if "subtitles" in custom_data and isinstance(custom_data["subtitles"], list):
-                                for subtitle in custom_data["subtitles"]:
-                                    if isinstance(subtitle, dict):
-                                        subtitle_type = subtitle.get("type", "")
-                                        type_attr = f' type="{html.escape(subtitle_type)}"' if subtitle_type else ""
-                                        program_xml.append(f"    <subtitles{type_attr}>")
-                                        if "language" in subtitle:
-                                            program_xml.append(f"      <language>{html.escape(subtitle['language'])}</language>")
-                                        program_xml.append("    </subtitles>")
-
-                            # Add rating if available
-                            if "rating" in custom_data:
-                                rating_system = custom_data.get("rating_system", "TV Parental Guidelines")
-                                program_xml.append(f'    <rating system="{html.escape(rating_system)}">')
-                                program_xml.append(f'      <value>{html.escape(custom_data["rating"])}</value>')
-                                program_xml.append(f"    </rating>")
-
-                            # Add star ratings
-                            if "star_ratings" in custom_data and isinstance(custom_data["star_ratings"], list):
-                                for star_rating in custom_data["star_ratings"]:
-                                    if isinstance(star_rating, dict) and "value" in star_rating:
-                                        system_attr = f' system="{html.escape(star_rating["system"])}"' if "system" in star_rating else ""
-                                        program_xml.append(f"    <star-rating{system_attr}>")
-                                        program_xml.append(f"      <value>{html.escape(star_rating['value'])}</value>")
-                                        program_xml.append("    </star-rating>")
-
-                            # Add reviews
-                            if "reviews" in custom_data and isinstance(custom_data["reviews"], list):
-                                for review in custom_data["reviews"]:
-                                    if isinstance(review, dict) and "content" in review:
-                                        review_type = review.get("type", "text")
-                                        attrs = [f'type="{html.escape(review_type)}"']
-                                        if "source" in review:
-                                            attrs.append(f'source="{html.escape(review["source"])}"')
-                                        if "reviewer" in review:
-                                            attrs.append(f'reviewer="{html.escape(review["reviewer"])}"')
-                                        attr_str = " ".join(attrs)
-                                        program_xml.append(f'    <review {attr_str}>{html.escape(review["content"])}</review>')
-
-                            # Add images
-                            if "images" in custom_data and isinstance(custom_data["images"], list):
-                                for image in custom_data["images"]:
-                                    if isinstance(image, dict) and "url" in image:
-                                        attrs = []
-                                        for attr in ['type', 'size', 'orient', 'system']:
-                                            if attr in image:
-                                                attrs.append(f'{attr}="{html.escape(image[attr])}"')
-                                        attr_str = " " + " ".join(attrs) if attrs else ""
-                                        program_xml.append(f'    <image{attr_str}>{html.escape(image["url"])}</image>')
-
-                            # Add enhanced credits handling
-                            if "credits" in custom_data:
-                                program_xml.append("    <credits>")
-                                credits = custom_data["credits"]
-
-                                # Handle different credit types
-                                for role in ['director', 'writer', 'adapter', 'producer', 'composer', 'editor', 'presenter', 'commentator', 'guest']:
-                                    if role in credits:
-                                        people = credits[role]
-                                        if isinstance(people, list):
-                                            for person in people:
-                                                program_xml.append(f"      <{role}>{html.escape(person)}</{role}>")
-                                        else:
-                                            program_xml.append(f"      <{role}>{html.escape(people)}</{role}>")
-
-                                # Handle actors separately to include role and guest attributes
-                                if "actor" in credits:
-                                    actors = credits["actor"]
-                                    if isinstance(actors, list):
-                                        for actor in actors:
-                                            if isinstance(actor, dict):
-                                                name = actor.get("name", "")
-                                                role_attr = f' role="{html.escape(actor["role"])}"' if "role" in actor else ""
-                                                guest_attr = ' guest="yes"' if actor.get("guest") else ""
-                                                program_xml.append(f"      <actor{role_attr}{guest_attr}>{html.escape(name)}</actor>")
-                                            else:
-                                                program_xml.append(f"      <actor>{html.escape(actor)}</actor>")
-                                    else:
-                                        program_xml.append(f"      <actor>{html.escape(actors)}</actor>")
-
-                                program_xml.append("    </credits>")
-
-                            # Add program date if available (full date, not just year)
-                            if "date" in custom_data:
-                                program_xml.append(f'    <date>{html.escape(custom_data["date"])}</date>')
-
-                            # Add country if available
-                            if "country" in custom_data:
-                                program_xml.append(f'    <country>{html.escape(custom_data["country"])}</country>')
-
-                            # Add icon if available
-                            if "icon" in custom_data:
-                                program_xml.append(f'    <icon src="{html.escape(custom_data["icon"])}" />')
-
-                            # Add special flags as proper tags with enhanced handling
-                            if custom_data.get("previously_shown", False):
-                                prev_shown_details = custom_data.get("previously_shown_details", {})
-                                attrs = []
-                                if "start" in prev_shown_details:
-                                    attrs.append(f'start="{html.escape(prev_shown_details["start"])}"')
-                                if "channel" in prev_shown_details:
-                                    attrs.append(f'channel="{html.escape(prev_shown_details["channel"])}"')
-                                attr_str = " " + " ".join(attrs) if attrs else ""
-                                program_xml.append(f"    <previously-shown{attr_str} />")
-
-                            if custom_data.get("premiere", False):
-                                premiere_text = custom_data.get("premiere_text", "")
-                                if premiere_text:
-                                    program_xml.append(f"    <premiere>{html.escape(premiere_text)}</premiere>")
-                                else:
-                                    program_xml.append("    <premiere />")
-
-                            if custom_data.get("last_chance", False):
-                                last_chance_text = custom_data.get("last_chance_text", "")
-                                if last_chance_text:
-                                    program_xml.append(f"    <last-chance>{html.escape(last_chance_text)}</last-chance>")
-                                else:
-                                    program_xml.append("    <last-chance />")
-
-                            if custom_data.get("new", False):
-                                program_xml.append("    <new />")
-
-                            if custom_data.get('live', False):
-                                program_xml.append('    <live />')
-
-                        program_xml.append("  </programme>")
-
                         # Add to batch
-                        program_batch.extend(program_xml)
+                        program_batch.extend(render_programme(prog, channel_id))
 
                         # Send batch when full or send keep-alive
                         if len(program_batch) >= batch_size:
@@ -1861,30 +1726,21 @@ def generate_epg(request, profile_name=None, user=None):
                 event_type='epg_download',
                 profile=profile_name or 'all',
                 user=user.username if user else 'anonymous',
-                channels=channels.count(),
+                channels=len(channel_list),
                 client_ip=client_ip,
                 user_agent=user_agent,
             )
             cache.set(event_cache_key, True, 2)  # Prevent duplicate events for 2 seconds
 
-    # Wrapper generator that collects content for caching
-    def caching_generator():
-        collected_content = []
-        for chunk in epg_generator():
-            collected_content.append(chunk)
-            yield chunk
-        # After streaming completes, cache the full content
-        full_content = ''.join(collected_content)
-        cache.set(content_cache_key, full_content, 300)
-        logger.debug("Cached EPG content (%d bytes)", len(full_content))
-
-    # Return streaming response
+    # The render fills the shared cache and releases the lock whether or not this client keeps reading
     response = StreamingHttpResponse(
-        streaming_content=caching_generator(),
+        streaming_content=render_output(content_cache_key, render_lock, epg_generator(), EPG_CACHE_TTL),
         content_type="application/xml"
     )
     response["Content-Disposition"] = 'attachment; filename="Dispatcharr.xml"'
     response["Cache-Control"] = "no-cache"
+    if last_modified is not None:
+        set_validators(response, etag, last_modified)
     return response
 
 
@@ -1971,7 +1827,7 @@ def xc_player_api(request, full=False):
     if action == "get_live_categories":
         return JsonResponse(xc_get_live_categories(user), safe=False)
     elif action == "get_live_streams":
-        return JsonResponse(xc_get_live_streams(request, user, request.GET.get("category_id")), safe=False)
+        return xc_live_streams_response(request, user, request.GET.get("category_id"))
     elif action == "get_short_epg":
         return JsonResponse(xc_get_epg(request, user, short=True), safe=False)
     elif action == "get_simple_data_table":
@@ -2114,85 +1970,132 @@ def xc_get_live_categories(user):
     return response
 
 
-def xc_get_live_streams(request, user, category_id=None):
-    streams = []
+def xc_channel_number_map(channel_numbers):
+    """
+    Build collision-free integer channel numbers for XC clients (which require integers).
 
-    if user.user_level == 0:
-        user_profile_count = user.channel_profiles.count()
+    Channels with integer numbers keep them; channels with decimal numbers get the
+    first free integer at or above their truncated number.
 
-        # If user has ALL profiles or NO profiles, give unrestricted access
-        if user_profile_count == 0:
-            # No profile filtering - user sees all channels based on user_level
-            filters = {"user_level__lte": user.user_level}
-            if category_id is not None:
-                filters["channel_group__id"] = category_id
-            channels = Channel.objects.filter(**filters).order_by("channel_number")
-        else:
-            # User has specific limited profiles assigned
-            filters = {
-                "channelprofilemembership__enabled": True,
-                "user_level__lte": user.user_level,
-                "channelprofilemembership__channel_profile__in": user.channel_profiles.all()
-            }
-            if category_id is not None:
-                filters["channel_group__id"] = category_id
-            channels = Channel.objects.filter(**filters).distinct().order_by("channel_number")
-    else:
-        if not category_id:
-            channels = Channel.objects.filter(user_level__lte=user.user_level).order_by("channel_number")
-        else:
-            channels = Channel.objects.filter(
-                channel_group__id=category_id, user_level__lte=user.user_level
-            ).order_by("channel_number")
+    Args:
+        channel_numbers: (channel id, channel number) pairs ordered by channel number
 
-    # Build collision-free mapping for XC clients (which require integers)
-    # This ensures channels with float numbers don't conflict with existing integers
-    channel_num_map = {}  # Maps channel.id -> integer channel number for XC
-    used_numbers = set()  # Track all assigned integer channel numbers
+    Returns:
+        dict: Channel ID -> integer channel number
+    """
+    channel_numbers = list(channel_numbers)
+    channel_num_map = {}
+    used_numbers = set()
 
     # First pass: assign integers for channels that already have integer numbers
-    for channel in channels:
-        if channel.channel_number == int(channel.channel_number):
-            # Already an integer, use it directly
-            num = int(channel.channel_number)
-            channel_num_map[channel.id] = num
+    for channel_id, channel_number in channel_numbers:
+        if channel_number == int(channel_number):
+            num = int(channel_number)
+            channel_num_map[channel_id] = num
             used_numbers.add(num)
 
     # Second pass: assign integers for channels with float numbers
-    # Find next available number to avoid collisions
-    for channel in channels:
-        if channel.channel_number != int(channel.channel_number):
-            # Has decimal component, need to find available integer
-            # Start from truncated value and increment until we find an unused number
-            candidate = int(channel.channel_number)
+    # Start from truncated value and increment until we find an unused number
+    for channel_id, channel_number in channel_numbers:
+        if channel_number != int(channel_number):
+            candidate = int(channel_number)
             while candidate in used_numbers:
                 candidate += 1
-            channel_num_map[channel.id] = candidate
+            channel_num_map[channel_id] = candidate
             used_numbers.add(candidate)
 
-    # Build the streams list with the collision-free channel numbers
-    for channel in channels:
-        channel_num_int = channel_num_map[channel.id]
+    return channel_num_map
+
+
+def xc_get_user_channels(user):
+    """Channels an XC user can see, ordered by channel number"""
+    if user.user_level == 0 and user.channel_profiles.exists():
+        # User has specific limited profiles assigned
+        return Channel.objects.filter(
+            channelprofilemembership__enabled=True,
+            user_level__lte=user.user_level,
+            channelprofilemembership__channel_profile__in=user.channel_profiles.all(),
+        ).distinct().order_by("channel_number")
+
+    # If user has ALL profiles or NO profiles, give unrestricted access based on user_level
+    return Channel.objects.filter(user_level__lte=user.user_level).order_by("channel_number")
+
+
+def xc_profile_ids(user):
+    """IDs of the channel profiles limiting what an XC user sees; empty when not limited"""
+    return sorted(user.channel_profiles.values_list("id", flat=True)) if user.user_level == 0 else []
+
+
+def get_xc_channel_number_map(user, channel_numbers=None):
+    """
+    Collision-free XC numbers of all of a user's channels, shared through Redis.
+
+    The map is cached per user level and profile set until channels change, so the
+    live stream catalogue, the XC guide and short EPG lookups agree on every number.
+
+    Args:
+        channel_numbers: The user's (channel id, channel number) pairs, if already loaded
+    """
+    render_version, _ = get_output_version("m3u")
+    key = xc_channel_numbers_key(render_version, user.user_level, xc_profile_ids(user)) if render_version is not None else None
+
+    if channel_numbers is None:
+        cached = get_xc_channel_numbers(key) if key else None
+        if cached is not None:
+            return cached
+        channel_numbers = xc_get_user_channels(user).values_list("id", "channel_number")
+
+    channel_num_map = xc_channel_number_map(channel_numbers)
+    if key:
+        cache_xc_channel_numbers(key, channel_num_map)
+    return channel_num_map
+
+
+def get_xc_channel_number(user, channel):
+    """A channel's XC number for a user, read from the shared map with one lookup"""
+    render_version, _ = get_output_version("m3u")
+    if render_version is not None:
+        number = get_xc_channel_numbers(xc_channel_numbers_key(render_version, user.user_level, xc_profile_ids(user)), channel.id)
+        if number is not None:
+            return number
+    return get_xc_channel_number_map(user).get(channel.id, int(channel.channel_number))
+
+
+def xc_get_live_streams(request, user, category_id=None):
+    """
+    Build the XC live stream catalogue from one query over the user's channels.
 
+    Channel numbers are mapped over all of the user's channels, so a channel has
+    the same number in every category listing as in the full list and the XMLTV guide.
+    """
+    channels = list(
+        xc_get_user_channels(user).values_list(
+            "id", "name", "channel_number", "logo_id", "created_at", "channel_group_id"
+        )
+    )
+    channel_num_map = get_xc_channel_number_map(user, [(channel[0], channel[2]) for channel in channels])
+
+    logo_cache_url = build_absolute_uri_with_port(request, reverse("api:channels:logo-cache", args=["LOGO_ID"]))
+    category_id = int(category_id) if category_id else None
+
+    streams = []
+    for channel_id, name, _, logo_id, created_at, channel_group_id in channels:
+        if category_id is not None and channel_group_id != category_id:
+            continue
+
+        channel_num_int = channel_num_map[channel_id]
         streams.append(
             {
                 "num": channel_num_int,
-                "name": channel.name,
+                "name": name,
                 "stream_type": "live",
-                "stream_id": channel.id,
-                "stream_icon": (
-                    None
-                    if not channel.logo
-                    else build_absolute_uri_with_port(
-                        request,
-                        reverse("api:channels:logo-cache", args=[channel.logo.id])
-                    )
-                ),
+                "stream_id": channel_id,
+                "stream_icon": logo_cache_url.replace("LOGO_ID", str(logo_id)) if logo_id else None,
                 "epg_channel_id": str(channel_num_int),
-                "added": int(channel.created_at.timestamp()),
+                "added": int(created_at.timestamp()),
                 "is_adult": 0,
-                "category_id": str(channel.channel_group.id),
-                "category_ids": [channel.channel_group.id],
+                "category_id": str(channel_group_id),
+                "category_ids": [channel_group_id],
                 "custom_sid": None,
                 "tv_archive": 0,
                 "direct_source": "",
@@ -2203,6 +2106,44 @@ def xc_get_live_streams(request, user, category_id=None):
     return streams
 
 
+def xc_live_streams_response(request, user, category_id=None):
+    """
+    Respond to get_live_streams from the shared output cache.
+
+    Catalogues are cached as compact JSON per user level, profile set and category,
+    and invalidated with cached playlists when channels, groups, logos or profiles change.
+    """
+    render_version, _ = get_output_version("m3u")
+    content_cache_key = None
+    if render_version is not None:
+        content_cache_key = xc_live_streams_cache_key(
+            render_version, build_absolute_uri_with_port(request, ""), user.user_level, xc_profile_ids(user), category_id
+        )
+        cached = get_cached_output(content_cache_key)
+        if cached:
+            return cached_output_response(request, content_cache_key, cached[0], "application/json")
+
+    body = json.dumps(xc_get_live_streams(request, user, category_id), separators=(",", ":"))
+    if content_cache_key:
+        compressor = OutputCompressor()
+        compressor.add(body)
+        cache_output(content_cache_key, compressor.finish(), M3U_CACHE_TTL)
+    return HttpResponse(body, content_type="application/json")
+
+
+def xc_stored_programs(epg_data, short, limit):
+    """Stored programmes for an XC EPG request: the on-air and next ones for short EPG, else all upcoming"""
+    now = django_timezone.now()
+    if short == False:
+        return epg_data.programs.filter(start_time__gte=now).order_by('start_time')
+
+    # Served from the now/next cache when it holds enough programmes
+    programs = get_now_next(epg_data.id, limit, now)
+    if programs is None:
+        programs = epg_data.programs.filter(end_time__gt=now).order_by('start_time')[:limit]
+    return programs
+
+
 def xc_get_epg(request, user, short=False):
     channel_id = request.GET.get('stream_id')
     if not channel_id:
@@ -2237,34 +2178,8 @@ def xc_get_epg(request, user, short=False):
     if not channel:
         raise Http404()
 
-    # Calculate the collision-free integer channel number for this channel
-    # This must match the logic in xc_get_live_streams to ensure consistency
-    # Get all channels in the same category for collision detection
-    category_channels = Channel.objects.filter(
-        channel_group=channel.channel_group
-    ).order_by("channel_number")
-
-    channel_num_map = {}
-    used_numbers = set()
-
-    # First pass: assign integers for channels that already have integer numbers
-    for ch in category_channels:
-        if ch.channel_number == int(ch.channel_number):
-            num = int(ch.channel_number)
-            channel_num_map[ch.id] = num
-            used_numbers.add(num)
-
-    # Second pass: assign integers for channels with float numbers
-    for ch in category_channels:
-        if ch.channel_number != int(ch.channel_number):
-            candidate = int(ch.channel_number)
-            while candidate in used_numbers:
-                candidate += 1
-            channel_num_map[ch.id] = candidate
-            used_numbers.add(candidate)
-
-    # Get the mapped integer for this specific channel
-    channel_num_int = channel_num_map.get(channel.id, int(channel.channel_number))
+    # Collision-free integer channel number, the same as in xc_get_live_streams
+    channel_num_int = get_xc_channel_number(user, channel)
 
     limit = int(request.GET.get('limit', 4))
     if channel.epg_data:
@@ -2279,20 +2194,10 @@ def xc_get_epg(request, user, short=False):
                 )
             else:
                 # Has stored programs, use them
-                if short == False:
-                    programs = channel.epg_data.programs.filter(
-                        start_time__gte=django_timezone.now()
-                    ).order_by('start_time')
-                else:
-                    programs = channel.epg_data.programs.all().order_by('start_time')[:limit]
+                programs = xc_stored_programs(channel.epg_data, short, limit)
         else:
             # Regular EPG with stored programs
-            if short == False:
-                programs = channel.epg_data.programs.filter(
-                    start_time__gte=django_timezone.now()
-                ).order_by('start_time')
-            else:
-                programs = channel.epg_data.programs.all().order_by('start_time')[:limit]
+            programs = xc_stored_programs(channel.epg_data, short, limit)
     else:
         # No EPG data assigned, generate default dummy
         programs = generate_dummy_programs(channel_id=channel_id, channel_name=channel.name, epg_source=None)
@@ -1,4 +1,5 @@
 """Shared configuration between proxy types"""
+import os
 import time
 from django.db import connection
 
@@ -10,7 +11,13 @@ class BaseConfig:
     RETRY_WAIT_INTERVAL = 0.5  # seconds to wait between retries
     CONNECTION_TIMEOUT = 10  # seconds to wait for initial connection
     MAX_STREAM_SWITCHES = 10  # Maximum number of stream switch attempts before giving up
-    BUFFER_CHUNK_SIZE = 188 * 1361  # ~256KB
+    BUFFER_CHUNK_SIZE = 188 * 1361  # ~256KB, used until the ingest bitrate is known
+    CHUNK_TARGET_DURATION = 0.5  # Seconds of stream per buffer chunk once the bitrate is measured (0 keeps BUFFER_CHUNK_SIZE)
+    MIN_BUFFER_CHUNK_SIZE = 188 * 128  # ~24KB lower bound for adaptive chunk sizing
+    MAX_BUFFER_CHUNK_SIZE = 188 * 11155  # ~2MB upper bound for adaptive chunk sizing
+    BITRATE_SAMPLE_INTERVAL = 2.0  # Seconds of ingest per bitrate measurement
+    BUFFER_BACKEND = 'auto'  # 'auto' keeps chunks in the owner process until another worker attaches, 'redis' always uses Redis
+    LOCAL_BUFFER_MAX_BYTES = 128 * 1024 * 1024  # Max bytes per channel held in-process by the 'auto' backend
     BUFFERING_TIMEOUT = 15  # Seconds to wait for buffering before switching streams
     BUFFER_SPEED = 1 # What speed to condsider the stream buffering, 1x is normal speed, 2x is double speed, etc.
 
@@ -79,19 +86,40 @@ class TSConfig(BaseConfig):
     """Configuration settings for TS proxy"""
 
     # Buffer settings
-    INITIAL_BEHIND_CHUNKS = 4  # How many chunks behind to start a client (4 chunks = ~1MB)
+    INITIAL_BEHIND_CHUNKS = 4  # How many chunks behind to start a client (4 chunks = ~2s with adaptive chunk sizing)
     CHUNK_BATCH_SIZE = 5       # How many chunks to fetch in one batch
     KEEPALIVE_INTERVAL = 0.5   # Seconds between keepalive packets when at buffer head
+    CHUNK_WAIT_TIMEOUT = 1.0   # Max seconds a client at buffer head waits for a new chunk notification before re-checking
+    LOCAL_CHUNK_CACHE_MAX_BYTES = 8 * 1024 * 1024  # Per channel, per worker in-memory chunk cache (0 disables)
+    LOCAL_CHUNK_CACHE_MAX_AGE = 10  # Seconds a cached chunk may be served before it is evicted
+    BUFFER_RETENTION_SECONDS = None  # Seconds of media the owner keeps per channel before deleting old chunks (None = the redis_chunk_ttl proxy setting, which also caps it)
+    BUFFER_MEMORY_BUDGET_MB = 0  # Memory for TS buffers across all channels, split evenly between active channels (0 = unlimited)
+    KEYFRAME_JOIN = True       # Start new clients at the keyframe nearest their start position
+    KEYFRAME_SEARCH_WINDOW = 10  # How many chunks back from the buffer head to look for a keyframe
     # Chunk read timeout
     CHUNK_TIMEOUT = 5        # Seconds to wait for each chunk read
 
     # Streaming settings
     TARGET_BITRATE = 8000000   # Target bitrate (8 Mbps)
     STREAM_TIMEOUT = 20        # Disconnect after this many seconds of no data
+    LAST_DATA_UPDATE_INTERVAL = 1.0  # Minimum seconds between last data timestamp updates in Redis
     HEALTH_CHECK_INTERVAL = 5  # Check stream health every N seconds
 
     # Resource management
     CLEANUP_INTERVAL = 60  # Check for inactive channels every 60 seconds
+    WORKER_LOAD_INTERVAL = 5  # Seconds between updates of this worker's load in the worker scoreboard
+    OWNERSHIP_REBALANCE = True  # Hand channels over to less loaded workers
+    REBALANCE_INTERVAL = 30  # Seconds between rebalancing checks
+    REBALANCE_CPU_MARGIN = 25  # CPU percentage points a worker must be above the least loaded worker before handing off
+    REBALANCE_COOLDOWN = 300  # Seconds before a handed-off channel can move again
+    HANDOFF_TIMEOUT = 5  # Seconds to wait for the other worker during an ownership hand-off
+
+    # Multi-node settings (all nodes share the same Redis)
+    NODE_ID = os.environ.get('DISPATCHARR_NODE_ID')  # Name of this proxy node, defaults to the hostname
+    NODE_ADDRESS = os.environ.get('DISPATCHARR_NODE_ADDRESS')  # Address other nodes and the UI can reach this node at
+    NODE_HEARTBEAT_INTERVAL = 5  # Seconds between node heartbeats
+    NODE_TIMEOUT = 15  # Seconds without a heartbeat before a node is considered down
+    OWNER_FAILOVER = True  # Take over channels whose owner worker or node went down while clients remain
 
     # Client tracking settings
     CLIENT_RECORD_TTL = 60  # How long client records persist in Redis (seconds). Client will be considered MIA after this time.
@@ -99,6 +127,7 @@ class TSConfig(BaseConfig):
     CLIENT_HEARTBEAT_INTERVAL = 5  # How often to send client heartbeats (seconds)
     GHOST_CLIENT_MULTIPLIER = 6.0  # How many heartbeat intervals before client considered ghost (6 would mean 36 seconds if heartbeat interval is 6)
     CLIENT_WAIT_TIMEOUT = 30  # Seconds to wait for client to connect
+    CONTROL_STATE_REFRESH_INTERVAL = 0.5  # How often each worker refreshes channel/client stop flags from Redis (seconds)
 
     # Stream health and recovery settings
     MAX_HEALTH_RECOVERY_ATTEMPTS = 2     # Maximum times to attempt recovery for a single stream
@@ -106,6 +135,18 @@ class TSConfig(BaseConfig):
     MIN_STABLE_TIME_BEFORE_RECONNECT = 30  # Minimum seconds a stream must be stable to try reconnect
     FAILOVER_GRACE_PERIOD = 20           # Extra time (seconds) to allow for stream switching before disconnecting clients
     URL_SWITCH_TIMEOUT = 20   # Max time allowed for a stream switch operation
+    PARALLEL_PROBE_COUNT = 3  # Alternate streams probed at once when failing over (1 tries them one at a time)
+    PROBE_TIMEOUT = 3         # Connect/read timeout in seconds for each failover probe
+    HEALTH_AWARE_FAILOVER = True  # Try streams whose stream/M3U profile health score is low after the healthy ones
+    UNHEALTHY_STREAM_SCORE = 50   # Health score (0-100) below which a stream or M3U profile is considered unhealthy
+
+    # Hot channel settings
+    HOT_CHANNELS = []              # Channel UUIDs to keep connected upstream without viewers
+    HOT_CHANNELS_TOP_N = 0         # Also treat the N most watched channels as hot (0 disables)
+    HOT_CHANNELS_LOOKBACK_HOURS = 24  # How far back client connect events count towards the most watched channels
+    HOT_CHANNEL_IDLE_TIMEOUT = 1800  # Seconds a hot channel keeps running after its last client leaves
+    HOT_CHANNEL_HOURS = None       # (start_hour, end_hour) local time during which hot channels are started ahead of viewers, None disables
+    HOT_CHANNEL_CHECK_INTERVAL = 60  # Seconds between hot channel list refreshes and warm-up checks
 
 
 
@@ -0,0 +1,42 @@
+import time
+import uuid
+from unittest import mock
+
+from django.test import TestCase
+
+from apps.proxy.ts_proxy.config_helper import ConfigHelper
+from apps.proxy.ts_proxy.hot_channels import HotChannels
+from core.models import SystemEvent
+
+
+class HotChannelsTests(TestCase):
+    def setUp(self):
+        HotChannels._refreshed_at = 0
+        self.addCleanup(setattr, HotChannels, "_refreshed_at", 0)
+
+    def test_most_watched_channels_are_hot(self):
+        popular, quiet, configured = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        for channel_id, connects in ((popular, 3), (quiet, 1)):
+            for _ in range(connects):
+                SystemEvent.objects.create(event_type="client_connect", channel_id=channel_id)
+
+        with mock.patch.object(ConfigHelper, "hot_channels", return_value=[str(configured)]), \
+                mock.patch.object(ConfigHelper, "hot_channels_top_n", return_value=1):
+            self.assertEqual(HotChannels.get_hot_channel_ids(), {str(popular), str(configured)})
+
+    def test_idle_hot_channels_are_kept_until_timeout(self):
+        HotChannels._hot_channel_ids = {"hot"}
+        HotChannels._refreshed_at = time.time()
+        now = time.time()
+
+        with mock.patch.object(ConfigHelper, "hot_channel_hours", return_value=None):
+            self.assertTrue(HotChannels.should_keep("hot", now - 60, now))
+            self.assertFalse(HotChannels.should_keep("hot", now - 3600, now))
+            self.assertFalse(HotChannels.should_keep("cold", now, now))
+
+        # Within the warm hours a hot channel is kept however long it has been idle
+        hour = time.localtime(now).tm_hour
+        with mock.patch.object(ConfigHelper, "hot_channel_hours", return_value=((hour + 1) % 24, hour)):
+            self.assertFalse(HotChannels.in_warm_hours(now))
+        with mock.patch.object(ConfigHelper, "hot_channel_hours", return_value=(hour, (hour + 1) % 24)):
+            self.assertTrue(HotChannels.should_keep("hot", now - 3600, now))
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from apps.proxy.ts_proxy.cluster import ClusterNode
+from apps.proxy.ts_proxy.config_helper import ConfigHelper
+from apps.proxy.ts_proxy.ownership import OwnershipBalancer
+
+
+def load(cpu_percent, owned_channels):
+    return {"cpu_percent": cpu_percent, "owned_channels": owned_channels, "ingest_bps": 0, "updated_at": 0}
+
+
+class OwnershipBalancerTests(SimpleTestCase):
+    def setUp(self):
+        server = SimpleNamespace(worker_id="busy", redis_client=mock.Mock(), stream_managers={})
+        self.balancer = OwnershipBalancer(server)
+        patcher = mock.patch.object(ConfigHelper, "rebalance_cpu_margin", return_value=25)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def rebalance(self, loads):
+        with mock.patch.object(self.balancer, "get_worker_loads", return_value=loads), \
+                mock.patch.object(self.balancer, "_pick_channel", return_value="channel"), \
+                mock.patch.object(self.balancer, "hand_off", return_value=True) as hand_off:
+            self.balancer.rebalance()
+        return hand_off
+
+    def test_hands_off_to_least_loaded_worker(self):
+        hand_off = self.rebalance({"busy": load(90, 6), "idle": load(10, 1), "medium": load(40, 3)})
+        hand_off.assert_called_once_with("channel", "idle")
+
+    def test_keeps_channels_when_load_is_close(self):
+        self.rebalance({"busy": load(50, 6), "idle": load(40, 1)}).assert_not_called()
+        # A big CPU gap isn't enough if it would just swap which worker has more channels
+        self.rebalance({"busy": load(90, 2), "idle": load(10, 1)}).assert_not_called()
+        self.rebalance({"busy": load(90, 6)}).assert_not_called()
+
+
+class ClusterFailoverTests(SimpleTestCase):
+    def setUp(self):
+        client_manager = mock.Mock()
+        client_manager.get_client_count.return_value = 2
+        self.redis = mock.Mock()
+        self.redis.exists.return_value = False
+        self.redis.hget.return_value = b"active"
+        self.server = SimpleNamespace(
+            worker_id="node-b:1",
+            redis_client=self.redis,
+            stream_managers={},
+            client_managers={"channel": client_manager},
+            balancer=mock.Mock(),
+            get_channel_owner=mock.Mock(return_value="node-a:1"),
+        )
+        self.cluster = ClusterNode(self.server)
+
+    def test_takes_over_channel_from_dead_node(self):
+        with mock.patch.object(self.cluster, "is_worker_alive", return_value=False):
+            self.cluster.check_owner("channel")
+        self.server.balancer.take_over.assert_called_once_with("channel", "node-a:1")
+
+    def test_leaves_channel_with_live_owner(self):
+        with mock.patch.object(self.cluster, "is_worker_alive", return_value=True):
+            self.assertFalse(self.cluster.check_owner("channel"))
+        self.server.balancer.take_over.assert_not_called()
+
+    def test_stops_fetching_channel_taken_by_another_worker(self):
+        self.server.stream_managers["channel"] = mock.Mock()
+        self.assertFalse(self.cluster.check_owner("channel"))
+        self.server.balancer.stop_fetching.assert_called_once_with("channel")
@@ -0,0 +1,352 @@
+import os
+import threading
+import time
+import tracemalloc
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from apps.proxy.ts_proxy.channel_status import ChannelStatus
+from apps.proxy.ts_proxy.config_helper import Config, ConfigHelper
+from apps.proxy.ts_proxy.constants import TS_PACKET_SIZE
+from apps.proxy.ts_proxy.redis_keys import RedisKeys
+from apps.proxy.ts_proxy.server import ProxyServer
+from apps.proxy.ts_proxy.stream_buffer import ChunkCache, StreamBuffer
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        results = [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+
+class FakeRedis:
+    """Just enough of the redis-py client for the TS buffer"""
+
+    def __init__(self):
+        self.data = {}
+        self.get_calls = 0
+        self.published = []
+
+    def get(self, key):
+        self.get_calls += 1
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        return True
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+        return True
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode()
+        return int(self.data[key])
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        self.data.setdefault(key, {})
+        if field is not None:
+            self.data[key][field] = value
+        self.data[key].update(mapping or {})
+        return 1
+
+    def zadd(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def zremrangebyscore(self, key, min_score, max_score):
+        zset = self.data.get(key, {})
+        min_score = float(min_score)
+        removed = [member for member, score in zset.items() if min_score <= score <= max_score]
+        for member in removed:
+            del zset[member]
+        return len(removed)
+
+    def zrangebyscore(self, key, min_score, max_score):
+        zset = self.data.get(key, {})
+        return [m.encode() for m, score in sorted(zset.items(), key=lambda item: item[1])
+                if min_score <= score <= max_score]
+
+    def zcard(self, key):
+        return len(self.data.get(key, {}))
+
+    def delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    def expire(self, key, ttl):
+        return key in self.data
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+        return 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+def ts_packets(count):
+    return bytes([0x47]) * (TS_PACKET_SIZE * count)
+
+
+def ts_packet(pid, payload=b"", pusi=False, adaptation=b""):
+    header = bytes([0x47, (0x40 if pusi else 0) | (pid >> 8), pid & 0xFF, 0x30 if adaptation else 0x10])
+    if adaptation:
+        header += bytes([len(adaptation)]) + adaptation
+    return (header + payload).ljust(TS_PACKET_SIZE, b"\xff")
+
+
+# PAT pointing program 1 at PMT PID 0x1000, PMT listing an H.264 stream on PID 0x100
+PAT = ts_packet(0x0000, bytes.fromhex("0000b00d0001c100000001f000") + bytes(4), pusi=True)
+PMT = ts_packet(0x1000, bytes.fromhex("0002b0120001c10000e100f0001be100f000") + bytes(4), pusi=True)
+NULL = ts_packet(0x1FFF)
+KEYFRAME = ts_packet(0x100, bytes.fromhex("000001e0000080800000000001"), pusi=True, adaptation=b"\x40")
+VIDEO = ts_packet(0x100)
+
+
+class StreamBufferTestCase(SimpleTestCase):
+    """A StreamBuffer for "test-channel" on a FakeRedis, writing 10-packet chunks"""
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.buffer = StreamBuffer("test-channel", self.redis)
+        self.buffer.target_chunk_size = TS_PACKET_SIZE * 10
+
+    def chunk_keys(self):
+        prefix = RedisKeys.buffer_chunk_prefix("test-channel")
+        return sorted(key for key in self.redis.data if key.startswith(prefix))
+
+
+class ChunkCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used_over_budget(self):
+        cache = ChunkCache(max_bytes=30, max_age=60)
+        cache.put(1, b"a" * 10)
+        cache.put(2, b"b" * 10)
+        cache.put(3, b"c" * 10)
+        cache.get_many([1])  # Touch chunk 1 so chunk 2 becomes the oldest
+        cache.put(4, b"d" * 10)
+
+        self.assertEqual(sorted(cache.get_many([1, 2, 3, 4])), [1, 3, 4])
+        self.assertEqual(cache.size, 30)
+
+    def test_expired_chunks_are_not_served(self):
+        cache = ChunkCache(max_bytes=100, max_age=0)
+        cache.put(1, b"a")
+        cache._chunks[1] = (b"a", 0)
+        self.assertEqual(cache.get_many([1]), {})
+        self.assertEqual(cache.size, 0)
+
+
+class StreamBufferCacheTests(StreamBufferTestCase):
+    def test_local_readers_share_chunks_fetched_from_redis(self):
+        for idx in range(1, 4):
+            self.redis.data[RedisKeys.buffer_chunk("test-channel", idx)] = ts_packets(10)
+        self.redis.data[RedisKeys.buffer_index("test-channel")] = b"3"
+
+        first = self.buffer.get_chunks_exact(0, 3)
+        calls_after_first = self.redis.get_calls
+        second = self.buffer.get_chunks_exact(0, 3)
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(first, second)
+        # The second reader only needs the buffer index, not the chunks
+        self.assertEqual(self.redis.get_calls - calls_after_first, 1)
+
+    def test_owner_writes_populate_cache(self):
+        self.buffer.add_chunk(ts_packets(25))
+        self.assertEqual(self.buffer.index, 2)
+        self.assertEqual(len(self.buffer.chunk_cache.get_many([1, 2])), 2)
+
+
+class StreamBufferNotificationTests(StreamBufferTestCase):
+    def test_written_chunks_are_announced_to_other_workers(self):
+        self.buffer.add_chunk(ts_packets(5))
+        self.assertEqual(self.redis.published, [])
+
+        self.buffer.add_chunk(ts_packets(5))
+        self.assertEqual(self.redis.published, [(RedisKeys.buffer_events("test-channel"), "1")])
+
+    def test_waiter_wakes_when_chunk_lands(self):
+        def notify_later():
+            time.sleep(0.05)
+            self.buffer.notify_chunk(1)
+
+        threading.Thread(target=notify_later).start()
+        started = time.time()
+        self.assertTrue(self.buffer.wait_for_chunk(0, timeout=5))
+        self.assertLess(time.time() - started, 1)
+        self.assertEqual(self.buffer.index, 1)
+
+    def test_wait_returns_immediately_when_behind_head(self):
+        self.buffer.index = 3
+        self.assertTrue(self.buffer.wait_for_chunk(2, timeout=0))
+        self.assertFalse(self.buffer.wait_for_chunk(3, timeout=0.01))
+
+
+class StreamBufferIngestTests(StreamBufferTestCase):
+    def test_chunks_are_packet_aligned_and_preserve_data(self):
+        data = os.urandom(TS_PACKET_SIZE * 35 + 100)
+        # Feed reads that straddle packet and chunk boundaries
+        for offset in range(0, len(data), 1000):
+            self.buffer.add_chunk(data[offset:offset + 1000])
+        self.buffer.stop()
+
+        chunks = [self.redis.data[RedisKeys.buffer_chunk("test-channel", idx)] for idx in range(1, self.buffer.index + 1)]
+        self.assertEqual([len(c) for c in chunks], [TS_PACKET_SIZE * 10] * 3 + [TS_PACKET_SIZE * 5])
+        self.assertEqual(b"".join(chunks), data[:TS_PACKET_SIZE * 35])
+
+    def test_chunk_size_follows_bitrate_within_bounds(self):
+        # 2 Mbps for half a second, rounded down to whole packets
+        self.assertTrue(self.buffer.set_target_chunk_size(2000000 / 8 * 0.5))
+        self.assertEqual(self.buffer.target_chunk_size, 125000 - 125000 % TS_PACKET_SIZE)
+
+        # Jitter within 10% doesn't resize
+        self.assertFalse(self.buffer.set_target_chunk_size(130000))
+
+        self.buffer.set_target_chunk_size(1)
+        self.assertEqual(self.buffer.target_chunk_size, TS_PACKET_SIZE * 128)
+        self.buffer.set_target_chunk_size(10 ** 9)
+        self.assertEqual(self.buffer.target_chunk_size, TS_PACKET_SIZE * 11155)
+
+    def test_ingest_copies_each_byte_at_most_once(self):
+        """
+        Microbenchmark of the ingest path. Socket-sized reads are fed in and the
+        emitted chunks are discarded, so peak traced memory divided by the chunk
+        size is the number of copies of a chunk alive at once while it is built.
+        """
+        class DiscardingRedis(FakeRedis):
+            def setex(self, key, ttl, value):
+                return True
+
+        buffer = StreamBuffer("bench-channel", DiscardingRedis())
+        buffer.chunk_cache.max_bytes = 0
+        buffer.target_chunk_size = TS_PACKET_SIZE * 1361
+        reads = [os.urandom(8192) for _ in range(128)]
+
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            for read in reads:
+                buffer.add_chunk(read)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        self.assertGreaterEqual(buffer.index, 3)
+        copies_per_byte = (peak - baseline) / buffer.target_chunk_size
+        self.assertLess(copies_per_byte, 1.25)
+
+
+class StreamBufferBackendTests(StreamBufferTestCase):
+    def setUp(self):
+        super().setUp()
+        self.buffer.chunk_cache.max_bytes = 0
+
+    def test_local_backend_keeps_chunks_out_of_redis(self):
+        self.buffer.use_local_backend()
+        self.buffer.add_chunk(ts_packets(30))
+
+        self.assertEqual(self.chunk_keys(), [])
+        # The index is still published so status and waiting logic keep working
+        self.assertEqual(self.redis.data[RedisKeys.buffer_index("test-channel")], 3)
+        self.assertEqual(len(self.buffer.get_chunks_exact(0, 3)), 3)
+
+    def test_switching_to_shared_backend_copies_local_chunks(self):
+        self.buffer.use_local_backend()
+        self.buffer.add_chunk(ts_packets(20))
+        self.buffer.use_shared_backend()
+        self.buffer.add_chunk(ts_packets(10))
+
+        self.assertEqual(len(self.chunk_keys()), 3)
+        self.assertEqual(
+            self.redis.data[RedisKeys.channel_metadata("test-channel")]["buffer_backend"], "redis"
+        )
+
+
+    def channel_status(self, stream_buffers):
+        status_redis = mock.Mock()
+        status_redis.hgetall.return_value = {b"state": b"active", b"owner": b"worker-1", b"buffer_backend": b"memory"}
+        status_redis.get.side_effect = {RedisKeys.buffer_index("test-channel"): b"3"}.get
+        status_redis.smembers.return_value = set()
+        proxy_server = mock.Mock(redis_client=status_redis, stream_buffers=stream_buffers, stream_managers={})
+        with mock.patch.object(ProxyServer, "get_instance", return_value=proxy_server):
+            return ChannelStatus.get_detailed_channel_info("test-channel"), status_redis
+
+    def test_status_samples_local_chunks_through_the_backend(self):
+        self.buffer.use_local_backend()
+        self.buffer.add_chunk(ts_packets(30))
+
+        info, _ = self.channel_status({"test-channel": self.buffer})
+
+        self.assertEqual(info["buffer_stats"]["keys_found"], [1, 2, 3])
+        self.assertEqual(info["buffer_stats"]["keys_missing"], [])
+
+    def test_status_on_other_workers_does_not_report_memory_chunks_missing(self):
+        info, status_redis = self.channel_status({})
+
+        self.assertTrue(info["buffer_stats"]["held_in_memory"])
+        self.assertNotIn("keys_missing", info["buffer_stats"])
+        self.assertIsNone(info["buffer_stats"]["latest_chunk_ttl"])
+        status_redis.pipeline.assert_not_called()
+        status_redis.scan.assert_not_called()
+
+class StreamBufferRetentionTests(StreamBufferTestCase):
+    def setUp(self):
+        super().setUp()
+        self.buffer.min_retained_chunks = 2
+
+    def test_chunks_older_than_retention_are_deleted(self):
+        self.buffer.retention_seconds = 0
+        self.buffer.add_chunk(ts_packets(50))
+
+        self.assertEqual(self.chunk_keys(), [RedisKeys.buffer_chunk("test-channel", i) for i in (4, 5)])
+        metadata = self.redis.data[RedisKeys.channel_metadata("test-channel")]
+        self.assertEqual(metadata["buffer_bytes"], str(TS_PACKET_SIZE * 20))
+
+    def test_retention_follows_chunk_ttl(self):
+        with mock.patch.object(ConfigHelper, "redis_chunk_ttl", return_value=60):
+            self.assertEqual(ConfigHelper.buffer_retention_seconds(), 60)
+            for configured, expected in ((20, 20), (90, 60)):
+                with mock.patch.object(Config, "BUFFER_RETENTION_SECONDS", configured):
+                    self.assertEqual(ConfigHelper.buffer_retention_seconds(), expected)
+
+    def test_memory_budget_is_shared_between_channels(self):
+        self.buffer.memory_budget = TS_PACKET_SIZE * 60
+        self.redis.zadd(RedisKeys.buffer_channels(), {"other-channel": time.time()})
+
+        self.buffer.add_chunk(ts_packets(50))
+
+        # Half of the budget, i.e. three chunks, once the other channel is counted
+        self.assertEqual(self.buffer.active_buffers, 2)
+        self.assertEqual(len(self.chunk_keys()), 3)
+
+
+class StreamBufferKeyframeTests(StreamBufferTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.buffer.add_chunk(PAT + PMT + NULL * 8)
+        self.buffer.add_chunk(NULL * 3 + KEYFRAME + VIDEO * 6)
+        self.buffer.add_chunk(NULL * 10)
+
+    def test_owner_finds_nearest_keyframe_with_psi(self):
+        self.assertEqual(self.buffer.find_join_point(1), (2, TS_PACKET_SIZE * 3, PAT + PMT))
+
+    def test_other_workers_read_keyframe_index_from_redis(self):
+        reader = StreamBuffer("test-channel", self.redis)
+        self.assertEqual(reader.index, 3)
+
+        chunk_index, offset, psi = reader.find_join_point(3)
+        self.assertEqual((chunk_index, offset, psi), (2, TS_PACKET_SIZE * 3, PAT + PMT))
+        self.assertEqual(reader.get_chunks_exact(chunk_index - 1, 1)[0][offset:offset + TS_PACKET_SIZE], KEYFRAME)
@@ -0,0 +1,30 @@
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from apps.proxy.ts_proxy.stream_health import StreamHealth
+
+
+class StreamHealthTests(SimpleTestCase):
+    def test_score(self):
+        now = time.time()
+        self.assertIsNone(StreamHealth.score({}))
+        self.assertEqual(StreamHealth.score({"error_rate": 0.0}, now), 100.0)
+
+        failing = {"error_rate": 0.5, "recent_failures": 3.0, "last_failure": now}
+        self.assertLess(StreamHealth.score(failing, now), 50)
+
+        # Recent failures fade out over time
+        self.assertGreater(StreamHealth.score(failing, now + 3600), StreamHealth.score(failing, now))
+
+    def test_unhealthy_candidates_move_last(self):
+        candidates = [[1, 10, 1], [2, 10, 1], [3, 20, 0], [4, 30, 0]]
+        stream_scores = {1: 20.0, 2: 90.0, 3: None, 4: None}
+        profile_scores = {10: 40.0, 20: 10.0, 30: None}
+
+        with mock.patch.object(StreamHealth, "get_scores", return_value=(stream_scores, profile_scores)):
+            ordered = StreamHealth.order_candidates(mock.Mock(), candidates)
+
+        # Stream 3 has no history of its own and inherits its profile's poor score
+        self.assertEqual([c[0] for c in ordered], [2, 4, 1, 3])
@@ -0,0 +1,62 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from apps.channels.models import Channel, Stream
+from apps.m3u.models import M3UAccount
+from apps.proxy.ts_proxy.stream_manager import StreamManager
+from apps.proxy.ts_proxy.url_utils import get_stream_info_for_switch
+from core.utils import RedisClient
+
+
+class StreamSwitchSlotTests(TestCase):
+    def setUp(self):
+        self.redis = RedisClient.get_client()
+        self.channel = Channel.objects.create(channel_number=1, name="Channel")
+        self.streams = {}
+        self.profiles = {}
+        for name in ("playing", "full", "free"):
+            account = M3UAccount.objects.create(name=name, server_url=f"http://{name}.example/list.m3u")
+            profile = account.profiles.get(is_default=True)
+            profile.max_streams = 1
+            profile.save()
+            self.profiles[name] = profile
+            self.streams[name] = Stream.objects.create(name=name, url=f"http://{name}.example/1.ts", m3u_account=account)
+
+        # The channel plays on "playing"; another channel uses the only connection of "full"
+        self.redis.set(f"channel_stream:{self.channel.id}", self.streams["playing"].id)
+        self.redis.set(f"stream_profile:{self.streams['playing'].id}", self.profiles["playing"].id)
+        self.redis.set(f"profile_connections:{self.profiles['playing'].id}", 1)
+        self.redis.set(f"profile_connections:{self.profiles['full'].id}", 1)
+        self.addCleanup(self.redis.delete, f"channel_stream:{self.channel.id}",
+                        *(f"stream_profile:{stream.id}" for stream in self.streams.values()),
+                        *(f"profile_connections:{profile.id}" for profile in self.profiles.values()))
+
+    def counters(self):
+        return {name: int(self.redis.get(f"profile_connections:{profile.id}") or 0)
+                for name, profile in self.profiles.items()}
+
+    def test_failed_switches_leave_slots_alone(self):
+        before = self.counters()
+
+        # Looking up a stream doesn't reserve it: callers may still drop it
+        info = get_stream_info_for_switch(str(self.channel.uuid), self.streams["free"].id)
+        self.assertEqual(info["m3u_profile_id"], self.profiles["free"].id)
+        self.assertIn("error", get_stream_info_for_switch(str(self.channel.uuid), self.streams["full"].id))
+        self.assertEqual(self.counters(), before)
+
+        # A switch to a profile that filled up in the meantime is refused before the old stream is closed
+        manager = StreamManager.__new__(StreamManager)
+        manager.channel_id = str(self.channel.uuid)
+        manager.url = "http://playing.example/1.ts"
+        manager.current_stream_id = self.streams["playing"].id
+        with mock.patch("django.db.connection.close"):  # Keep the test transaction open
+            self.assertFalse(manager.update_url("http://full.example/1.ts", self.streams["full"].id, self.profiles["full"].id))
+        self.assertEqual(self.counters(), before)
+        self.assertEqual(int(self.redis.get(f"channel_stream:{self.channel.id}")), self.streams["playing"].id)
+
+        # A switch that happens moves the slot, and releasing it frees the profile it moved to
+        self.assertTrue(self.channel.switch_stream_slot(self.streams["free"].id, self.profiles["free"].id))
+        self.assertEqual(self.counters(), {"playing": 0, "full": 1, "free": 1})
+        self.channel.release_stream()
+        self.assertEqual(self.counters(), {"playing": 0, "full": 1, "free": 0})
@@ -0,0 +1,105 @@
+"""
+Chunk storage backends for the TS stream buffer.
+
+The owner worker writes every completed chunk through the buffer's backend. The
+Redis backend makes chunks readable by every worker, while the memory backend
+keeps them inside the owner process for channels whose clients are all local.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from .redis_keys import RedisKeys
+
+
+class RedisBufferBackend:
+    """Stores chunks in Redis so clients on any worker can read them"""
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, channel_id, redis_client, chunk_ttl):
+        self.channel_id = channel_id
+        self.redis_client = redis_client
+        self.chunk_ttl = chunk_ttl
+
+    def write(self, pipe, chunk_index, chunk_bytes):
+        """Queue a chunk write on the caller's pipeline"""
+        pipe.setex(RedisKeys.buffer_chunk(self.channel_id, chunk_index), self.chunk_ttl, chunk_bytes)
+
+    def discard(self, pipe, chunk_index):
+        """Queue deletion of a chunk that fell out of retention"""
+        pipe.delete(RedisKeys.buffer_chunk(self.channel_id, chunk_index))
+
+    def read(self, indices):
+        """Return a dict of index -> chunk for the indices that still exist"""
+        indices = list(indices)
+        pipe = self.redis_client.pipeline()
+        for idx in indices:
+            pipe.get(RedisKeys.buffer_chunk(self.channel_id, idx))
+
+        return {
+            idx: result
+            for idx, result in zip(indices, pipe.execute())
+            if result is not None
+        }
+
+
+class MemoryBufferBackend:
+    """
+    Keeps chunks in an in-process ring, trimmed by age and total size.
+
+    Only usable while every client of the channel is served by the owner worker.
+    """
+
+    name = "memory"
+    shared = False
+
+    def __init__(self, max_age, max_bytes):
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._chunks = OrderedDict()  # chunk index -> (data, stored_at), oldest first
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def write(self, pipe, chunk_index, chunk_bytes):
+        """Store a chunk locally; the pipeline is unused"""
+        now = time.time()
+        with self._lock:
+            self._chunks[chunk_index] = (chunk_bytes, now)
+            self._size += len(chunk_bytes)
+
+            while self._chunks:
+                _, (oldest_data, stored_at) = next(iter(self._chunks.items()))
+                if self._size <= self.max_bytes and now - stored_at <= self.max_age:
+                    break
+                self._chunks.popitem(last=False)
+                self._size -= len(oldest_data)
+
+    def discard(self, pipe, chunk_index):
+        """Drop a chunk that fell out of retention; the pipeline is unused"""
+        with self._lock:
+            entry = self._chunks.pop(chunk_index, None)
+            if entry is not None:
+                self._size -= len(entry[0])
+
+    def read(self, indices):
+        """Return a dict of index -> chunk for the indices that haven't aged out"""
+        now = time.time()
+        found = {}
+        with self._lock:
+            for idx in indices:
+                entry = self._chunks.get(idx)
+                if entry is not None and now - entry[1] <= self.max_age:
+                    found[idx] = entry[0]
+        return found
+
+    def snapshot(self):
+        """Return (index, data, stored_at) for every chunk held, oldest first"""
+        with self._lock:
+            return [(idx, data, stored_at) for idx, (data, stored_at) in self._chunks.items()]
+
+    @property
+    def size(self):
+        return self._size
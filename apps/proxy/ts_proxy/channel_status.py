@@ -3,6 +3,8 @@ import time
 import re
 from .server import ProxyServer
 from .redis_keys import RedisKeys
+from .buffer_backends import RedisBufferBackend
+from .config_helper import ConfigHelper
 from .constants import TS_PACKET_SIZE, ChannelMetadataField
 from redis.exceptions import ConnectionError, TimeoutError
 from .utils import get_logger
@@ -44,6 +46,9 @@ class ChannelStatus:
             'started_at': metadata.get(ChannelMetadataField.INIT_TIME.encode('utf-8'), b'0').decode('utf-8'),
             'owner': metadata.get(ChannelMetadataField.OWNER.encode('utf-8'), b'unknown').decode('utf-8'),
             'buffer_index': int(buffer_index_value.decode('utf-8')) if buffer_index_value else 0,
+            'buffer_backend': metadata.get(ChannelMetadataField.BUFFER_BACKEND.encode('utf-8'), b'redis').decode('utf-8'),
+            'buffer_bytes': int(metadata.get(ChannelMetadataField.BUFFER_BYTES.encode('utf-8'), b'0')),
+            'buffer_seconds': float(metadata.get(ChannelMetadataField.BUFFER_SECONDS.encode('utf-8'), b'0')),
         }
 
         # Add stream ID and name information
@@ -174,39 +179,50 @@ class ChannelStatus:
             'diagnostics': {}
         }
 
+        # Chunks in memory mode only exist inside the owner worker's process
+        stream_buffer = proxy_server.stream_buffers.get(channel_id)
+        held_in_memory = info['buffer_backend'] == 'memory'
+        if stream_buffer is not None:
+            backend = stream_buffer.backend
+            held_in_memory = not backend.shared
+        elif not held_in_memory:
+            backend = RedisBufferBackend(channel_id, proxy_server.redis_client, ConfigHelper.redis_chunk_ttl())
+        else:
+            backend = None
+        buffer_stats['held_in_memory'] = held_in_memory
+
         # Sample a few recent chunks to check sizes with better error handling
-        if info['buffer_index'] > 0:
+        if info['buffer_index'] > 0 and backend is None:
+            buffer_stats['diagnostics']['note'] = f"Chunks are held in memory by owner worker {info['owner']}"
+        elif info['buffer_index'] > 0:
             try:
                 sample_chunks = min(5, info['buffer_index'])
+                sample_indices = range(info['buffer_index']-sample_chunks+1, info['buffer_index']+1)
+                samples = backend.read(sample_indices)
                 chunk_sizes = []
                 chunk_keys_found = []
                 chunk_keys_missing = []
 
-                # Check if the keys exist before getting
-                for i in range(info['buffer_index']-sample_chunks+1, info['buffer_index']+1):
-                    chunk_key = RedisKeys.buffer_chunk(channel_id, i)
-
-                    # Check if key exists first
-                    if proxy_server.redis_client.exists(chunk_key):
-                        chunk_data = proxy_server.redis_client.get(chunk_key)
-                        if chunk_data:
-                            chunk_size = len(chunk_data)
-                            chunk_sizes.append(chunk_size)
-                            chunk_keys_found.append(i)
-
-                            # Check for TS alignment (packets are 188 bytes)
-                            ts_packets = chunk_size // 188
-                            ts_aligned = chunk_size % 188 == 0
-
-                            # Add for first chunk only to avoid too much data
-                            if len(chunk_keys_found) == 1:
-                                buffer_stats['diagnostics']['first_chunk'] = {
-                                    'index': i,
-                                    'size': chunk_size,
-                                    'ts_packets': ts_packets,
-                                    'aligned': ts_aligned,
-                                    'first_byte': chunk_data[0] if chunk_size > 0 else None
-                                }
+                for i in sample_indices:
+                    chunk_data = samples.get(i)
+                    if chunk_data:
+                        chunk_size = len(chunk_data)
+                        chunk_sizes.append(chunk_size)
+                        chunk_keys_found.append(i)
+
+                        # Check for TS alignment (packets are 188 bytes)
+                        ts_packets = chunk_size // 188
+                        ts_aligned = chunk_size % 188 == 0
+
+                        # Add for first chunk only to avoid too much data
+                        if len(chunk_keys_found) == 1:
+                            buffer_stats['diagnostics']['first_chunk'] = {
+                                'index': i,
+                                'size': chunk_size,
+                                'ts_packets': ts_packets,
+                                'aligned': ts_aligned,
+                                'first_byte': chunk_data[0] if chunk_size > 0 else None
+                            }
                     else:
                         chunk_keys_missing.append(i)
 
@@ -225,7 +241,7 @@ class ChannelStatus:
                     total_ts_packets = total_data // TS_PACKET_SIZE
                     buffer_stats['estimated_ts_packets'] = total_ts_packets
                     buffer_stats['is_ts_aligned'] = all(size % TS_PACKET_SIZE == 0 for size in chunk_sizes)
-                else:
+                elif not held_in_memory:
                     # If no chunks found, scan for keys to help debug
                     all_buffer_keys = []
                     cursor = 0
@@ -247,10 +263,12 @@ class ChannelStatus:
                 buffer_stats['error'] = str(e)
                 buffer_stats['diagnostics']['exception'] = str(e)
 
-        # Add TTL information to see if chunks are expiring
-        chunk_ttl_key = RedisKeys.buffer_chunk(channel_id, info['buffer_index'])
-        chunk_ttl = proxy_server.redis_client.ttl(chunk_ttl_key)
-        buffer_stats['latest_chunk_ttl'] = chunk_ttl
+        # Add TTL information to see if chunks are expiring (memory chunks have no Redis key)
+        if held_in_memory:
+            buffer_stats['latest_chunk_ttl'] = None
+        else:
+            chunk_ttl_key = RedisKeys.buffer_chunk(channel_id, info['buffer_index'])
+            buffer_stats['latest_chunk_ttl'] = proxy_server.redis_client.ttl(chunk_ttl_key)
 
         info['buffer_stats'] = buffer_stats
 
@@ -281,7 +299,7 @@ class ChannelStatus:
         if pixel_format:
             info['pixel_format'] = pixel_format.decode('utf-8')
 
-        source_bitrate = metadata.get(ChannelMetadataField.SOURCE_BITRATE.encode('utf-8'))
+        source_bitrate = metadata.get(ChannelMetadataField.VIDEO_BITRATE.encode('utf-8'))
         if source_bitrate:
             info['source_bitrate'] = float(source_bitrate.decode('utf-8'))
 
@@ -314,7 +332,7 @@ class ChannelStatus:
         if actual_fps:
             info['actual_fps'] = float(actual_fps.decode('utf-8'))
 
-        ffmpeg_bitrate = metadata.get(ChannelMetadataField.FFMPEG_BITRATE.encode('utf-8'))
+        ffmpeg_bitrate = metadata.get(ChannelMetadataField.FFMPEG_OUTPUT_BITRATE.encode('utf-8'))
         if ffmpeg_bitrate:
             info['ffmpeg_bitrate'] = float(ffmpeg_bitrate.decode('utf-8'))
         stream_type = metadata.get(ChannelMetadataField.STREAM_TYPE.encode('utf-8'))
@@ -382,6 +400,7 @@ class ChannelStatus:
                 'stream_profile': safe_decode(metadata.get(ChannelMetadataField.STREAM_PROFILE.encode('utf-8')), ""),
                 'owner': safe_decode(metadata.get(ChannelMetadataField.OWNER.encode('utf-8'))),
                 'buffer_index': int(buffer_index_value.decode('utf-8')) if buffer_index_value else 0,
+                'buffer_bytes': int(metadata.get(ChannelMetadataField.BUFFER_BYTES.encode('utf-8'), b'0')),
                 'client_count': client_count,
                 'uptime': uptime
             }
@@ -16,6 +16,67 @@ from core.utils import send_websocket_update
 
 logger = get_logger()
 
+
+class HeartbeatScheduler:
+    """
+    Sends client heartbeats for every ClientManager in this worker from one thread,
+    instead of one heartbeat thread per channel.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    TICK_INTERVAL = 1  # Seconds between checks for channels due a heartbeat
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self):
+        self.managers = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def register(self, manager):
+        """Add a channel's client manager, starting the scheduler thread if needed"""
+        with self.lock:
+            self.managers.add(manager)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.name = "client-heartbeat"
+                self.thread.start()
+                logger.debug("Started client heartbeat scheduler thread")
+
+    def unregister(self, manager):
+        with self.lock:
+            self.managers.discard(manager)
+
+    def _run(self):
+        while True:
+            time.sleep(self.TICK_INTERVAL)
+
+            with self.lock:
+                # Exit when idle; the next registration starts a new thread
+                if not self.managers:
+                    self.thread = None
+                    logger.debug("Client heartbeat scheduler thread exiting")
+                    return
+                managers = list(self.managers)
+
+            now = time.time()
+            for manager in managers:
+                if now < manager.next_heartbeat or not manager._heartbeat_running:
+                    continue
+                manager.next_heartbeat = now + manager.heartbeat_interval
+                try:
+                    manager.send_heartbeat()
+                except Exception as e:
+                    logger.error(f"Error in client heartbeat for channel {manager.channel_id}: {e}")
+
+
 class ClientManager:
     """Manages client connections with no duplicates"""
 
@@ -34,14 +95,24 @@ class ClientManager:
         self.heartbeat_interval = ConfigHelper.get('CLIENT_HEARTBEAT_INTERVAL', 10)
         self.last_heartbeat_time = {}
 
+        # Channel control state shared by all local clients, refreshed by a single watcher
+        self.channel_stopping = False
+        self.channel_state = None
+        self.stopped_clients = set()
+        self.control_refresh_interval = ConfigHelper.control_state_refresh_interval()
+        self._control_watcher = None
+
         # Get ProxyServer instance for ownership checks
         from .server import ProxyServer
         self.proxy_server = ProxyServer.get_instance()
 
-        # Start heartbeat thread for local clients
-        self._start_heartbeat_thread()
         self._registered_clients = set()  # Track already registered client IDs
 
+        # Heartbeats for local clients are sent by the worker's shared scheduler
+        self.next_heartbeat = time.time() + self.heartbeat_interval
+        if self.redis_client:
+            HeartbeatScheduler.get_instance().register(self)
+
     def _trigger_stats_update(self):
         """Trigger a channel stats update via WebSocket"""
         try:
@@ -83,112 +154,134 @@ class ClientManager:
         except Exception as e:
             logger.debug(f"Failed to trigger stats update: {e}")
 
-    def _start_heartbeat_thread(self):
-        """Start thread to regularly refresh client presence in Redis for local clients"""
-        def heartbeat_task():
-            logger.debug(f"Started heartbeat thread for channel {self.channel_id} (interval: {self.heartbeat_interval}s)")
+    def send_heartbeat(self):
+        """
+        Drop ghost clients and refresh presence in Redis for the remaining local clients.
 
-            while self._heartbeat_running:
-                try:
-                    # Wait for the interval, but check stop flag frequently for quick shutdown
-                    # Sleep in 1-second increments to allow faster response to stop signal
-                    for _ in range(int(self.heartbeat_interval)):
-                        if not self._heartbeat_running:
-                            break
-                        time.sleep(1)
-
-                    # Final check before doing work
-                    if not self._heartbeat_running:
-                        break
-
-                    # Send heartbeat for all local clients
-                    with self.lock:
-                        # Skip this cycle if we have no local clients
-                        if not self.clients:
-                            continue
-
-                        # IMPROVED GHOST DETECTION: Check for stale clients before sending heartbeats
-                        current_time = time.time()
-                        clients_to_remove = set()
-
-                        # First identify clients that should be removed
-                        for client_id in self.clients:
-                            client_key = f"ts_proxy:channel:{self.channel_id}:clients:{client_id}"
-
-                            # Check if client exists in Redis at all
-                            exists = self.redis_client.exists(client_key)
-                            if not exists:
-                                logger.debug(f"Client {client_id} no longer exists in Redis, removing locally")
-                                clients_to_remove.add(client_id)
-                                continue
-
-                            # Check for stale activity using last_active field
-                            last_active = self.redis_client.hget(client_key, "last_active")
-                            if last_active:
-                                last_active_time = float(last_active.decode('utf-8'))
-                                ghost_timeout = self.heartbeat_interval * getattr(Config, 'GHOST_CLIENT_MULTIPLIER', 5.0)
-
-                                if current_time - last_active_time > ghost_timeout:
-                                    logger.debug(f"Client {client_id} inactive for {current_time - last_active_time:.1f}s, removing as ghost")
-                                    clients_to_remove.add(client_id)
-
-                        # Remove ghost clients in a separate step
-                        for client_id in clients_to_remove:
-                            self.remove_client(client_id)
-
-                        if clients_to_remove:
-                            logger.info(f"Removed {len(clients_to_remove)} ghost clients from channel {self.channel_id}")
-
-                        # Now send heartbeats only for remaining clients
-                        pipe = self.redis_client.pipeline()
-                        current_time = time.time()
-
-                        for client_id in self.clients:
-                            # Skip clients we just marked for removal
-                            if client_id in clients_to_remove:
-                                continue
-
-                            # Skip if we just sent a heartbeat recently
-                            if client_id in self.last_heartbeat_time:
-                                time_since_heartbeat = current_time - self.last_heartbeat_time[client_id]
-                                if time_since_heartbeat < self.heartbeat_interval * 0.5:  # Only heartbeat at half interval minimum
-                                    continue
-
-                            # Only update clients that remain
-                            client_key = f"ts_proxy:channel:{self.channel_id}:clients:{client_id}"
-                            pipe.hset(client_key, "last_active", str(current_time))
-                            pipe.expire(client_key, self.client_ttl)
-
-                            # Keep client in the set with TTL
-                            pipe.sadd(self.client_set_key, client_id)
-                            pipe.expire(self.client_set_key, self.client_ttl)
-
-                            # Track last heartbeat locally
-                            self.last_heartbeat_time[client_id] = current_time
-
-                        # Execute all commands atomically
-                        pipe.execute()
-
-                        # Only notify if we have real clients
-                        if self.clients and not all(c in clients_to_remove for c in self.clients):
-                            self._notify_owner_of_activity()
+        Called by the worker's HeartbeatScheduler. The ghost check for every client is a
+        single pipelined read and the heartbeat for the survivors a single pipelined write.
+        """
+        with self.lock:
+            client_ids = list(self.clients)
 
-                except Exception as e:
-                    logger.error(f"Error in client heartbeat thread: {e}")
+        # Skip this cycle if we have no local clients
+        if not client_ids:
+            return
+
+        # IMPROVED GHOST DETECTION: Check for stale clients before sending heartbeats
+        pipe = self.redis_client.pipeline()
+        for client_id in client_ids:
+            client_key = RedisKeys.client_metadata(self.channel_id, client_id)
+            pipe.exists(client_key)
+            pipe.hget(client_key, "last_active")
+        results = pipe.execute()
+
+        current_time = time.time()
+        ghost_timeout = self.heartbeat_interval * getattr(Config, 'GHOST_CLIENT_MULTIPLIER', 5.0)
+        clients_to_remove = set()
+
+        for i, client_id in enumerate(client_ids):
+            exists, last_active = results[2 * i], results[2 * i + 1]
+
+            # Check if client exists in Redis at all
+            if not exists:
+                logger.debug(f"Client {client_id} no longer exists in Redis, removing locally")
+                clients_to_remove.add(client_id)
+                continue
+
+            # Check for stale activity using last_active field
+            if last_active:
+                last_active_time = float(last_active.decode('utf-8'))
+                if current_time - last_active_time > ghost_timeout:
+                    logger.debug(f"Client {client_id} inactive for {current_time - last_active_time:.1f}s, removing as ghost")
+                    clients_to_remove.add(client_id)
+
+        # Remove ghost clients in a separate step
+        for client_id in clients_to_remove:
+            self.remove_client(client_id)
+
+        if clients_to_remove:
+            logger.info(f"Removed {len(clients_to_remove)} ghost clients from channel {self.channel_id}")
+
+        # Now send heartbeats only for remaining clients
+        with self.lock:
+            pipe = self.redis_client.pipeline()
+            current_time = time.time()
+
+            for client_id in self.clients:
+                # Skip if we just sent a heartbeat recently
+                if client_id in self.last_heartbeat_time:
+                    time_since_heartbeat = current_time - self.last_heartbeat_time[client_id]
+                    if time_since_heartbeat < self.heartbeat_interval * 0.5:  # Only heartbeat at half interval minimum
+                        continue
+
+                # Only update clients that remain
+                client_key = RedisKeys.client_metadata(self.channel_id, client_id)
+                pipe.hset(client_key, "last_active", str(current_time))
+                pipe.expire(client_key, self.client_ttl)
 
-            logger.debug(f"Heartbeat thread exiting for channel {self.channel_id}")
+                # Keep client in the set with TTL
+                pipe.sadd(self.client_set_key, client_id)
+                pipe.expire(self.client_set_key, self.client_ttl)
 
-        thread = threading.Thread(target=heartbeat_task, daemon=True)
-        thread.name = f"client-heartbeat-{self.channel_id}"
-        thread.start()
-        logger.debug(f"Started client heartbeat thread for channel {self.channel_id} (interval: {self.heartbeat_interval}s)")
+                # Track last heartbeat locally
+                self.last_heartbeat_time[client_id] = current_time
+
+            # Execute all commands atomically
+            pipe.execute()
+
+        # Only notify if we have real clients
+        if self.clients:
+            self._notify_owner_of_activity()
+
+    def _start_control_watcher(self):
+        """Start the control state watcher if it isn't already running"""
+        if not self.redis_client:
+            return
+        if self._control_watcher is None or self._control_watcher.dead:
+            # Refresh right away so a new client never sees state left over from an idle period
+            try:
+                self.refresh_control_state()
+            except Exception as e:
+                logger.error(f"Error refreshing control state for channel {self.channel_id}: {e}")
+            self._control_watcher = gevent.spawn(self._control_watcher_task)
+
+    def _control_watcher_task(self):
+        """Refresh channel control state for as long as this worker has local clients"""
+        logger.debug(f"Started control state watcher for channel {self.channel_id} (interval: {self.control_refresh_interval}s)")
+
+        while self._heartbeat_running and self.clients:
+            gevent.sleep(self.control_refresh_interval)
+            try:
+                self.refresh_control_state()
+            except Exception as e:
+                logger.error(f"Error refreshing control state for channel {self.channel_id}: {e}")
+
+        logger.debug(f"Control state watcher exiting for channel {self.channel_id}")
+
+    def refresh_control_state(self):
+        """Read the channel stop flag, channel state and local client stop requests in one pipeline"""
+        with self.lock:
+            client_ids = list(self.clients)
+
+        pipe = self.redis_client.pipeline()
+        pipe.exists(RedisKeys.channel_stopping(self.channel_id))
+        pipe.hget(RedisKeys.channel_metadata(self.channel_id), ChannelMetadataField.STATE)
+        for client_id in client_ids:
+            pipe.exists(RedisKeys.client_stop(self.channel_id, client_id))
+        results = pipe.execute()
+
+        self.channel_stopping = bool(results[0])
+        self.channel_state = results[1].decode('utf-8') if results[1] else None
+        for client_id, stop_requested in zip(client_ids, results[2:]):
+            if stop_requested:
+                self.stopped_clients.add(client_id)
 
     def stop(self):
-        """Stop the heartbeat thread and cleanup"""
+        """Stop heartbeats and cleanup"""
         logger.debug(f"Stopping ClientManager for channel {self.channel_id}")
         self._heartbeat_running = False
-        # Give the thread a moment to exit gracefully
-        # Note: We don't join() here because it's a daemon thread and will exit on its own
+        HeartbeatScheduler.get_instance().unregister(self)
 
     def _execute_redis_command(self, command_func):
         """Execute Redis command with error handling"""
@@ -297,7 +390,8 @@ class ClientManager:
 
                 self.last_heartbeat_time[client_id] = time.time()
 
-                return len(self.clients)
+            self._start_control_watcher()
+            return len(self.clients)
 
         except Exception as e:
             logger.error(f"Error adding client {client_id}: {e}")
@@ -314,6 +408,7 @@ class ClientManager:
             if client_id in self.last_heartbeat_time:
                 del self.last_heartbeat_time[client_id]
 
+            self.stopped_clients.discard(client_id)
             self.last_active_time = time.time()
 
             if self.redis_client:
@@ -0,0 +1,156 @@
+"""
+Multi-node TS proxy clustering.
+
+Proxy nodes (hosts running Dispatcharr workers) share one Redis, which holds channel
+ownership, metadata and buffers. Each worker registers its node in a Redis node
+registry with a heartbeat. A channel is still fetched from upstream by one owner
+worker only; workers on every other node relay its chunks to their clients from the
+shared buffer, so adding nodes adds viewer capacity without adding provider
+connections.
+
+When an owner worker or its whole node stops heartbeating, a worker that still has
+clients on the channel claims ownership and resumes the same stream into the same
+buffer. An owner that finds another worker has taken its channel stops fetching.
+"""
+
+import time
+
+from .config_helper import ConfigHelper
+from .constants import ChannelMetadataField, ChannelState
+from .redis_keys import RedisKeys
+from .utils import get_logger
+
+logger = get_logger()
+
+
+class ClusterNode:
+    """Registers this worker's node and watches the liveness of channel owners"""
+
+    def __init__(self, proxy_server):
+        self.proxy_server = proxy_server
+        self.node_id = ConfigHelper.node_id()
+        self._last_heartbeat = 0
+        self._last_owner_check = {}  # Channel ID -> last time its owner was checked
+
+    @property
+    def redis_client(self):
+        return self.proxy_server.redis_client
+
+    def tick(self):
+        """Called from the cleanup thread: send the node heartbeat when due"""
+        now = time.time()
+        if self.redis_client and now - self._last_heartbeat >= ConfigHelper.node_heartbeat_interval():
+            self._last_heartbeat = now
+            self.heartbeat(now)
+
+    def heartbeat(self, now=None):
+        """Record that this node and worker are alive"""
+        now = now or time.time()
+        ttl = ConfigHelper.node_timeout() * 4
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hset(RedisKeys.node(self.node_id), mapping={
+                "address": ConfigHelper.node_address(),
+                "last_seen": now,
+            })
+            pipe.expire(RedisKeys.node(self.node_id), ttl)
+            pipe.set(RedisKeys.worker_node(self.proxy_server.worker_id), self.node_id, ex=ttl)
+            pipe.zadd(RedisKeys.nodes(), {self.node_id: now})
+            pipe.zremrangebyscore(RedisKeys.nodes(), "-inf", now - 3600)  # Forget nodes down for an hour
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to send heartbeat for node {self.node_id}: {e}")
+
+    def is_node_alive(self, node_id, now=None):
+        """Whether a node sent a heartbeat within NODE_TIMEOUT"""
+        last_seen = self.redis_client.zscore(RedisKeys.nodes(), node_id)
+        return last_seen is not None and (now or time.time()) - last_seen < ConfigHelper.node_timeout()
+
+    def is_worker_alive(self, worker_id):
+        """Whether a worker and the node it runs on are both still heartbeating"""
+        if not self.redis_client.exists(RedisKeys.worker_heartbeat(worker_id)):
+            return False
+
+        node_id = self.redis_client.get(RedisKeys.worker_node(worker_id))
+        return node_id is None or self.is_node_alive(node_id.decode("utf-8"))
+
+    def get_nodes(self):
+        """
+        List known nodes with their workers and owned channel counts.
+
+        Returns:
+            list: One dict per node, most recently seen first
+        """
+        now = time.time()
+        loads = self.proxy_server.balancer.get_worker_loads()
+
+        worker_ids = list(loads)
+        pipe = self.redis_client.pipeline(transaction=False)
+        for worker_id in worker_ids:
+            pipe.get(RedisKeys.worker_node(worker_id))
+        worker_nodes = dict(zip(worker_ids, pipe.execute()))
+
+        nodes = []
+        for node_id, last_seen in self.redis_client.zrevrange(RedisKeys.nodes(), 0, -1, withscores=True):
+            node_id = node_id.decode("utf-8")
+            info = self.redis_client.hgetall(RedisKeys.node(node_id))
+            workers = {
+                worker_id: load for worker_id, load in loads.items()
+                if worker_nodes.get(worker_id) and worker_nodes[worker_id].decode("utf-8") == node_id
+            }
+            nodes.append({
+                "node_id": node_id,
+                "address": info.get(b"address", b"").decode("utf-8"),
+                "last_seen": last_seen,
+                "alive": now - last_seen < ConfigHelper.node_timeout(),
+                "owned_channels": int(sum(load["owned_channels"] for load in workers.values())),
+                "workers": workers,
+            })
+        return nodes
+
+    def check_owner(self, channel_id):
+        """
+        Reconcile ownership of a channel this worker doesn't own.
+
+        Stops this worker's StreamManager if another worker has taken the channel, and
+        takes over channels with local clients whose owner has gone down.
+
+        Returns:
+            bool: True if this worker is now the owner
+        """
+        server = self.proxy_server
+        owner = server.get_channel_owner(channel_id)
+
+        if channel_id in server.stream_managers and owner and owner != server.worker_id:
+            logger.warning(f"Channel {channel_id} is now owned by {owner}, stopping local stream manager")
+            server.balancer.stop_fetching(channel_id)
+            return False
+
+        if not ConfigHelper.owner_failover():
+            return False
+
+        client_manager = server.client_managers.get(channel_id)
+        if client_manager is None or client_manager.get_client_count() == 0:
+            return False
+
+        now = time.time()
+        if now - self._last_owner_check.get(channel_id, 0) < ConfigHelper.node_heartbeat_interval():
+            return False
+        self._last_owner_check[channel_id] = now
+
+        if owner and self.is_worker_alive(owner):
+            return False
+        if self.redis_client.exists(RedisKeys.channel_stopping(channel_id)):
+            return False
+
+        state = self.redis_client.hget(RedisKeys.channel_metadata(channel_id), ChannelMetadataField.STATE)
+        if not state or state.decode("utf-8") not in (ChannelState.ACTIVE, ChannelState.WAITING_FOR_CLIENTS, ChannelState.BUFFERING):
+            return False
+
+        logger.warning(f"Owner {owner or '(expired)'} of channel {channel_id} is down, attempting takeover")
+        return server.balancer.take_over(channel_id, owner)
+
+    def forget_channel(self, channel_id):
+        """Drop per-channel state when this worker releases a channel"""
+        self._last_owner_check.pop(channel_id, None)
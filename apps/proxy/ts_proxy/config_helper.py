@@ -2,6 +2,8 @@
 Helper module to access configuration values with proper defaults.
 """
 
+import socket
+
 from apps.proxy.config import TSConfig as Config
 
 class ConfigHelper:
@@ -41,11 +43,83 @@ class ConfigHelper:
         """Get number of chunks to start behind"""
         return ConfigHelper.get('INITIAL_BEHIND_CHUNKS', 4)
 
+    @staticmethod
+    def chunk_target_duration():
+        """Get seconds of stream per buffer chunk for adaptive chunk sizing (0 disables)"""
+        return ConfigHelper.get('CHUNK_TARGET_DURATION', 0.5)
+
+    @staticmethod
+    def min_buffer_chunk_size():
+        """Get the smallest buffer chunk size in bytes"""
+        return ConfigHelper.get('MIN_BUFFER_CHUNK_SIZE', 188 * 128)
+
+    @staticmethod
+    def max_buffer_chunk_size():
+        """Get the largest buffer chunk size in bytes"""
+        return ConfigHelper.get('MAX_BUFFER_CHUNK_SIZE', 188 * 11155)
+
+    @staticmethod
+    def bitrate_sample_interval():
+        """Get seconds of ingest per bitrate measurement"""
+        return ConfigHelper.get('BITRATE_SAMPLE_INTERVAL', 2.0)
+
+    @staticmethod
+    def buffer_retention_seconds():
+        """Get seconds of media kept in each channel buffer, at most the Redis chunk TTL"""
+        chunk_ttl = ConfigHelper.redis_chunk_ttl()
+        retention = ConfigHelper.get('BUFFER_RETENTION_SECONDS')
+        return min(retention, chunk_ttl) if retention else chunk_ttl
+
+    @staticmethod
+    def buffer_memory_budget_mb():
+        """Get the total TS buffer memory budget in MB (0 means unlimited)"""
+        return ConfigHelper.get('BUFFER_MEMORY_BUDGET_MB', 0)
+
+    @staticmethod
+    def keyframe_join():
+        """Get whether new clients start at the nearest keyframe"""
+        return ConfigHelper.get('KEYFRAME_JOIN', True)
+
+    @staticmethod
+    def keyframe_search_window():
+        """Get how many chunks back from the buffer head to search for a keyframe"""
+        return ConfigHelper.get('KEYFRAME_SEARCH_WINDOW', 10)
+
+    @staticmethod
+    def buffer_backend():
+        """Get the buffer backend mode ('auto' or 'redis')"""
+        return ConfigHelper.get('BUFFER_BACKEND', 'auto')
+
+    @staticmethod
+    def local_buffer_max_bytes():
+        """Get the max bytes per channel kept in-process by the 'auto' buffer backend"""
+        return ConfigHelper.get('LOCAL_BUFFER_MAX_BYTES', 128 * 1024 * 1024)
+
+    @staticmethod
+    def chunk_wait_timeout():
+        """Get max seconds a client at buffer head waits for a chunk notification"""
+        return ConfigHelper.get('CHUNK_WAIT_TIMEOUT', 1.0)
+
+    @staticmethod
+    def local_chunk_cache_max_bytes():
+        """Get the byte budget of the worker-local chunk cache for each channel"""
+        return ConfigHelper.get('LOCAL_CHUNK_CACHE_MAX_BYTES', 8 * 1024 * 1024)
+
+    @staticmethod
+    def local_chunk_cache_max_age():
+        """Get the maximum age in seconds of a chunk in the worker-local cache"""
+        return ConfigHelper.get('LOCAL_CHUNK_CACHE_MAX_AGE', 10)
+
     @staticmethod
     def keepalive_interval():
         """Get keepalive interval in seconds"""
         return ConfigHelper.get('KEEPALIVE_INTERVAL', 0.5)
 
+    @staticmethod
+    def control_state_refresh_interval():
+        """Get how often channel and client stop flags are refreshed from Redis in seconds"""
+        return ConfigHelper.get('CONTROL_STATE_REFRESH_INTERVAL', 0.5)
+
     @staticmethod
     def cleanup_check_interval():
         """Get cleanup check interval in seconds"""
@@ -56,6 +130,11 @@ class ConfigHelper:
         """Get Redis chunk TTL in seconds"""
         return Config.get_redis_chunk_ttl()
 
+    @staticmethod
+    def last_data_update_interval():
+        """Get minimum seconds between last data timestamp updates in Redis"""
+        return ConfigHelper.get('LAST_DATA_UPDATE_INTERVAL', 1.0)
+
     @staticmethod
     def chunk_size():
         """Get chunk size in bytes"""
@@ -81,6 +160,111 @@ class ConfigHelper:
         """Get URL switch timeout in seconds (max time allowed for a stream switch operation)"""
         return ConfigHelper.get('URL_SWITCH_TIMEOUT', 20)  # Default to 20 seconds
 
+    @staticmethod
+    def parallel_probe_count():
+        """Get how many alternate streams to probe concurrently on failover"""
+        return ConfigHelper.get('PARALLEL_PROBE_COUNT', 3)
+
+    @staticmethod
+    def probe_timeout():
+        """Get the connect/read timeout in seconds for failover probes"""
+        return ConfigHelper.get('PROBE_TIMEOUT', 3)
+
+    @staticmethod
+    def health_aware_failover():
+        """Get whether unhealthy streams are tried after healthy ones"""
+        return ConfigHelper.get('HEALTH_AWARE_FAILOVER', True)
+
+    @staticmethod
+    def unhealthy_stream_score():
+        """Get the health score below which a stream or M3U profile is considered unhealthy"""
+        return ConfigHelper.get('UNHEALTHY_STREAM_SCORE', 50)
+
+    @staticmethod
+    def hot_channels():
+        """Get the channel UUIDs configured as hot"""
+        return ConfigHelper.get('HOT_CHANNELS', [])
+
+    @staticmethod
+    def hot_channels_top_n():
+        """Get how many of the most watched channels are treated as hot"""
+        return ConfigHelper.get('HOT_CHANNELS_TOP_N', 0)
+
+    @staticmethod
+    def hot_channels_lookback_hours():
+        """Get how many hours of client connect events count towards the most watched channels"""
+        return ConfigHelper.get('HOT_CHANNELS_LOOKBACK_HOURS', 24)
+
+    @staticmethod
+    def hot_channel_idle_timeout():
+        """Get how long in seconds a hot channel keeps running without clients"""
+        return ConfigHelper.get('HOT_CHANNEL_IDLE_TIMEOUT', 1800)
+
+    @staticmethod
+    def hot_channel_hours():
+        """Get the (start_hour, end_hour) window for starting hot channels ahead of viewers, or None"""
+        return ConfigHelper.get('HOT_CHANNEL_HOURS', None)
+
+    @staticmethod
+    def hot_channel_check_interval():
+        """Get seconds between hot channel refreshes and warm-up checks"""
+        return ConfigHelper.get('HOT_CHANNEL_CHECK_INTERVAL', 60)
+
+    @staticmethod
+    def worker_load_interval():
+        """Get seconds between worker load updates"""
+        return ConfigHelper.get('WORKER_LOAD_INTERVAL', 5)
+
+    @staticmethod
+    def ownership_rebalance():
+        """Get whether channels are handed over to less loaded workers"""
+        return ConfigHelper.get('OWNERSHIP_REBALANCE', True)
+
+    @staticmethod
+    def rebalance_interval():
+        """Get seconds between ownership rebalancing checks"""
+        return ConfigHelper.get('REBALANCE_INTERVAL', 30)
+
+    @staticmethod
+    def rebalance_cpu_margin():
+        """Get the CPU percentage points of imbalance that trigger a hand-off"""
+        return ConfigHelper.get('REBALANCE_CPU_MARGIN', 25)
+
+    @staticmethod
+    def rebalance_cooldown():
+        """Get seconds before a handed-off channel can move again"""
+        return ConfigHelper.get('REBALANCE_COOLDOWN', 300)
+
+    @staticmethod
+    def handoff_timeout():
+        """Get seconds to wait for the other worker during an ownership hand-off"""
+        return ConfigHelper.get('HANDOFF_TIMEOUT', 5)
+
+    @staticmethod
+    def node_id():
+        """Get the name of this proxy node"""
+        return ConfigHelper.get('NODE_ID') or socket.gethostname()
+
+    @staticmethod
+    def node_address():
+        """Get the address this proxy node can be reached at"""
+        return ConfigHelper.get('NODE_ADDRESS') or ''
+
+    @staticmethod
+    def node_heartbeat_interval():
+        """Get seconds between node heartbeats"""
+        return ConfigHelper.get('NODE_HEARTBEAT_INTERVAL', 5)
+
+    @staticmethod
+    def node_timeout():
+        """Get seconds without a heartbeat before a node is considered down"""
+        return ConfigHelper.get('NODE_TIMEOUT', 15)
+
+    @staticmethod
+    def owner_failover():
+        """Get whether to take over channels whose owner went down"""
+        return ConfigHelper.get('OWNER_FAILOVER', True)
+
     @staticmethod
     def failover_grace_period():
         """Get extra time (in seconds) to allow for stream switching before disconnecting clients"""
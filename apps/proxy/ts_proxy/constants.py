@@ -29,6 +29,8 @@ class EventType:
     CLIENT_CONNECTED = "client_connected"
     CLIENT_DISCONNECTED = "client_disconnected"
     CLIENT_STOP = "client_stop"
+    BUFFER_READER_ATTACHED = "buffer_reader_attached"
+    OWNERSHIP_HANDOFF = "ownership_handoff"
 
 # Stream types
 class StreamType:
@@ -60,12 +62,19 @@ class ChannelMetadataField:
 
     # Buffer and data tracking
     BUFFER_CHUNKS = "buffer_chunks"
+    BUFFER_BACKEND = "buffer_backend"
+    BUFFER_BYTES = "buffer_bytes"
+    BUFFER_SECONDS = "buffer_seconds"
     TOTAL_BYTES = "total_bytes"
 
     # Stream switching
     STREAM_SWITCH_TIME = "stream_switch_time"
     STREAM_SWITCH_REASON = "stream_switch_reason"
 
+    # Ownership hand-off between workers
+    HANDOFF_TIME = "handoff_time"
+    HANDOFF_FROM = "handoff_from"
+
     # FFmpeg performance metrics
     FFMPEG_SPEED = "ffmpeg_speed"
     FFMPEG_FPS = "ffmpeg_fps"
@@ -0,0 +1,164 @@
+"""
+Hot channels: keep popular channels connected upstream without viewers.
+
+A channel is hot if it is listed in HOT_CHANNELS or is one of the HOT_CHANNELS_TOP_N
+channels with the most client connections in the recent SystemEvent history. Hot
+channels keep running for HOT_CHANNEL_IDLE_TIMEOUT after their last viewer leaves
+instead of the normal shutdown delay. During HOT_CHANNEL_HOURS they are also started
+ahead of any viewer, so new viewers join from an already filled buffer.
+"""
+
+import time
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from .config_helper import ConfigHelper
+from .redis_keys import RedisKeys
+from .utils import get_logger
+
+logger = get_logger()
+
+
+class HotChannels:
+    """Decides which channels are hot and starts them ahead of viewers"""
+
+    # Per-worker cache of the hot channel set
+    _hot_channel_ids = set()
+    _refreshed_at = 0
+    _last_warm_check = 0
+
+    @classmethod
+    def get_hot_channel_ids(cls):
+        """Return the UUIDs of hot channels, refreshed every HOT_CHANNEL_CHECK_INTERVAL"""
+        now = time.time()
+        if now - cls._refreshed_at < ConfigHelper.hot_channel_check_interval():
+            return cls._hot_channel_ids
+
+        hot_channel_ids = {str(channel_id) for channel_id in ConfigHelper.hot_channels()}
+
+        top_n = ConfigHelper.hot_channels_top_n()
+        if top_n > 0:
+            try:
+                from core.models import SystemEvent
+
+                since = timezone.now() - timedelta(hours=ConfigHelper.hot_channels_lookback_hours())
+                popular = (
+                    SystemEvent.objects.filter(event_type='client_connect', timestamp__gte=since, channel_id__isnull=False)
+                    .values('channel_id')
+                    .annotate(connects=Count('id'))
+                    .order_by('-connects')[:top_n]
+                )
+                hot_channel_ids.update(str(row['channel_id']) for row in popular)
+            except Exception as e:
+                logger.error(f"Error finding most watched channels: {e}")
+                hot_channel_ids.update(cls._hot_channel_ids)
+            finally:
+                connection.close()
+
+        cls._hot_channel_ids = hot_channel_ids
+        cls._refreshed_at = now
+        return hot_channel_ids
+
+    @staticmethod
+    def in_warm_hours(now=None):
+        """Whether the local time is within HOT_CHANNEL_HOURS"""
+        hours = ConfigHelper.hot_channel_hours()
+        if not hours:
+            return False
+
+        start, end = hours
+        hour = time.localtime(now).tm_hour
+        if start <= end:
+            return start <= hour < end
+        return hour >= start or hour < end  # Window wraps past midnight
+
+    @classmethod
+    def should_keep(cls, channel_id, idle_since, now=None):
+        """Whether a channel without clients since idle_since should keep running"""
+        if channel_id not in cls.get_hot_channel_ids():
+            return False
+
+        now = now or time.time()
+        return cls.in_warm_hours(now) or now - idle_since < ConfigHelper.hot_channel_idle_timeout()
+
+    @classmethod
+    def warm(cls, proxy_server):
+        """
+        Start hot channels that aren't running, during HOT_CHANNEL_HOURS.
+
+        Called from every worker's cleanup thread; a Redis lock lets one worker per
+        HOT_CHANNEL_CHECK_INTERVAL do the work, and it becomes the owner of the
+        channels it starts.
+        """
+        now = time.time()
+        interval = ConfigHelper.hot_channel_check_interval()
+        if now - cls._last_warm_check < interval:
+            return
+        cls._last_warm_check = now
+
+        if not proxy_server.redis_client or not cls.in_warm_hours(now):
+            return
+
+        hot_channel_ids = cls.get_hot_channel_ids()
+        if not hot_channel_ids:
+            return
+
+        if not proxy_server.redis_client.set(RedisKeys.hot_channels_lock(), proxy_server.worker_id, nx=True, ex=interval):
+            return
+
+        for channel_id in sorted(hot_channel_ids):
+            try:
+                if not proxy_server.check_if_channel_exists(channel_id):
+                    cls._start_channel(proxy_server, channel_id)
+            except Exception as e:
+                logger.error(f"Error warming hot channel {channel_id}: {e}", exc_info=True)
+            finally:
+                connection.close()
+
+    @staticmethod
+    def _start_channel(proxy_server, channel_id):
+        """Start a channel without clients, leaving at least one free connection on its provider"""
+        from apps.channels.models import Channel, reserve_stream_slot
+        from apps.channels.tune_plan import get_tune_plan, reserve_from_plan
+        from core.models import StreamProfile
+        from .services.channel_service import ChannelService
+        from .stream_health import StreamHealth
+        from .url_utils import generate_stream_url
+
+        plan = get_tune_plan(channel_id)
+        if not plan or not plan["has_streams"]:
+            return False
+
+        stream_profile = StreamProfile.objects.filter(id=plan["stream_profile_id"]).first()
+        if stream_profile and stream_profile.is_redirect():
+            return False
+
+        # Reserve with one connection less than each profile allows, so warming never
+        # takes the last slot a viewer of another channel could use
+        candidates = [
+            (stream_id, profile_id, max_streams - 1 if max_streams else 0)
+            for stream_id, profile_id, max_streams in plan["candidates"]
+            if max_streams != 1
+        ]
+        candidates = StreamHealth.order_candidates(proxy_server.redis_client, candidates)
+        if not candidates or not reserve_stream_slot(proxy_server.redis_client, plan["channel_id"], candidates):
+            logger.info(f"Not warming hot channel {channel_id}: no spare provider connections")
+            return False
+
+        # The slot is reserved, so these return the stream we just picked
+        stream_url, user_agent, transcode, profile_value = generate_stream_url(channel_id)
+        stream_id, m3u_profile_id, _ = reserve_from_plan(plan)
+
+        success = stream_url is not None and ChannelService.initialize_channel(
+            channel_id, stream_url, user_agent, transcode, profile_value, stream_id, m3u_profile_id
+        )
+        if not success:
+            Channel.objects.get(uuid=channel_id).release_stream()
+            logger.warning(f"Failed to warm hot channel {channel_id}")
+            return False
+
+        logger.info(f"Warmed hot channel {channel_id} with stream {stream_id} on M3U profile {m3u_profile_id}")
+        return True
@@ -5,6 +5,7 @@ This allows us to use the same fetch_chunk() path for both transcode and HTTP st
 
 import threading
 import os
+import time
 import requests
 from requests.adapters import HTTPAdapter
 from .utils import get_logger
@@ -25,6 +26,7 @@ class HTTPStreamReader:
         self.pipe_read = None
         self.pipe_write = None
         self.running = False
+        self.connect_time = None  # Seconds until the response headers arrived
 
     def start(self):
         """Start the HTTP stream reader thread"""
@@ -58,12 +60,14 @@ class HTTPStreamReader:
             self.session.mount('https://', adapter)
 
             # Stream the URL
+            request_start = time.time()
             self.response = self.session.get(
                 self.url,
                 headers=headers,
                 stream=True,
                 timeout=(5, 30)  # 5s connect, 30s read
             )
+            self.connect_time = time.time() - request_start
 
             if self.response.status_code != 200:
                 logger.error(f"HTTP {self.response.status_code} from {self.url}")
@@ -0,0 +1,357 @@
+"""
+Load-aware channel ownership across workers.
+
+Every worker publishes its load (owned channels, ingest rate and process CPU) to a
+scoreboard in Redis. An owner that is noticeably busier than the least loaded worker
+hands one of its channels over:
+
+1. The owner moves the channel's buffer to Redis and publishes an OWNERSHIP_HANDOFF
+   event naming the target worker.
+2. The target claims the owner key, but only while the offering worker still holds it.
+3. The old owner sees the claim, stops its StreamManager, flushes the buffer and
+   marks the hand-off as released. It keeps serving its local clients from Redis.
+4. The target starts its own StreamManager, which continues the same buffer index.
+
+Clients on either worker keep reading the same buffer throughout. They only see the
+time it takes the new owner to reconnect upstream, which their buffered lead covers.
+"""
+
+import json
+import threading
+import time
+
+from .config_helper import ConfigHelper
+from .constants import ChannelMetadataField, ChannelState, EventType
+from .redis_keys import RedisKeys
+from .utils import get_logger
+
+logger = get_logger()
+
+# Move the owner key from one worker to another, only if the first still holds it.
+# An empty ARGV[1] claims a channel whose owner key has expired.
+CLAIM_OWNERSHIP_SCRIPT = """
+if (redis.call('GET', KEYS[1]) or '') == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', tonumber(ARGV[3]))
+    return 1
+end
+return 0
+"""
+
+
+class OwnershipBalancer:
+    """Publishes this worker's load and hands owned channels to less loaded workers"""
+
+    def __init__(self, proxy_server):
+        self.proxy_server = proxy_server
+        self.cpu_percent = 0.0
+        self._cpu_sample = (time.time(), time.process_time())
+        self._last_publish = 0
+        self._last_rebalance = time.time()  # Let a new worker settle before moving channels
+
+    @property
+    def redis_client(self):
+        return self.proxy_server.redis_client
+
+    @property
+    def worker_id(self):
+        return self.proxy_server.worker_id
+
+    def tick(self):
+        """Called from the cleanup thread: publish load and rebalance when due"""
+        if not self.redis_client:
+            return
+
+        now = time.time()
+        if now - self._last_publish >= ConfigHelper.worker_load_interval():
+            self._last_publish = now
+            self.publish_load(now)
+
+        if ConfigHelper.ownership_rebalance() and now - self._last_rebalance >= ConfigHelper.rebalance_interval():
+            self._last_rebalance = now
+            self.rebalance()
+
+    def _sample_cpu(self, now):
+        """Update the process CPU usage (percent of one core) since the last sample"""
+        last_time, last_cpu = self._cpu_sample
+        cpu = time.process_time()
+        if now > last_time:
+            self.cpu_percent = round(100.0 * (cpu - last_cpu) / (now - last_time), 1)
+        self._cpu_sample = (now, cpu)
+
+    def publish_load(self, now=None):
+        """Write this worker's load to the worker scoreboard"""
+        now = now or time.time()
+        self._sample_cpu(now)
+
+        managers = list(self.proxy_server.stream_managers.values())
+        load = {
+            "owned_channels": len(managers),
+            "ingest_bps": int(sum(getattr(manager, "ingest_bitrate", 0) for manager in managers)),
+            "cpu_percent": self.cpu_percent,
+            "updated_at": now,
+        }
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hset(RedisKeys.worker_load(self.worker_id), mapping=load)
+            pipe.expire(RedisKeys.worker_load(self.worker_id), 30)
+            pipe.zadd(RedisKeys.worker_loads(), {self.worker_id: now})
+            pipe.zremrangebyscore(RedisKeys.worker_loads(), "-inf", now - 60)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to publish load for worker {self.worker_id}: {e}")
+
+    def get_worker_loads(self):
+        """
+        Read the scoreboard of workers that published their load recently.
+
+        Returns:
+            dict: worker_id -> {"owned_channels", "ingest_bps", "cpu_percent", "updated_at"}
+        """
+        stale_after = ConfigHelper.worker_load_interval() * 3
+        worker_ids = [
+            worker_id.decode("utf-8")
+            for worker_id in self.redis_client.zrangebyscore(RedisKeys.worker_loads(), time.time() - stale_after, "+inf")
+        ]
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for worker_id in worker_ids:
+            pipe.hgetall(RedisKeys.worker_load(worker_id))
+        results = pipe.execute()
+
+        loads = {}
+        for worker_id, load in zip(worker_ids, results):
+            if load:
+                loads[worker_id] = {key.decode("utf-8"): float(value) for key, value in load.items()}
+        return loads
+
+    def rebalance(self):
+        """Hand one channel to the least loaded worker if this worker is clearly busier"""
+        try:
+            loads = self.get_worker_loads()
+            mine = loads.pop(self.worker_id, None)
+            if not mine or not loads:
+                return False
+
+            target, theirs = min(loads.items(), key=lambda item: (item[1]["cpu_percent"], item[1]["owned_channels"]))
+            if mine["cpu_percent"] - theirs["cpu_percent"] < ConfigHelper.rebalance_cpu_margin():
+                return False
+            if mine["owned_channels"] - theirs["owned_channels"] < 2:
+                return False
+
+            channel_id = self._pick_channel()
+            if not channel_id:
+                return False
+
+            logger.info(
+                f"Worker {self.worker_id} (cpu {mine['cpu_percent']}%, {mine['owned_channels']:.0f} channels) "
+                f"handing channel {channel_id} to {target} (cpu {theirs['cpu_percent']}%, {theirs['owned_channels']:.0f} channels)"
+            )
+            return self.hand_off(channel_id, target)
+        except Exception as e:
+            logger.error(f"Error rebalancing channel ownership: {e}", exc_info=True)
+            return False
+
+    def _pick_channel(self):
+        """Pick the owned channel with the highest ingest rate that is safe to move"""
+        now = time.time()
+        cooldown = ConfigHelper.rebalance_cooldown()
+        candidates = []
+
+        for channel_id, manager in list(self.proxy_server.stream_managers.items()):
+            if not manager.connected or manager.url_switching or not manager.healthy:
+                continue
+
+            metadata = self.redis_client.hmget(
+                RedisKeys.channel_metadata(channel_id),
+                [ChannelMetadataField.STATE, ChannelMetadataField.HANDOFF_TIME],
+            )
+            state = metadata[0].decode("utf-8") if metadata[0] else None
+            if state not in (ChannelState.ACTIVE, ChannelState.WAITING_FOR_CLIENTS):
+                continue
+            if metadata[1] and now - float(metadata[1]) < cooldown:
+                continue
+
+            candidates.append((manager.ingest_bitrate, channel_id))
+
+        return max(candidates)[1] if candidates else None
+
+    def _wait_for(self, condition, timeout):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if condition():
+                return True
+            time.sleep(0.1)
+        return condition()
+
+    def hand_off(self, channel_id, target_worker):
+        """Give ownership of a channel this worker owns to target_worker"""
+        server = self.proxy_server
+        manager = server.stream_managers.get(channel_id)
+        buffer = server.stream_buffers.get(channel_id)
+        if not manager or not buffer or not server.am_i_owner(channel_id):
+            return False
+
+        # The new owner and this worker's clients will both read the buffer from Redis
+        buffer.use_shared_backend()
+
+        handoff_key = RedisKeys.channel_handoff(channel_id)
+        timeout = ConfigHelper.handoff_timeout()
+        self.redis_client.set(handoff_key, f"pending:{target_worker}", ex=timeout * 6)
+        self.redis_client.publish(RedisKeys.events_channel(channel_id), json.dumps({
+            "event": EventType.OWNERSHIP_HANDOFF,
+            "channel_id": channel_id,
+            "worker_id": self.worker_id,
+            "target_worker": target_worker,
+            "url": manager.url,
+            "user_agent": manager.user_agent,
+            "transcode": bool(manager.transcode),
+            "stream_id": manager.current_stream_id,
+            "timestamp": time.time(),
+        }))
+
+        if not self._wait_for(lambda: server.get_channel_owner(channel_id) == target_worker, timeout):
+            logger.warning(f"Worker {target_worker} did not take channel {channel_id}, keeping ownership")
+            self.redis_client.delete(handoff_key)
+            return False
+
+        self.stop_fetching(channel_id)
+        self.redis_client.set(handoff_key, "released", ex=timeout * 6)
+
+        logger.info(f"Handed channel {channel_id} to worker {target_worker}")
+        return True
+
+    def stop_fetching(self, channel_id):
+        """
+        Stop this worker's StreamManager for a channel another worker now owns, without
+        touching the channel's state, clients or stream slot. Local clients keep reading
+        the buffer from Redis.
+        """
+        server = self.proxy_server
+        manager = server.stream_managers.pop(channel_id, None)
+        if manager is None:
+            return
+
+        manager.stop()
+        for thread in threading.enumerate():
+            if thread.name == f"stream-{channel_id}" and thread is not threading.current_thread():
+                thread.join(timeout=2.0)
+        server.hot_idle_since.pop(channel_id, None)
+
+        buffer = server.stream_buffers.get(channel_id)
+        if buffer:
+            buffer.use_shared_backend()
+            buffer.flush()
+
+        # From now on this worker is a reader of the channel like any other
+        server.register_buffer_reader(channel_id)
+
+    def adopt(self, channel_id, data):
+        """Take over a channel offered by another worker through an OWNERSHIP_HANDOFF event"""
+        server = self.proxy_server
+        from_worker = data.get("worker_id")
+        handoff_key = RedisKeys.channel_handoff(channel_id)
+        timeout = ConfigHelper.handoff_timeout()
+
+        try:
+            claim = self.redis_client.register_script(CLAIM_OWNERSHIP_SCRIPT)
+            if not claim(keys=[RedisKeys.channel_owner(channel_id)], args=[from_worker, self.worker_id, 30]):
+                logger.info(f"Channel {channel_id} is no longer owned by {from_worker}, ignoring hand-off")
+                return False
+
+            # Only one worker may write the buffer; wait for the old owner to stop
+            released = self._wait_for(lambda: self.redis_client.get(handoff_key) == b"released", timeout * 2)
+            if not released:
+                logger.warning(f"Worker {from_worker} did not confirm hand-off of channel {channel_id}, taking over anyway")
+
+            self.start_stream(channel_id, data, from_worker)
+            self.redis_client.delete(handoff_key)
+            logger.info(f"Worker {self.worker_id} took over channel {channel_id} from {from_worker}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error taking over channel {channel_id}: {e}", exc_info=True)
+            return False
+
+    def take_over(self, channel_id, dead_owner):
+        """
+        Become the owner of a channel whose owner worker (or node) has died.
+
+        The channel's metadata, buffer and stream slot are left as the dead owner
+        had them; this worker claims the owner key and resumes fetching the same stream.
+        """
+        try:
+            claim = self.redis_client.register_script(CLAIM_OWNERSHIP_SCRIPT)
+            if not claim(keys=[RedisKeys.channel_owner(channel_id)], args=[dead_owner or "", self.worker_id, 30]):
+                return False  # Another worker got there first
+
+            metadata = {
+                key.decode("utf-8"): value.decode("utf-8")
+                for key, value in self.redis_client.hgetall(RedisKeys.channel_metadata(channel_id)).items()
+            }
+
+            transcode = False
+            if metadata.get(ChannelMetadataField.STREAM_PROFILE):
+                from core.models import StreamProfile
+
+                stream_profile = StreamProfile.objects.filter(id=metadata[ChannelMetadataField.STREAM_PROFILE]).first()
+                transcode = bool(stream_profile and not stream_profile.is_proxy())
+
+            stream_id = metadata.get(ChannelMetadataField.STREAM_ID)
+            self.start_stream(channel_id, {
+                "url": metadata.get(ChannelMetadataField.URL),
+                "user_agent": metadata.get(ChannelMetadataField.USER_AGENT),
+                "transcode": transcode,
+                "stream_id": int(stream_id) if stream_id else None,
+            }, dead_owner or "")
+
+            logger.warning(f"Worker {self.worker_id} took over channel {channel_id} from dead owner {dead_owner}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error taking over channel {channel_id} from dead owner {dead_owner}: {e}", exc_info=True)
+            return False
+
+    def start_stream(self, channel_id, data, from_worker):
+        """Start fetching a channel this worker has just become the owner of"""
+        from .client_manager import ClientManager
+        from .stream_buffer import StreamBuffer
+        from .stream_manager import StreamManager
+
+        server = self.proxy_server
+
+        buffer = server.stream_buffers.get(channel_id)
+        if buffer is None:
+            buffer = StreamBuffer(channel_id=channel_id, redis_client=self.redis_client)
+            server.stream_buffers[channel_id] = buffer
+        else:
+            # Continue from the last chunk the old owner wrote
+            buffer.index = int(self.redis_client.get(RedisKeys.buffer_index(channel_id)) or buffer.index)
+
+        if channel_id not in server.client_managers:
+            server.client_managers[channel_id] = ClientManager(
+                channel_id=channel_id,
+                redis_client=self.redis_client,
+                worker_id=self.worker_id
+            )
+
+        manager = StreamManager(
+            channel_id,
+            data.get("url"),
+            buffer,
+            user_agent=data.get("user_agent"),
+            transcode=data.get("transcode", False),
+            stream_id=data.get("stream_id"),
+            worker_id=self.worker_id
+        )
+        server.stream_managers[channel_id] = manager
+
+        self.redis_client.hset(RedisKeys.channel_metadata(channel_id), mapping={
+            ChannelMetadataField.OWNER: self.worker_id,
+            ChannelMetadataField.HANDOFF_TIME: str(time.time()),
+            ChannelMetadataField.HANDOFF_FROM: from_worker,
+        })
+
+        thread = threading.Thread(target=manager.run, daemon=True)
+        thread.name = f"stream-{channel_id}"
+        thread.start()
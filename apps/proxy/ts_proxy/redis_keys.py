@@ -24,6 +24,31 @@ class RedisKeys:
         """Prefix for buffer chunks"""
         return f"ts_proxy:channel:{channel_id}:buffer:chunk:"
 
+    @staticmethod
+    def buffer_readers(channel_id):
+        """Key for set of non-owner workers reading the channel buffer"""
+        return f"ts_proxy:channel:{channel_id}:buffer:readers"
+
+    @staticmethod
+    def buffer_keyframes(channel_id):
+        """Sorted set of buffer chunks containing a keyframe, scored by chunk index"""
+        return f"ts_proxy:channel:{channel_id}:buffer:keyframes"
+
+    @staticmethod
+    def buffer_psi(channel_id):
+        """Key for the latest PAT/PMT packets of the channel's stream"""
+        return f"ts_proxy:channel:{channel_id}:buffer:psi"
+
+    @staticmethod
+    def buffer_channels():
+        """Sorted set of channels with an active buffer, scored by last chunk write time"""
+        return "ts_proxy:buffer_channels"
+
+    @staticmethod
+    def buffer_events(channel_id):
+        """PubSub channel announcing newly written buffer chunks"""
+        return f"ts_proxy:buffer_events:{channel_id}"
+
     @staticmethod
     def channel_stopping(channel_id):
         """Key indicating channel is stopping"""
@@ -88,3 +113,53 @@ class RedisKeys:
     def client_metadata(channel_id, client_id):
         """Key for client metadata hash"""
         return f"ts_proxy:channel:{channel_id}:clients:{client_id}"
+
+    @staticmethod
+    def stream_health(stream_id):
+        """Hash of rolling connection health statistics for a stream"""
+        return f"ts_proxy:health:stream:{stream_id}"
+
+    @staticmethod
+    def profile_health(profile_id):
+        """Hash of rolling connection health statistics for an M3U profile"""
+        return f"ts_proxy:health:profile:{profile_id}"
+
+    @staticmethod
+    def health_index():
+        """Set of stream and profile health hashes, for listing the scoreboard"""
+        return "ts_proxy:health:index"
+
+    @staticmethod
+    def hot_channels_lock():
+        """Lock held by the worker currently warming hot channels"""
+        return "ts_proxy:hot_channels:lock"
+
+    @staticmethod
+    def channel_handoff(channel_id):
+        """Key tracking an in-progress ownership hand-off ("pending:<worker>" or "released")"""
+        return f"ts_proxy:channel:{channel_id}:handoff"
+
+    @staticmethod
+    def worker_load(worker_id):
+        """Hash of a worker's current load (owned channels, ingest rate, CPU)"""
+        return f"ts_proxy:worker:{worker_id}:load"
+
+    @staticmethod
+    def worker_loads():
+        """Sorted set of workers publishing their load, scored by last update time"""
+        return "ts_proxy:worker_loads"
+
+    @staticmethod
+    def nodes():
+        """Sorted set of proxy nodes, scored by last heartbeat time"""
+        return "ts_proxy:nodes"
+
+    @staticmethod
+    def node(node_id):
+        """Hash describing a proxy node (address, heartbeat, start time)"""
+        return f"ts_proxy:node:{node_id}"
+
+    @staticmethod
+    def worker_node(worker_id):
+        """Node a worker runs on"""
+        return f"ts_proxy:worker:{worker_id}:node"
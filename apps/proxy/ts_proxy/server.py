@@ -27,6 +27,9 @@ from .client_manager import ClientManager
 from .redis_keys import RedisKeys
 from .constants import ChannelState, EventType, StreamType
 from .config_helper import ConfigHelper
+from .hot_channels import HotChannels
+from .ownership import OwnershipBalancer
+from .cluster import ClusterNode
 from .utils import get_logger
 
 logger = get_logger()
@@ -52,13 +55,15 @@ class ProxyServer:
         self.stream_managers = {}
         self.stream_buffers = {}
         self.client_managers = {}
+        self.hot_idle_since = {}  # Channel ID -> when an owned hot channel last had no clients
 
         # Generate a unique worker ID
-        import socket
         import os
         pid = os.getpid()
-        hostname = socket.gethostname()
-        self.worker_id = f"{hostname}:{pid}"
+        node_id = ConfigHelper.node_id()
+        self.worker_id = f"{node_id}:{pid}"
+        self.balancer = OwnershipBalancer(self)
+        self.cluster = ClusterNode(self)
 
         # Connect to Redis - use dedicated client for proxy
         self.redis_client = None
@@ -126,6 +131,8 @@ class ProxyServer:
         if not self.redis_client:
             return
 
+        buffer_events_prefix = RedisKeys.buffer_events("")
+
         def event_listener():
             retry_count = 0
             max_retries = 10
@@ -166,7 +173,7 @@ class ProxyServer:
 
                     # Create a pubsub instance from the client
                     pubsub = pubsub_client.pubsub()
-                    pubsub.psubscribe("ts_proxy:events:*")
+                    pubsub.psubscribe("ts_proxy:events:*", RedisKeys.buffer_events("*"))
 
                     logger.info(f"Started Redis event listener for client activity")
 
@@ -179,12 +186,32 @@ class ProxyServer:
 
                         try:
                             channel = message["channel"].decode("utf-8")
+
+                            # Chunk notifications are frequent and not JSON - hand them straight to the buffer
+                            if channel.startswith(buffer_events_prefix):
+                                self._handle_buffer_event(channel[len(buffer_events_prefix):], message["data"])
+                                continue
+
                             data = json.loads(message["data"].decode("utf-8"))
 
                             event_type = data.get("event")
                             channel_id = data.get("channel_id")
 
                             if channel_id and event_type:
+                                # Every worker updates its local control flags so clients react immediately
+                                if event_type in (EventType.CHANNEL_STOP, EventType.CLIENT_STOP):
+                                    self._apply_control_event(channel_id, event_type, data)
+
+                                # The worker picked to take over a channel starts it; it isn't the owner yet
+                                if event_type == EventType.OWNERSHIP_HANDOFF:
+                                    if data.get("target_worker") == self.worker_id:
+                                        thread = threading.Thread(
+                                            target=self.balancer.adopt, args=(channel_id, data), daemon=True
+                                        )
+                                        thread.name = f"handoff-{channel_id}"
+                                        thread.start()
+                                    continue
+
                                 # For owner, update client status immediately
                                 if self.am_i_owner(channel_id):
                                     if event_type == EventType.CLIENT_CONNECTED:
@@ -193,6 +220,12 @@ class ProxyServer:
                                         disconnect_key = RedisKeys.last_client_disconnect(channel_id)
                                         self.redis_client.delete(disconnect_key)
 
+                                    elif event_type == EventType.BUFFER_READER_ATTACHED:
+                                        logger.info(f"Owner received {EventType.BUFFER_READER_ATTACHED} event for channel {channel_id} from worker {data.get('worker_id')}")
+                                        buffer = self.stream_buffers.get(channel_id)
+                                        if buffer:
+                                            buffer.use_shared_backend()
+
                                     elif event_type == EventType.CLIENT_DISCONNECTED:
                                         client_id = data.get("client_id")
                                         worker_id = data.get("worker_id")
@@ -221,7 +254,9 @@ class ProxyServer:
 
                                             # Perform the stream switch
                                             stream_manager = self.stream_managers[channel_id]
-                                            success = stream_manager.update_url(new_url)
+                                            success = stream_manager.update_url(
+                                                new_url, data.get("stream_id"), data.get("m3u_profile_id")
+                                            )
 
                                             if success:
                                                 logger.info(f"Stream switch initiated for channel {channel_id}")
@@ -342,6 +377,49 @@ class ProxyServer:
         thread.name = "redis-event-listener"
         thread.start()
 
+    def register_buffer_reader(self, channel_id):
+        """Tell the owner that this worker reads the channel buffer, so chunks must go through Redis"""
+        buffer = self.stream_buffers.get(channel_id)
+        if buffer is None or buffer.reader_registered or not self.redis_client:
+            return
+
+        try:
+            readers_key = RedisKeys.buffer_readers(channel_id)
+            self.redis_client.sadd(readers_key, self.worker_id)
+            self.redis_client.expire(readers_key, 3600)
+            self.redis_client.publish(RedisKeys.events_channel(channel_id), json.dumps({
+                "event": EventType.BUFFER_READER_ATTACHED,
+                "channel_id": channel_id,
+                "worker_id": self.worker_id,
+                "timestamp": time.time()
+            }))
+            buffer.reader_registered = True
+        except Exception as e:
+            logger.error(f"Error registering buffer reader for channel {channel_id}: {e}")
+
+    def _apply_control_event(self, channel_id, event_type, data):
+        """Mirror a stop event into the local client manager's control state"""
+        client_manager = self.client_managers.get(channel_id)
+        if client_manager is None:
+            return
+
+        if event_type == EventType.CHANNEL_STOP:
+            client_manager.channel_stopping = True
+        elif data.get("client_id"):
+            client_manager.stopped_clients.add(data["client_id"])
+
+    def _handle_buffer_event(self, channel_id, data):
+        """Wake local clients of a channel whose owner lives in another worker"""
+        buffer = self.stream_buffers.get(channel_id)
+        # The owner worker already signals its own clients when it writes a chunk
+        if buffer is None or channel_id in self.stream_managers:
+            return
+
+        try:
+            buffer.notify_chunk(int(data))
+        except (TypeError, ValueError):
+            logger.debug(f"Ignoring malformed buffer event for channel {channel_id}: {data!r}")
+
     def get_channel_owner(self, channel_id):
         """Get the worker ID that owns this channel with proper error handling"""
         if not self.redis_client:
@@ -609,6 +687,10 @@ class ProxyServer:
             logger.debug(f"Created StreamBuffer for channel {channel_id}")
             self.stream_buffers[channel_id] = buffer
 
+            # Keep chunks in-process unless another worker is already reading this channel
+            if ConfigHelper.buffer_backend() == 'auto' and not self.redis_client.exists(RedisKeys.buffer_readers(channel_id)):
+                buffer.use_local_backend()
+
             # Only the owner worker creates the actual stream manager
             stream_manager = StreamManager(
                 channel_id,
@@ -813,6 +895,10 @@ class ProxyServer:
             total = self.redis_client.scard(client_set_key) or 0
 
             if total == 0:
+                if self._keep_hot_channel(channel_id):
+                    logger.debug(f"No clients left for hot channel {channel_id} - keeping it running")
+                    return
+
                 logger.debug(f"No clients left after disconnect event - stopping channel {channel_id}")
                 # Set the disconnect timer for other workers to see
                 disconnect_key = RedisKeys.last_client_disconnect(channel_id)
@@ -837,10 +923,16 @@ class ProxyServer:
         except Exception as e:
             logger.error(f"Error handling client disconnect for channel {channel_id}: {e}")
 
+    def _keep_hot_channel(self, channel_id):
+        """Whether an owned channel without clients should keep running because it is hot"""
+        idle_since = self.hot_idle_since.setdefault(channel_id, time.time())
+        return HotChannels.should_keep(channel_id, idle_since)
+
     def stop_channel(self, channel_id):
         """Stop a channel with proper ownership handling"""
         try:
             logger.info(f"Stopping channel {channel_id}")
+            self.hot_idle_since.pop(channel_id, None)
 
             # First set a stopping key that clients will check
             if self.redis_client:
@@ -1038,6 +1130,12 @@ class ProxyServer:
                             if time.time() % 30 < 1:  # Every ~30 seconds
                                 logger.info(f"Channel {channel_id} has {total_clients} clients, state: {channel_state}")
 
+                            if total_clients > 0:
+                                self.hot_idle_since.pop(channel_id, None)
+                            elif channel_state in [ChannelState.ACTIVE, ChannelState.WAITING_FOR_CLIENTS, ChannelState.BUFFERING] and self._keep_hot_channel(channel_id):
+                                # Hot channels stay connected without clients
+                                continue
+
                             # If in connecting or waiting_for_clients state, check grace period
                             if channel_state in [ChannelState.CONNECTING, ChannelState.WAITING_FOR_CLIENTS]:
                                 # Check if channel is already stopping
@@ -1169,6 +1267,10 @@ class ProxyServer:
 
                         else:
                             # === NON-OWNER CHANNEL HANDLING ===
+                            # Hand back channels taken by another worker, take over channels whose owner died
+                            if self.cluster.check_owner(channel_id):
+                                continue
+
                             # For channels we don't own, check if they've been stopped/cleaned up in Redis
                             if self.redis_client:
                                 # Method 1: Check for stopping key
@@ -1203,6 +1305,13 @@ class ProxyServer:
                                 logger.warning(f"Non-owner cleanup: Channel {channel_id} has no client_manager entry, cleaning up local resources")
                                 self._cleanup_local_resources(channel_id)
 
+                    # Start hot channels ahead of viewers
+                    HotChannels.warm(self)
+
+                    # Publish this worker's load and move channels off it if it's overloaded
+                    self.balancer.tick()
+                    self.cluster.tick()
+
                 except Exception as e:
                     logger.error(f"Error in cleanup thread: {e}", exc_info=True)
 
@@ -1443,6 +1552,8 @@ class ProxyServer:
                 del self.client_managers[channel_id]
                 logger.info(f"Non-owner cleanup: Removed client manager for channel {channel_id}")
 
+            self.cluster.forget_channel(channel_id)
+
             return True
         except Exception as e:
             logger.error(f"Error cleaning up local resources: {e}", exc_info=True)
@@ -3,19 +3,96 @@
 import threading
 import logging
 import time
-from collections import deque
+from collections import deque, OrderedDict
 from typing import Optional, Deque
 import random
 from apps.proxy.config import TSConfig as Config
 from .redis_keys import RedisKeys
 from .config_helper import ConfigHelper
-from .constants import TS_PACKET_SIZE
+from .constants import TS_PACKET_SIZE, ChannelMetadataField
+from .buffer_backends import RedisBufferBackend, MemoryBufferBackend
+from .ts_index import KeyframeIndexer
 from .utils import get_logger
 import gevent.event
+import gevent.lock
 import gevent  # Make sure this import is at the top
 
 logger = get_logger()
 
+
+class ChunkCache:
+    """
+    Bounded in-process cache of recent buffer chunks, keyed by chunk index.
+
+    One cache exists per channel per worker, so every local client of a channel
+    shares the same chunk objects instead of each pulling its own copy from Redis.
+    Entries are evicted least-recently-used once the byte budget is exceeded, and
+    are dropped once older than max_age seconds.
+    """
+
+    def __init__(self, max_bytes, max_age):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._chunks = OrderedDict()  # chunk index -> (data, stored_at)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get_many(self, indices):
+        """Return a dict of index -> chunk for the indices that are cached and fresh"""
+        found = {}
+        if not self.enabled:
+            return found
+
+        now = time.time()
+        with self._lock:
+            for idx in indices:
+                entry = self._chunks.get(idx)
+                if entry is None:
+                    continue
+                data, stored_at = entry
+                if now - stored_at > self.max_age:
+                    self._discard(idx)
+                    continue
+                self._chunks.move_to_end(idx)
+                found[idx] = data
+        return found
+
+    def put(self, idx, data):
+        """Store a chunk, evicting old entries to stay within the byte budget"""
+        if not self.enabled or len(data) > self.max_bytes:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._discard(idx)
+            self._chunks[idx] = (data, now)
+            self._size += len(data)
+
+            # Evict expired entries first, then least recently used until within budget
+            while self._chunks:
+                oldest_idx, (oldest_data, stored_at) = next(iter(self._chunks.items()))
+                if self._size <= self.max_bytes and now - stored_at <= self.max_age:
+                    break
+                self._discard(oldest_idx)
+
+    def clear(self):
+        with self._lock:
+            self._chunks.clear()
+            self._size = 0
+
+    @property
+    def size(self):
+        return self._size
+
+    def _discard(self, idx):
+        entry = self._chunks.pop(idx, None)
+        if entry is not None:
+            self._size -= len(entry[0])
+
 class StreamBuffer:
     """Manages stream data buffering with optimized chunk storage"""
 
@@ -29,9 +106,26 @@ class StreamBuffer:
         # STANDARDIZED KEYS: Use RedisKeys class instead of hardcoded patterns
         self.buffer_index_key = RedisKeys.buffer_index(channel_id) if channel_id else ""
         self.buffer_prefix = RedisKeys.buffer_chunk_prefix(channel_id) if channel_id else ""
+        self.last_data_key = RedisKeys.last_data(channel_id) if channel_id else ""
+
+        # Liveness timestamp is refreshed with every chunk write and otherwise throttled
+        self.last_data_update = 0
+        self.last_data_interval = ConfigHelper.last_data_update_interval()
 
         self.chunk_ttl = ConfigHelper.redis_chunk_ttl()
 
+        # Where the owner stores completed chunks; see use_local_backend()
+        self.backend = RedisBufferBackend(channel_id, redis_client, self.chunk_ttl)
+        self.reader_registered = False
+
+        # Worker-local cache of recent chunks shared by all local clients of this channel
+        self.chunk_cache = ChunkCache(
+            ConfigHelper.local_chunk_cache_max_bytes(),
+            ConfigHelper.local_chunk_cache_max_age(),
+        )
+        # Only one local reader fetches missing chunks from Redis at a time
+        self._fill_lock = gevent.lock.Semaphore()
+
         # Initialize from Redis if available
         if self.redis_client and channel_id:
             try:
@@ -42,8 +136,27 @@ class StreamBuffer:
             except Exception as e:
                 logger.error(f"Error initializing buffer from Redis: {e}")
 
-        self._write_buffer = bytearray()
-        self.target_chunk_size = ConfigHelper.get('BUFFER_CHUNK_SIZE', TS_PACKET_SIZE * 5644)  # ~1MB default
+        # Views of ingested reads that haven't been written out as a full chunk yet
+        self._pending = deque()
+        self._pending_size = 0
+        target_chunk_size = ConfigHelper.get('BUFFER_CHUNK_SIZE', TS_PACKET_SIZE * 1361)  # ~256KB until the bitrate is known
+        self.target_chunk_size = max(TS_PACKET_SIZE, target_chunk_size - target_chunk_size % TS_PACKET_SIZE)
+
+        # Retention of written chunks by media duration and share of the global memory budget
+        self.retention_seconds = ConfigHelper.buffer_retention_seconds()
+        self.memory_budget = ConfigHelper.buffer_memory_budget_mb() * 1024 * 1024
+        self._retained = deque()  # (chunk index, size, written at) of chunks this owner still holds
+        self.buffer_bytes = 0
+        self.active_buffers = 1  # Channels sharing the memory budget, refreshed with every write
+
+        # Keyframe positions in recent chunks (owner only), so clients can join at a decodable point
+        self.keyframe_join = ConfigHelper.keyframe_join()
+        self.keyframe_window = ConfigHelper.keyframe_search_window()
+        self.keyframe_indexer = KeyframeIndexer()
+        self.keyframes = deque()  # (chunk index, byte offset)
+
+        # Never trim below what new clients start from
+        self.min_retained_chunks = max(ConfigHelper.initial_behind_chunks(), self.keyframe_window) + 1
 
         # Track timers for proper cleanup
         self.stopping = False
@@ -56,51 +169,28 @@ class StreamBuffer:
             return False
 
         try:
-            # Accumulate partial packets between chunks
-            if not hasattr(self, '_partial_packet'):
-                self._partial_packet = bytearray()
-
-            # Combine with any previous partial packet
-            combined_data = bytearray(self._partial_packet) + bytearray(chunk)
-
-            # Calculate complete packets
-            complete_packets_size = (len(combined_data) // self.TS_PACKET_SIZE) * self.TS_PACKET_SIZE
-
-            if complete_packets_size == 0:
-                # Not enough data for a complete packet
-                self._partial_packet = combined_data
-                return True
+            # Keep a view of the read rather than copying it into a growing buffer.
+            # Reads are normally immutable bytes; anything else is copied once here.
+            if not isinstance(chunk, bytes):
+                chunk = bytes(chunk)
 
-            # Split into complete packets and remainder
-            complete_packets = combined_data[:complete_packets_size]
-            self._partial_packet = combined_data[complete_packets_size:]
-
-            # Add completed packets to write buffer
-            self._write_buffer.extend(complete_packets)
-
-            # Only write to Redis when we have enough data for an optimized chunk
             writes_done = 0
             with self.lock:
-                while len(self._write_buffer) >= self.target_chunk_size:
-                    # Extract a full chunk
-                    chunk_data = self._write_buffer[:self.target_chunk_size]
-                    self._write_buffer = self._write_buffer[self.target_chunk_size:]
+                self._pending.append(memoryview(chunk))
+                self._pending_size += len(chunk)
 
-                    # Write optimized chunk to Redis
+                # Only write to Redis when we have enough data for an optimized chunk.
+                # target_chunk_size is a whole number of TS packets, so chunks stay aligned.
+                while self._pending_size >= self.target_chunk_size:
                     if self.redis_client:
-                        chunk_index = self.redis_client.incr(self.buffer_index_key)
-                        chunk_key = RedisKeys.buffer_chunk(self.channel_id, chunk_index)
-                        self.redis_client.setex(chunk_key, self.chunk_ttl, bytes(chunk_data))
-
-                        # Update local tracking
-                        self.index = chunk_index
+                        self._write_chunk(self._take_pending(self.target_chunk_size))
                         writes_done += 1
+                    else:
+                        self._take_pending(self.target_chunk_size)
 
             if writes_done > 0:
                 logger.debug(f"Added {writes_done} chunks ({self.target_chunk_size} bytes each) to Redis for channel {self.channel_id} at index {self.index}")
-
-            self.chunk_available.set()  # Signal that new data is available
-            self.chunk_available.clear()  # Reset for next notification
+                self._signal_chunk_available()
 
             return True
 
@@ -108,6 +198,221 @@ class StreamBuffer:
             logger.error(f"Error adding chunk to buffer: {e}")
             return False
 
+    def set_target_chunk_size(self, size):
+        """
+        Resize future chunks, clamped to the configured bounds and rounded to whole TS packets.
+
+        Small changes are ignored so a jittery bitrate doesn't resize every sample.
+        """
+        size = max(ConfigHelper.min_buffer_chunk_size(), min(int(size), ConfigHelper.max_buffer_chunk_size()))
+        size = max(TS_PACKET_SIZE, size - size % TS_PACKET_SIZE)
+
+        if abs(size - self.target_chunk_size) < self.target_chunk_size * 0.1:
+            return False
+
+        with self.lock:
+            logger.debug(f"Channel {self.channel_id} buffer chunk size {self.target_chunk_size} -> {size} bytes")
+            self.target_chunk_size = size
+        return True
+
+    def _take_pending(self, size):
+        """
+        Remove size bytes from the front of the pending reads and return them as one bytes object.
+
+        This join is the only copy ingested data goes through. Must be called with the lock held.
+        """
+        parts = []
+        needed = size
+        while needed:
+            view = self._pending[0]
+            if len(view) <= needed:
+                parts.append(self._pending.popleft())
+                needed -= len(view)
+            else:
+                parts.append(view[:needed])
+                self._pending[0] = view[needed:]
+                needed = 0
+        self._pending_size -= size
+
+        # A single whole read can be handed on as-is
+        if len(parts) == 1 and len(parts[0]) == len(parts[0].obj):
+            return parts[0].obj
+        return b"".join(parts)
+
+    def _write_chunk(self, chunk_bytes):
+        """
+        Store one complete chunk in Redis and the local cache. Must be called with the lock held.
+
+        The owner is the only writer, so the next index is known locally and the index,
+        the chunk (for the Redis backend), the liveness timestamp and the notification
+        go out in one pipeline.
+        """
+        chunk_index = self.index + 1
+        now = time.time()
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.set(self.buffer_index_key, chunk_index)
+        self.backend.write(pipe, chunk_index, chunk_bytes)
+        pipe.set(self.last_data_key, str(now), ex=60)
+        if self.keyframe_join:
+            self._index_keyframe(pipe, chunk_index, chunk_bytes)
+
+        self._retained.append((chunk_index, len(chunk_bytes), now))
+        self.buffer_bytes += len(chunk_bytes)
+        self._trim_retained(pipe, now)
+        pipe.hset(RedisKeys.channel_metadata(self.channel_id), mapping={
+            ChannelMetadataField.BUFFER_BYTES: str(self.buffer_bytes),
+            ChannelMetadataField.BUFFER_SECONDS: str(round(now - self._retained[0][2], 1)),
+        })
+
+        pipe.publish(RedisKeys.buffer_events(self.channel_id), str(chunk_index))
+
+        if self.memory_budget:
+            # Register as an active buffer and count how many channels share the budget
+            channels_key = RedisKeys.buffer_channels()
+            pipe.zadd(channels_key, {self.channel_id: now})
+            pipe.zremrangebyscore(channels_key, "-inf", now - 60)
+            pipe.zcard(channels_key)
+
+        results = pipe.execute()
+        if self.memory_budget:
+            self.active_buffers = max(1, int(results[-1]))
+
+        self.chunk_cache.put(chunk_index, chunk_bytes)
+
+        # Update local tracking
+        self.index = chunk_index
+        self.last_data_update = now
+        return chunk_index
+
+    def _trim_retained(self, pipe, now):
+        """Delete the oldest chunks once they exceed the retention time or this channel's memory share"""
+        cutoff = now - self.retention_seconds
+        budget = self.memory_budget / self.active_buffers if self.memory_budget else None
+
+        while len(self._retained) > self.min_retained_chunks:
+            chunk_index, size, written_at = self._retained[0]
+            if written_at >= cutoff and (budget is None or self.buffer_bytes <= budget):
+                break
+            self._retained.popleft()
+            self.buffer_bytes -= size
+            self.backend.discard(pipe, chunk_index)
+
+    def _index_keyframe(self, pipe, chunk_index, chunk_bytes):
+        """Record the first keyframe in a chunk locally and, for other workers, in Redis"""
+        try:
+            offset = self.keyframe_indexer.scan(chunk_bytes)
+        except Exception as e:
+            logger.debug(f"Failed to scan chunk {chunk_index} for keyframes: {e}")
+            return
+
+        oldest = chunk_index - self.keyframe_window
+        while self.keyframes and self.keyframes[0][0] <= oldest:
+            self.keyframes.popleft()
+
+        psi = self.keyframe_indexer.psi
+        if offset is None or psi is None:
+            return
+
+        self.keyframes.append((chunk_index, offset))
+
+        keyframes_key = RedisKeys.buffer_keyframes(self.channel_id)
+        pipe.zadd(keyframes_key, {f"{chunk_index}:{offset}": chunk_index})
+        pipe.zremrangebyscore(keyframes_key, "-inf", oldest)
+        pipe.expire(keyframes_key, self.chunk_ttl)
+        pipe.set(RedisKeys.buffer_psi(self.channel_id), psi, ex=self.chunk_ttl)
+
+    def find_join_point(self, target_index):
+        """
+        Find the keyframe chunk closest to target_index within the search window.
+
+        Returns (chunk index, byte offset of the keyframe, PAT/PMT packets) or None.
+        The owner answers from its own index, other workers ask Redis.
+        """
+        head = self.index
+        oldest = head - self.keyframe_window
+
+        if self.keyframes:
+            candidates = [(idx, offset) for idx, offset in self.keyframes if oldest < idx <= head]
+            psi = self.keyframe_indexer.psi
+        else:
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.zrangebyscore(RedisKeys.buffer_keyframes(self.channel_id), oldest + 1, head)
+                pipe.get(RedisKeys.buffer_psi(self.channel_id))
+                members, psi = pipe.execute()
+            except Exception as e:
+                logger.debug(f"Failed to read keyframe index for channel {self.channel_id}: {e}")
+                return None
+
+            candidates = []
+            for member in members:
+                if isinstance(member, bytes):
+                    member = member.decode('utf-8')
+                idx, offset = member.split(":")
+                candidates.append((int(idx), int(offset)))
+
+        if not candidates or not psi:
+            return None
+
+        # Closest to the target, preferring the earlier keyframe on a tie
+        chunk_index, offset = min(candidates, key=lambda kf: (abs(kf[0] - target_index), kf[0]))
+        return chunk_index, offset, psi
+
+    def use_local_backend(self):
+        """Keep chunks inside this process until a client on another worker attaches"""
+        with self.lock:
+            if not self.backend.shared:
+                return
+            self.backend = MemoryBufferBackend(self.chunk_ttl, ConfigHelper.local_buffer_max_bytes())
+
+        self._record_backend()
+        logger.info(f"Channel {self.channel_id} buffering in-process until another worker attaches")
+
+    def use_shared_backend(self):
+        """Switch to Redis storage, copying the chunks held locally so attaching workers can read them"""
+        with self.lock:
+            if self.backend.shared:
+                return
+
+            local_backend = self.backend
+            self.backend = RedisBufferBackend(self.channel_id, self.redis_client, self.chunk_ttl)
+
+            now = time.time()
+            pipe = self.redis_client.pipeline(transaction=False)
+            copied = 0
+            for chunk_index, chunk_bytes, stored_at in local_backend.snapshot():
+                remaining_ttl = int(self.chunk_ttl - (now - stored_at))
+                if remaining_ttl > 0:
+                    pipe.setex(RedisKeys.buffer_chunk(self.channel_id, chunk_index), remaining_ttl, chunk_bytes)
+                    copied += 1
+            pipe.execute()
+
+        self._record_backend()
+        logger.info(f"Channel {self.channel_id} switched to Redis buffering for other workers ({copied} chunks copied)")
+
+    def _record_backend(self):
+        try:
+            self.redis_client.hset(
+                RedisKeys.channel_metadata(self.channel_id),
+                ChannelMetadataField.BUFFER_BACKEND,
+                self.backend.name,
+            )
+        except Exception as e:
+            logger.debug(f"Failed to record buffer backend for channel {self.channel_id}: {e}")
+
+    def mark_data_received(self):
+        """Refresh the channel's last data timestamp in Redis, at most once per interval"""
+        now = time.time()
+        if not self.redis_client or now - self.last_data_update < self.last_data_interval:
+            return
+
+        self.last_data_update = now
+        try:
+            self.redis_client.set(self.last_data_key, str(now), ex=60)
+        except Exception as e:
+            logger.debug(f"Failed to update last data time for channel {self.channel_id}: {e}")
+
     def get_chunks(self, start_index=None):
         """Get chunks from the buffer with detailed logging"""
         try:
@@ -197,8 +502,11 @@ class StreamBuffer:
             start_id = start_index + 1
             end_id = start_id + count
 
-            # Get current buffer position
-            current_index = int(self.redis_client.get(self.buffer_index_key) or 0)
+            # Get current buffer position (the owner keeping chunks locally already knows it)
+            if self.backend.shared:
+                current_index = int(self.redis_client.get(self.buffer_index_key) or 0)
+            else:
+                current_index = self.index
 
             # If requesting beyond current buffer, return what we have
             if start_id > current_index:
@@ -207,16 +515,27 @@ class StreamBuffer:
             # Cap end at current buffer position
             end_id = min(end_id, current_index + 1)
 
-            # Directly fetch from Redis using pipeline
-            pipe = self.redis_client.pipeline()
-            for idx in range(start_id, end_id):
-                chunk_key = RedisKeys.buffer_chunk(self.channel_id, idx)
-                pipe.get(chunk_key)
+            wanted = range(start_id, end_id)
 
-            results = pipe.execute()
+            # Serve what we can from the worker-local cache
+            found = self.chunk_cache.get_many(wanted)
 
-            # Filter out None results
-            chunks = [result for result in results if result is not None]
+            if len(found) < len(wanted):
+                with self._fill_lock:
+                    # Another local reader may have filled these while we waited
+                    found.update(self.chunk_cache.get_many(
+                        idx for idx in wanted if idx not in found
+                    ))
+                    missing = [idx for idx in wanted if idx not in found]
+
+                    if missing:
+                        # Fetch only the missing chunks from the backend
+                        for idx, result in self.backend.read(missing).items():
+                            found[idx] = result
+                            self.chunk_cache.put(idx, result)
+
+            # Keep chunk order and skip chunks that no longer exist
+            chunks = [found[idx] for idx in wanted if idx in found]
 
             # Update local index if needed
             if chunks and start_id + len(chunks) - 1 > self.index:
@@ -249,34 +568,59 @@ class StreamBuffer:
         # Clear timer list
         self.fill_timers.clear()
 
+        self.flush()
+        self.chunk_cache.clear()
+
+        if self.memory_budget and self.redis_client:
+            try:
+                self.redis_client.zrem(RedisKeys.buffer_channels(), self.channel_id)
+            except Exception as e:
+                logger.debug(f"Failed to unregister buffer for channel {self.channel_id}: {e}")
+
+        # Wake any clients waiting at the buffer head so they notice the stop
+        self._signal_chunk_available()
+
+    def flush(self):
+        """Write out any pending data as a final chunk, aligned to whole TS packets"""
         try:
-            # Flush any remaining data in the write buffer
-            if hasattr(self, '_write_buffer') and len(self._write_buffer) > 0:
-                # Ensure remaining data is aligned to TS packets
-                complete_size = (len(self._write_buffer) // 188) * 188
-
-                if complete_size > 0:
-                    final_chunk = self._write_buffer[:complete_size]
-
-                    # Write final chunk to Redis
-                    with self.lock:
-                        if self.redis_client:
-                            try:
-                                chunk_index = self.redis_client.incr(self.buffer_index_key)
-                                chunk_key = f"{self.buffer_prefix}{chunk_index}"
-                                self.redis_client.setex(chunk_key, self.chunk_ttl, bytes(final_chunk))
-                                self.index = chunk_index
-                                logger.info(f"Flushed final chunk of {len(final_chunk)} bytes to Redis")
-                            except Exception as e:
-                                logger.error(f"Error flushing final chunk: {e}")
+            with self.lock:
+                complete_size = (self._pending_size // TS_PACKET_SIZE) * TS_PACKET_SIZE
+
+                if complete_size > 0 and self.redis_client:
+                    try:
+                        self._write_chunk(self._take_pending(complete_size))
+                        self._signal_chunk_available()
+                        logger.info(f"Flushed final chunk of {complete_size} bytes to Redis")
+                    except Exception as e:
+                        logger.error(f"Error flushing final chunk: {e}")
 
                 # Clear buffers
-                self._write_buffer = bytearray()
-                if hasattr(self, '_partial_packet'):
-                    self._partial_packet = bytearray()
+                self._pending.clear()
+                self._pending_size = 0
 
         except Exception as e:
-            logger.error(f"Error during buffer stop: {e}")
+            logger.error(f"Error during buffer flush: {e}")
+
+    def notify_chunk(self, chunk_index):
+        """Record a chunk written by the owner worker and wake local waiters"""
+        if chunk_index > self.index:
+            self.index = chunk_index
+        self._signal_chunk_available()
+
+    def wait_for_chunk(self, client_index, timeout):
+        """
+        Block the calling greenlet until a chunk newer than client_index is written.
+
+        Returns True if a chunk is (or may be) available, False if the timeout expired.
+        The timeout is only a safety net in case a notification is missed.
+        """
+        if self.index > client_index:
+            return True
+        return self.chunk_available.wait(timeout)
+
+    def _signal_chunk_available(self):
+        self.chunk_available.set()  # Signal that new data is available
+        self.chunk_available.clear()  # Reset for next notification
 
     def get_optimized_client_data(self, client_index):
         """Get optimal amount of data for client streaming based on position and target size"""
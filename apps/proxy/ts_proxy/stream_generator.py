@@ -199,11 +199,40 @@ class StreamGenerator:
         self.consecutive_empty = 0
         self.is_owner_worker = proxy_server.am_i_owner(self.channel_id) if hasattr(proxy_server, 'am_i_owner') else True
 
+        # Make sure the owner stores chunks where this worker can read them
+        if not self.is_owner_worker:
+            proxy_server.register_buffer_reader(self.channel_id)
+
+        # Start at a keyframe so players can decode from the first bytes they receive
+        self.join_data = None
+        if ConfigHelper.keyframe_join():
+            self._position_at_keyframe()
+
         logger.info(f"[{self.client_id}] Starting stream at index {self.local_index} (buffer at {buffer.index})")
         return True
 
+    def _position_at_keyframe(self):
+        """Move the start position to the nearest keyframe and prepare the PAT/PMT prefixed first chunk"""
+        join_point = self.buffer.find_join_point(self.local_index + 1)
+        if not join_point:
+            return
+
+        chunk_index, offset, psi = join_point
+        chunks = self.buffer.get_chunks_exact(chunk_index - 1, 1)
+        if not chunks:
+            return
+
+        self.join_data = psi + chunks[0][offset:]
+        self.local_index = chunk_index
+        logger.debug(f"[{self.client_id}] Joining at keyframe in chunk {chunk_index} (offset {offset})")
+
     def _stream_data_generator(self):
         """Generate stream data chunks based on buffer contents."""
+        # Send the keyframe-aligned part of the start chunk first
+        if self.join_data:
+            join_data, self.join_data = self.join_data, None
+            yield from self._process_chunks([join_data], self.local_index)
+
         # Main streaming loop
         while True:
             # Check if resources still exist
@@ -244,8 +273,11 @@ class StreamGenerator:
                     self.last_yield_time = time.time()
                     self.consecutive_empty = 0  # Reset consecutive counter but keep total empty_reads
                     gevent.sleep(Config.KEEPALIVE_INTERVAL)  # Replace time.sleep
+                elif self.local_index >= self.buffer.index:
+                    # At buffer head - sleep until the next chunk is announced instead of polling
+                    self.buffer.wait_for_chunk(self.local_index, ConfigHelper.chunk_wait_timeout())
                 else:
-                    # Standard wait with backoff
+                    # Chunks exist ahead of us but couldn't be read yet, wait with backoff
                     sleep_time = min(0.1 * self.consecutive_empty, 1.0)
                     gevent.sleep(sleep_time)  # Replace time.sleep
 
@@ -276,35 +308,31 @@ class StreamGenerator:
             logger.info(f"[{self.client_id}] Client manager no longer exists, terminating stream")
             return False
 
-        # Check if this specific client has been stopped (Redis keys, etc.)
+        # Check if this specific client has been stopped. The control flags are kept
+        # up to date by the client manager's watcher, so no Redis round trips here.
         if proxy_server.redis_client:
-            # Channel stop check - with extended key set
-            stop_key = RedisKeys.channel_stopping(self.channel_id)
-            if proxy_server.redis_client.exists(stop_key):
+            client_manager = proxy_server.client_managers[self.channel_id]
+
+            # Channel stop check
+            if client_manager.channel_stopping:
                 logger.info(f"[{self.client_id}] Detected channel stop signal, terminating stream")
                 return False
 
             # Also check channel state in metadata
-            metadata_key = RedisKeys.channel_metadata(self.channel_id)
-            metadata = proxy_server.redis_client.hgetall(metadata_key)
-            if metadata and b'state' in metadata:
-                state = metadata[b'state'].decode('utf-8')
-                if state in ['error', 'stopped', 'stopping']:
-                    logger.info(f"[{self.client_id}] Channel in {state} state, terminating stream")
-                    return False
+            state = client_manager.channel_state
+            if state in ['error', 'stopped', 'stopping']:
+                logger.info(f"[{self.client_id}] Channel in {state} state, terminating stream")
+                return False
 
             # Client stop check
-            client_stop_key = RedisKeys.client_stop(self.channel_id, self.client_id)
-            if proxy_server.redis_client.exists(client_stop_key):
+            if self.client_id in client_manager.stopped_clients:
                 logger.info(f"[{self.client_id}] Detected client stop signal, terminating stream")
                 return False
 
             # Also check if client has been removed from client_manager
-            if self.channel_id in proxy_server.client_managers:
-                client_manager = proxy_server.client_managers[self.channel_id]
-                if self.client_id not in client_manager.clients:
-                    logger.info(f"[{self.client_id}] Client no longer in client manager, terminating stream")
-                    return False
+            if self.client_id not in client_manager.clients:
+                logger.info(f"[{self.client_id}] Client no longer in client manager, terminating stream")
+                return False
 
         return True
 
@@ -0,0 +1,219 @@
+"""
+Rolling stream health scoreboard.
+
+Stream managers record connection outcomes for the stream and M3U profile they are
+using: connect latency and time to first byte on success, failed connection attempts,
+and stalls where data stopped arriving mid-stream. The statistics are kept in Redis
+so every worker shares them, and are turned into a 0-100 score used to try healthy
+streams first when tuning and failing over.
+"""
+
+import time
+
+from .config_helper import ConfigHelper
+from .redis_keys import RedisKeys
+from .utils import get_logger
+
+logger = get_logger()
+
+HEALTH_TTL = 7 * 24 * 3600  # Forget streams that haven't been used for a week
+EWMA_ALPHA = 0.2  # Weight of the newest sample in rolling averages
+DECAY_HALF_LIFE = 600  # Seconds for recent failure/stall counts to halve
+
+# Updates one health hash atomically. ARGV: event, now, alpha, half-life,
+# connect_ms, first_byte_ms (empty when not measured), index member, TTL.
+UPDATE_HEALTH_SCRIPT = """
+local key = KEYS[1]
+local event, now, alpha, half_life = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+
+local function decayed(count_field, time_field)
+    local count = tonumber(redis.call('HGET', key, count_field) or '0')
+    local last = tonumber(redis.call('HGET', key, time_field) or now)
+    return count * math.pow(0.5, (now - last) / half_life)
+end
+
+local function ewma(field, sample, initial)
+    local current = redis.call('HGET', key, field) or initial
+    if current then
+        return (1 - alpha) * tonumber(current) + alpha * sample
+    end
+    return sample
+end
+
+if event == 'stall' then
+    redis.call('HINCRBY', key, 'stalls', 1)
+    redis.call('HSET', key, 'recent_stalls', tostring(decayed('recent_stalls', 'last_stall') + 1), 'last_stall', ARGV[2])
+else
+    redis.call('HINCRBY', key, 'attempts', 1)
+    if event == 'success' then
+        redis.call('HSET', key, 'error_rate', tostring(ewma('error_rate', 0, 0)), 'last_success', ARGV[2])
+        if ARGV[5] ~= '' then
+            redis.call('HSET', key, 'connect_ms', tostring(ewma('connect_ms', tonumber(ARGV[5]))))
+        end
+        if ARGV[6] ~= '' then
+            redis.call('HSET', key, 'first_byte_ms', tostring(ewma('first_byte_ms', tonumber(ARGV[6]))))
+        end
+    else
+        redis.call('HINCRBY', key, 'failures', 1)
+        redis.call('HSET', key, 'error_rate', tostring(ewma('error_rate', 1, 0)),
+            'recent_failures', tostring(decayed('recent_failures', 'last_failure') + 1), 'last_failure', ARGV[2])
+    end
+end
+
+redis.call('EXPIRE', key, tonumber(ARGV[8]))
+redis.call('SADD', KEYS[2], ARGV[7])
+return 1
+"""
+
+
+class StreamHealth:
+    """Records and scores per-stream and per-M3U-profile connection health"""
+
+    @staticmethod
+    def _record(redis_client, event, stream_id, profile_id, connect_time=None, first_byte_time=None):
+        if not redis_client or not stream_id:
+            return
+        try:
+            script = redis_client.register_script(UPDATE_HEALTH_SCRIPT)
+            now = time.time()
+            connect_ms = "" if connect_time is None else f"{connect_time * 1000:.0f}"
+            first_byte_ms = "" if first_byte_time is None else f"{first_byte_time * 1000:.0f}"
+
+            targets = [(RedisKeys.stream_health(stream_id), f"stream:{stream_id}")]
+            if profile_id:
+                targets.append((RedisKeys.profile_health(profile_id), f"profile:{profile_id}"))
+
+            pipe = redis_client.pipeline(transaction=False)
+            for key, member in targets:
+                script(keys=[key, RedisKeys.health_index()],
+                       args=[event, now, EWMA_ALPHA, DECAY_HALF_LIFE, connect_ms, first_byte_ms, member, HEALTH_TTL],
+                       client=pipe)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to record {event} health event for stream {stream_id}: {e}")
+
+    @staticmethod
+    def record_success(redis_client, stream_id, profile_id, connect_time=None, first_byte_time=None):
+        """Record a connection that delivered data, with its latencies in seconds"""
+        StreamHealth._record(redis_client, "success", stream_id, profile_id, connect_time, first_byte_time)
+
+    @staticmethod
+    def record_failure(redis_client, stream_id, profile_id):
+        """Record a connection attempt that failed before delivering any data"""
+        StreamHealth._record(redis_client, "failure", stream_id, profile_id)
+
+    @staticmethod
+    def record_stall(redis_client, stream_id, profile_id):
+        """Record a connected stream that stopped delivering data"""
+        StreamHealth._record(redis_client, "stall", stream_id, profile_id)
+
+    @staticmethod
+    def _decode(stats):
+        return {k.decode() if isinstance(k, bytes) else k: float(v) for k, v in stats.items()}
+
+    @staticmethod
+    def score(stats, now=None):
+        """Score decoded health statistics from 0 (failing) to 100 (healthy), or None without statistics"""
+        if not stats:
+            return None
+        now = now or time.time()
+
+        def decayed(count_field, time_field):
+            elapsed = max(0.0, now - stats.get(time_field, now))
+            return stats.get(count_field, 0.0) * 0.5 ** (elapsed / DECAY_HALF_LIFE)
+
+        score = 100.0 * (1.0 - stats.get("error_rate", 0.0))
+        score -= 15.0 * decayed("recent_failures", "last_failure")
+        score -= 10.0 * decayed("recent_stalls", "last_stall")
+        score -= min(20.0, stats.get("first_byte_ms", 0.0) / 500.0)  # Up to -20 for a 10s first byte
+        return max(0.0, min(100.0, score))
+
+    @staticmethod
+    def get_scores(redis_client, stream_ids=(), profile_ids=()):
+        """
+        Fetch scores for streams and profiles in one round trip.
+
+        Returns:
+            Tuple[dict, dict]: ({stream_id: score}, {profile_id: score}), with None for unknown ids
+        """
+        stream_ids = list(dict.fromkeys(stream_ids))
+        profile_ids = list(dict.fromkeys(profile_ids))
+        if not redis_client or not (stream_ids or profile_ids):
+            return {}, {}
+
+        pipe = redis_client.pipeline(transaction=False)
+        for stream_id in stream_ids:
+            pipe.hgetall(RedisKeys.stream_health(stream_id))
+        for profile_id in profile_ids:
+            pipe.hgetall(RedisKeys.profile_health(profile_id))
+        results = pipe.execute()
+
+        now = time.time()
+        scores = [StreamHealth.score(StreamHealth._decode(stats), now) for stats in results]
+        return dict(zip(stream_ids, scores[:len(stream_ids)])), dict(zip(profile_ids, scores[len(stream_ids):]))
+
+    @staticmethod
+    def order_candidates(redis_client, candidates, stream_key=lambda c: c[0], profile_key=lambda c: c[1]):
+        """
+        Move candidates with an unhealthy stream behind the healthy ones.
+
+        A stream that hasn't been used recently is judged by its M3U profile's score,
+        and one without either is assumed healthy. Healthy candidates keep their
+        configured order; unhealthy ones follow, best score first. Returns candidates
+        unchanged if health-aware ordering is disabled or the scores can't be read.
+        """
+        if not ConfigHelper.health_aware_failover() or len(candidates) < 2:
+            return candidates
+
+        try:
+            stream_scores, profile_scores = StreamHealth.get_scores(
+                redis_client,
+                [stream_key(c) for c in candidates],
+                [profile_key(c) for c in candidates],
+            )
+        except Exception as e:
+            logger.warning(f"Failed to read stream health scores: {e}")
+            return candidates
+
+        threshold = ConfigHelper.unhealthy_stream_score()
+
+        def sort_key(candidate):
+            score = stream_scores.get(stream_key(candidate))
+            if score is None:
+                score = profile_scores.get(profile_key(candidate))
+            if score is None:
+                score = 100.0
+            return (0, 0) if score >= threshold else (1, -score)
+
+        return sorted(candidates, key=sort_key)
+
+    @staticmethod
+    def scoreboard(redis_client):
+        """Return statistics and scores for every tracked stream and M3U profile"""
+        members = sorted(m.decode() for m in redis_client.smembers(RedisKeys.health_index()))
+
+        pipe = redis_client.pipeline(transaction=False)
+        for member in members:
+            kind, object_id = member.split(":", 1)
+            pipe.hgetall(RedisKeys.stream_health(object_id) if kind == "stream" else RedisKeys.profile_health(object_id))
+        results = pipe.execute()
+
+        now = time.time()
+        board = {"streams": [], "profiles": []}
+        expired = []
+        for member, stats in zip(members, results):
+            if not stats:
+                expired.append(member)
+                continue
+            kind, object_id = member.split(":", 1)
+            stats = StreamHealth._decode(stats)
+            entry = {"id": int(object_id), "score": round(StreamHealth.score(stats, now), 1)}
+            entry.update({field: round(value, 3) for field, value in stats.items()})
+            board["streams" if kind == "stream" else "profiles"].append(entry)
+
+        if expired:
+            redis_client.srem(RedisKeys.health_index(), *expired)
+
+        for entries in board.values():
+            entries.sort(key=lambda entry: entry["score"])
+        return board
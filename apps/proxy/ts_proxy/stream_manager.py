@@ -8,12 +8,14 @@ import requests
 import subprocess
 import gevent
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 from typing import Optional, List
 from django.db import connection
 from django.shortcuts import get_object_or_404
 from urllib3.exceptions import ReadTimeoutError
 from apps.proxy.config import TSConfig as Config
-from apps.channels.models import Channel, Stream
+from apps.channels.models import Channel, Stream, reserve_stream_slot, release_profile_slot
+from apps.channels.tune_plan import get_tune_plan
 from apps.m3u.models import M3UAccount, M3UAccountProfile
 from core.models import UserAgent, CoreSettings
 from core.utils import log_system_event
@@ -22,7 +24,8 @@ from .utils import detect_stream_type, get_logger
 from .redis_keys import RedisKeys
 from .constants import ChannelState, EventType, StreamType, ChannelMetadataField, TS_PACKET_SIZE
 from .config_helper import ConfigHelper
-from .url_utils import get_alternate_streams, get_stream_info_for_switch, get_stream_object
+from .stream_health import StreamHealth
+from .url_utils import get_alternate_streams, get_stream_info_for_switch, get_stream_object, probe_stream_url, transform_url
 
 logger = get_logger()
 
@@ -47,6 +50,8 @@ class StreamManager:
         self.buffering_timeout = ConfigHelper.buffering_timeout()
         self.buffering_speed = ConfigHelper.buffering_speed()
         self.buffering_start_time = None
+        self.parallel_probe_count = ConfigHelper.parallel_probe_count()
+        self.probe_timeout = ConfigHelper.probe_timeout()
         # Store worker_id for ownership checks
         self.worker_id = worker_id
 
@@ -116,6 +121,11 @@ class StreamManager:
         self.last_bytes_update = time.time()
         self.bytes_update_interval = 5  # Update Redis every 5 seconds
 
+        # Ingest bitrate measurement used to size buffer chunks by duration
+        self.bitrate_sample_start = time.time()
+        self.bitrate_sample_bytes = 0
+        self.ingest_bitrate = 0  # Smoothed, in bytes per second
+
         # Add stderr reader thread property
         self.stderr_reader_thread = None
         self.ffmpeg_input_phase = True  # Track if we're still reading input info
@@ -123,6 +133,10 @@ class StreamManager:
         # Add HTTP reader thread property
         self.http_reader = None
 
+        # Connection attempt timing for the stream health scoreboard
+        self.attempt_start_time = None
+        self.first_byte_time = None
+
     def _create_session(self):
         """Create and configure requests session with optimal settings"""
         session = requests.Session()
@@ -255,6 +269,8 @@ class StreamManager:
 
                     # Handle connection based on whether we transcode or not
                     connection_result = False
+                    self.attempt_start_time = time.time()
+                    self.first_byte_time = None
                     try:
                         if self.transcode:
                             connection_result = self._establish_transcode_connection()
@@ -300,6 +316,9 @@ class StreamManager:
                             # Normal shutdown requested
                             return
 
+                        if self.first_byte_time is None:
+                            self._record_health("failure")
+
                         # Connection failed, increment retry count
                         self.retry_count += 1
                         self.connected = False
@@ -330,6 +349,8 @@ class StreamManager:
 
                     except Exception as e:
                         logger.error(f"Connection error on channel: {self.channel_id}: {e}", exc_info=True)
+                        if self.first_byte_time is None:
+                            self._record_health("failure")
                         self.retry_count += 1
                         self.connected = False
 
@@ -922,9 +943,17 @@ class StreamManager:
         try:
             # Update local counter
             self.bytes_processed += chunk_size
+            now = time.time()
+
+            # Measure the ingest bitrate and size buffer chunks to a constant duration
+            self.bitrate_sample_bytes += chunk_size
+            sample_elapsed = now - self.bitrate_sample_start
+            if sample_elapsed >= ConfigHelper.bitrate_sample_interval():
+                self._update_ingest_bitrate(self.bitrate_sample_bytes / sample_elapsed)
+                self.bitrate_sample_bytes = 0
+                self.bitrate_sample_start = now
 
             # Only update Redis periodically to reduce overhead
-            now = time.time()
             if now - self.last_bytes_update >= self.bytes_update_interval:
                 if hasattr(self.buffer, 'redis_client') and self.buffer.redis_client:
                     # Update channel metadata with total bytes
@@ -941,6 +970,19 @@ class StreamManager:
         except Exception as e:
             logger.error(f"Error updating bytes processed: {e}")
 
+    def _update_ingest_bitrate(self, sample_rate):
+        """Fold a bitrate sample into the smoothed rate and resize buffer chunks to match"""
+        if self.ingest_bitrate:
+            self.ingest_bitrate = 0.7 * self.ingest_bitrate + 0.3 * sample_rate
+        else:
+            self.ingest_bitrate = sample_rate
+
+        target_duration = ConfigHelper.chunk_target_duration()
+        if target_duration > 0 and self.ingest_bitrate > 0:
+            if self.buffer.set_target_chunk_size(self.ingest_bitrate * target_duration):
+                logger.debug(f"Ingest for channel {self.channel_id} at {self.ingest_bitrate * 8 / 1000000:.2f} Mbps, "
+                             f"buffer chunks now {self.buffer.target_chunk_size} bytes")
+
     def _process_stream_data(self):
         """Process stream data until disconnect or error - unified path for both transcode and HTTP"""
         try:
@@ -1045,25 +1087,21 @@ class StreamManager:
         from apps.channels.models import Stream, Channel
         from django.db import connection
 
-        # Update stream profile if we're switching streams
-        if self.current_stream_id and stream_id and self.current_stream_id != stream_id:
+        # Move the channel's connection slot if we're switching streams. This is the only place a
+        # switch reserves a slot, so lookups that end up not switching leave the counts alone.
+        if self.current_stream_id and stream_id and self.current_stream_id != stream_id and m3u_profile_id:
             try:
                 # Get the channel by UUID
                 channel = Channel.objects.get(uuid=self.channel_id)
 
-                # Get stream to find its profile
-                #new_stream = Stream.objects.get(pk=stream_id)
-
-                # Use the new method to update the profile and manage connection counts
-                if m3u_profile_id:
-                    success = channel.update_stream_profile(m3u_profile_id)
-                    if success:
-                        logger.debug(f"Updated m3u profile for channel {self.channel_id} to use profile from stream {stream_id}")
-                    else:
-                        logger.warning(f"Failed to update stream profile for channel {self.channel_id}")
+                if not channel.switch_stream_slot(stream_id, m3u_profile_id):
+                    logger.warning(f"Not switching channel {self.channel_id} to stream {stream_id}: profile {m3u_profile_id} is full")
+                    return False
+                logger.debug(f"Moved channel {self.channel_id} to stream {stream_id} on m3u profile {m3u_profile_id}")
 
             except Exception as e:
-                logger.error(f"Error updating stream profile for channel {self.channel_id}: {e}")
+                logger.error(f"Error moving connection slot for channel {self.channel_id}: {e}")
+                return False
 
             finally:
                 # Always close database connection after profile update
@@ -1156,6 +1194,7 @@ class StreamManager:
                     if self.healthy:
                         logger.warning(f"Stream unhealthy for channel {self.channel_id} - no data for {inactivity_duration:.1f}s")
                         self.healthy = False
+                        self._record_health("stall")
 
                     consecutive_unhealthy_checks += 1
 
@@ -1439,6 +1478,10 @@ class StreamManager:
                 self.connected = False
                 return False
 
+            if self.first_byte_time is None:
+                self.first_byte_time = time.time()
+                self._record_health("success")
+
             # Track chunk size before adding to buffer
             chunk_size = len(chunk)
             self._update_bytes_processed(chunk_size)
@@ -1446,10 +1489,10 @@ class StreamManager:
             # Add directly to buffer without TS-specific processing
             success = self.buffer.add_chunk(chunk)
 
-            # Update last data timestamp in Redis if successful
-            if success and hasattr(self.buffer, 'redis_client') and self.buffer.redis_client:
-                last_data_key = RedisKeys.last_data(self.buffer.channel_id)
-                self.buffer.redis_client.set(last_data_key, str(time.time()), ex=60)
+            # Update last data timestamp in Redis if successful (throttled, and
+            # refreshed for free whenever the buffer flushes a chunk)
+            if success:
+                self.buffer.mark_data_received()
 
             return True
 
@@ -1464,6 +1507,27 @@ class StreamManager:
             logger.error(f"Error in fetch_chunk: {e}")
             return False
 
+    def _record_health(self, event):
+        """Record a connection outcome for the current stream and M3U profile in the health scoreboard"""
+        redis_client = getattr(self.buffer, 'redis_client', None)
+        if not redis_client or not self.current_stream_id:
+            return
+
+        try:
+            profile_id = redis_client.hget(RedisKeys.channel_metadata(self.channel_id), ChannelMetadataField.M3U_PROFILE)
+            profile_id = int(profile_id) if profile_id else None
+        except Exception:
+            profile_id = None
+
+        if event == "success":
+            connect_time = self.http_reader.connect_time if self.http_reader else None
+            first_byte_time = self.first_byte_time - self.attempt_start_time if self.attempt_start_time else None
+            StreamHealth.record_success(redis_client, self.current_stream_id, profile_id, connect_time, first_byte_time)
+        elif event == "failure":
+            StreamHealth.record_failure(redis_client, self.current_stream_id, profile_id)
+        elif event == "stall":
+            StreamHealth.record_stall(redis_client, self.current_stream_id, profile_id)
+
     def _set_waiting_for_clients(self):
         """Set channel state to waiting for clients AFTER buffer has enough chunks"""
         try:
@@ -1611,6 +1675,13 @@ class StreamManager:
                     logger.warning(f"All {len(alternate_streams)} alternate streams have been tried for channel {self.channel_id}")
                 return False
 
+            # Probe several alternates at once so dead providers don't each cost a full timeout
+            if self.parallel_probe_count > 1 and len(untried_streams) > 1:
+                untried_streams = self._probe_alternate_streams(untried_streams)
+                if not untried_streams:
+                    logger.error(f"No alternate stream passed its probe for channel {self.channel_id}")
+                    return False
+
             # IMPROVED: Try multiple streams until we find one with a different URL
             for next_stream in untried_streams:
                 stream_id = next_stream['stream_id']
@@ -1642,7 +1713,7 @@ class StreamManager:
                 logger.info(f"Switching from URL {self.url} to {new_url} for channel {self.channel_id}")
 
                 # IMPORTANT: Just update the URL, don't stop the channel or release resources
-                switch_result = self.update_url(new_url, stream_id, profile_id)
+                switch_result = self.update_url(new_url, stream_id, stream_info.get('m3u_profile_id', profile_id))
                 if not switch_result:
                     logger.error(f"Failed to update URL for stream ID {stream_id} for channel {self.channel_id}")
                     continue  # Try next stream
@@ -1681,6 +1752,97 @@ class StreamManager:
             logger.error(f"Error trying next stream for channel {self.channel_id}: {e}", exc_info=True)
             return False
 
+    def _probe_alternate_streams(self, untried_streams):
+        """
+        Probe alternate streams concurrently, in batches of parallel_probe_count, and
+        move the first one that answers with TS data to the front.
+
+        Each probe holds a connection slot on one of the stream's M3U profiles while it
+        runs. Streams that fail their probe are marked as tried and dropped; streams that
+        couldn't be probed (no plan entry or no free slot) keep their place so the regular
+        switch logic can still try them.
+
+        Returns:
+            list: The remaining untried streams in the order they should be tried
+        """
+        redis_client = getattr(self.buffer, 'redis_client', None)
+        plan = get_tune_plan(self.channel_id)
+        if not redis_client or not plan:
+            return untried_streams
+
+        candidates = {}
+        for stream_id, profile_id, max_streams in plan["candidates"]:
+            candidates.setdefault(stream_id, []).append((stream_id, profile_id, max_streams))
+
+        held_slots = {}  # stream_id -> profile_id of probe slots still reserved
+        slots_lock = threading.Lock()
+
+        def release(stream_id):
+            with slots_lock:
+                profile_id = held_slots.pop(stream_id, None)
+            if profile_id is not None:
+                try:
+                    release_profile_slot(redis_client, profile_id)
+                except Exception as e:
+                    logger.warning(f"Failed to release probe slot on profile {profile_id}: {e}")
+
+        def probe(stream_id):
+            slot = reserve_stream_slot(redis_client, None, candidates.get(stream_id, []), mode="probe")
+            if not slot:
+                return None, "no profile with free connections"
+
+            _, profile_id, reserved = slot
+            if reserved:
+                with slots_lock:
+                    held_slots[stream_id] = profile_id
+            try:
+                profile = plan["profiles"][str(profile_id)]
+                url = transform_url(plan["streams"][str(stream_id)], profile["search_pattern"], profile["replace_pattern"])
+                if url == self.url:
+                    return False, "same URL as the current stream"
+                return probe_stream_url(url, profile["user_agent"], self.probe_timeout)
+            finally:
+                release(stream_id)
+
+        failed = set()
+        winner = None
+        pending = [s for s in untried_streams if s['stream_id'] in candidates]
+
+        while pending and winner is None and self.running:
+            batch = pending[:self.parallel_probe_count]
+            pending = pending[self.parallel_probe_count:]
+            logger.info(f"Probing streams {[s['stream_id'] for s in batch]} for channel {self.channel_id}")
+
+            executor = ThreadPoolExecutor(max_workers=len(batch), thread_name_prefix=f"probe-{self.channel_id[:8]}")
+            futures = {executor.submit(probe, s['stream_id']): s for s in batch}
+            try:
+                for future in as_completed(futures, timeout=self.probe_timeout * 3):
+                    stream = futures[future]
+                    try:
+                        valid, message = future.result()
+                    except Exception as e:
+                        valid, message = False, str(e)
+
+                    if valid:
+                        logger.info(f"Stream {stream['stream_id']} passed its probe for channel {self.channel_id}: {message}")
+                        winner = stream
+                        break
+                    if valid is False:
+                        logger.info(f"Stream {stream['stream_id']} failed its probe for channel {self.channel_id}: {message}")
+                        failed.add(stream['stream_id'])
+                        self.tried_stream_ids.add(stream['stream_id'])
+            except FuturesTimeoutError:
+                logger.warning(f"Probes for channel {self.channel_id} did not finish within {self.probe_timeout * 3}s")
+            finally:
+                # Don't wait for the losers; their slots are given back now and their
+                # connections close when their own timeouts expire
+                executor.shutdown(wait=False, cancel_futures=True)
+                for stream in batch:
+                    release(stream['stream_id'])
+
+        remaining = [s for s in untried_streams if s['stream_id'] not in failed and s is not winner]
+        return [winner] + remaining if winner else remaining
+
     # Add a new helper method to safely reset the URL switching state
     def _reset_url_switching_state(self):
         """Safely reset the URL switching state if it gets stuck"""
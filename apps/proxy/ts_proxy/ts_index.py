@@ -0,0 +1,166 @@
+"""
+Lightweight MPEG-TS inspection for the stream buffer.
+
+Tracks the PAT/PMT of the ingested stream and finds random access points
+(keyframes) in completed buffer chunks, so new clients can join at a point
+where players can start decoding immediately.
+"""
+
+import re
+
+from .constants import TS_PACKET_SIZE, TS_SYNC_BYTE
+
+PAT_PID = 0x0000
+
+# Video stream_type values from the PMT, mapped to how their keyframes are recognised
+STREAM_TYPE_MPEG2 = "mpeg2"
+STREAM_TYPE_H264 = "h264"
+STREAM_TYPE_HEVC = "hevc"
+VIDEO_STREAM_TYPES = {
+    0x01: STREAM_TYPE_MPEG2,
+    0x02: STREAM_TYPE_MPEG2,
+    0x10: None,  # MPEG-4 part 2, random access indicator only
+    0x1B: STREAM_TYPE_H264,
+    0x24: STREAM_TYPE_HEVC,
+    0x42: None,  # AVS
+    0xEA: None,  # VC-1
+}
+
+# Maps the second header byte of a packet to 1 when payload_unit_start_indicator is set,
+# so candidate packets can be found without looping over every packet in Python
+_PUSI_TABLE = bytes(1 if b & 0x40 else 0 for b in range(256))
+
+
+class KeyframeIndexer:
+    """Finds keyframes in TS chunks and keeps the latest PAT/PMT packets"""
+
+    def __init__(self):
+        self.pat_packet = None
+        self.pmt_packets = {}  # PMT PID -> latest PMT packet
+        self.pmt_pids = set()
+        self.video_pids = {}  # PID -> codec (or None when only the RAI flag can be used)
+
+    @property
+    def psi(self):
+        """PAT followed by the PMT packets, or None until both have been seen"""
+        if not self.pat_packet or not self.pmt_packets:
+            return None
+        return self.pat_packet + b"".join(self.pmt_packets[pid] for pid in sorted(self.pmt_packets))
+
+    def scan(self, chunk):
+        """
+        Update PSI state from a packet-aligned chunk and return the byte offset of
+        the first keyframe in it, or None if it has none.
+        """
+        packet_count = len(chunk) // TS_PACKET_SIZE
+        if not packet_count or chunk[0] != TS_SYNC_BYTE:
+            return None
+
+        keyframe_offset = None
+        flags = chunk[1:packet_count * TS_PACKET_SIZE:TS_PACKET_SIZE].translate(_PUSI_TABLE)
+
+        for match in re.finditer(b"\x01", flags):
+            offset = match.start() * TS_PACKET_SIZE
+            packet = chunk[offset:offset + TS_PACKET_SIZE]
+            if packet[0] != TS_SYNC_BYTE:
+                continue
+
+            pid = ((packet[1] & 0x1F) << 8) | packet[2]
+            if pid == PAT_PID:
+                self._parse_pat(packet)
+            elif pid in self.pmt_pids:
+                self._parse_pmt(pid, packet)
+            elif keyframe_offset is None and pid in self.video_pids:
+                if self._is_keyframe(packet, self.video_pids[pid]):
+                    keyframe_offset = offset
+
+        return keyframe_offset
+
+    @staticmethod
+    def _payload_start(packet):
+        """Return the offset of the packet payload, or None if it has none"""
+        adaptation_field_control = (packet[3] >> 4) & 0x03
+        if not adaptation_field_control & 0x01:
+            return None
+        start = 4
+        if adaptation_field_control & 0x02:
+            start += 1 + packet[4]
+        return start if start < TS_PACKET_SIZE else None
+
+    @classmethod
+    def _section(cls, packet, table_id):
+        """Return (start, end) of a PSI section starting in this packet, or None"""
+        start = cls._payload_start(packet)
+        if start is None:
+            return None
+        section = start + 1 + packet[start]  # Skip the pointer field
+        if section + 12 > TS_PACKET_SIZE or packet[section] != table_id:
+            return None
+        section_length = ((packet[section + 1] & 0x0F) << 8) | packet[section + 2]
+        end = min(section + 3 + section_length - 4, TS_PACKET_SIZE)  # Exclude the CRC
+        return section, end
+
+    def _parse_pat(self, packet):
+        bounds = self._section(packet, 0x00)
+        if not bounds:
+            return
+        section, end = bounds
+
+        pmt_pids = set()
+        for i in range(section + 8, end - 3, 4):
+            program_number = (packet[i] << 8) | packet[i + 1]
+            if program_number != 0:  # Program 0 points at the NIT
+                pmt_pids.add(((packet[i + 2] & 0x1F) << 8) | packet[i + 3])
+
+        if pmt_pids != self.pmt_pids:
+            self.pmt_pids = pmt_pids
+            self.pmt_packets = {}
+            self.video_pids = {}
+        self.pat_packet = bytes(packet)
+
+    def _parse_pmt(self, pid, packet):
+        bounds = self._section(packet, 0x02)
+        if not bounds:
+            return
+        section, end = bounds
+
+        program_info_length = ((packet[section + 10] & 0x0F) << 8) | packet[section + 11]
+        i = section + 12 + program_info_length
+        while i + 5 <= end:
+            stream_type = packet[i]
+            elementary_pid = ((packet[i + 1] & 0x1F) << 8) | packet[i + 2]
+            es_info_length = ((packet[i + 3] & 0x0F) << 8) | packet[i + 4]
+            if stream_type in VIDEO_STREAM_TYPES:
+                self.video_pids[elementary_pid] = VIDEO_STREAM_TYPES[stream_type]
+            i += 5 + es_info_length
+
+        self.pmt_packets[pid] = bytes(packet)
+
+    def _is_keyframe(self, packet, codec):
+        """Check a PES start packet of a video PID for a random access point"""
+        adaptation_field_control = (packet[3] >> 4) & 0x03
+        # random_access_indicator in the adaptation field
+        if adaptation_field_control & 0x02 and packet[4] > 0 and packet[5] & 0x40:
+            return True
+
+        if codec is None:
+            return False
+
+        start = self._payload_start(packet)
+        if start is None or packet[start:start + 3] != b"\x00\x00\x01" or start + 9 > TS_PACKET_SIZE:
+            return False
+        es_start = start + 9 + packet[start + 8]  # Skip the PES header
+
+        # Look for a sequence header / parameter set / IDR NAL unit in this packet
+        position = packet.find(b"\x00\x00\x01", es_start)
+        while 0 <= position < TS_PACKET_SIZE - 4:
+            unit = packet[position + 3]
+            if codec == STREAM_TYPE_H264 and (unit & 0x1F) in (5, 7):
+                return True
+            # HEVC IRAP pictures (16-21) and VPS/SPS/PPS (32-34)
+            if codec == STREAM_TYPE_HEVC and ((unit >> 1) & 0x3F) in (16, 17, 18, 19, 20, 21, 32, 33, 34):
+                return True
+            if codec == STREAM_TYPE_MPEG2 and unit == 0xB3:
+                return True
+            position = packet.find(b"\x00\x00\x01", position + 3)
+        return False
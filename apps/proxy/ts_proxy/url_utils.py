@@ -6,9 +6,12 @@ import logging
 import re
 from typing import Optional, Tuple, List
 from django.shortcuts import get_object_or_404
-from apps.channels.models import Channel, Stream
+from apps.channels.models import Channel, Stream, reserve_stream_slot
+from apps.channels.tune_plan import get_tune_plan, reserve_from_plan
 from apps.m3u.models import M3UAccount, M3UAccountProfile
 from core.models import UserAgent, CoreSettings, StreamProfile
+from .constants import TS_PACKET_SIZE, TS_SYNC_BYTE
+from .stream_health import StreamHealth
 from .utils import get_logger
 from uuid import UUID
 import requests
@@ -35,6 +38,23 @@ def generate_stream_url(channel_id: str) -> Tuple[str, str, bool, Optional[int]]
         Tuple[str, str, bool, Optional[int]]: (stream_url, user_agent, transcode_flag, profile_id)
     """
     try:
+        # Channels tune from their cached plan, without database queries
+        plan = get_tune_plan(channel_id)
+        if plan:
+            stream_id, profile_id, error_reason = reserve_from_plan(plan)
+            if not stream_id or not profile_id:
+                logger.error(f"No stream available for channel {channel_id}: {error_reason}")
+                return None, None, False, None
+
+            stream_url = plan["streams"].get(str(stream_id))
+            m3u_profile = plan["profiles"].get(str(profile_id))
+            if stream_url is not None and m3u_profile:
+                stream_url = transform_url(stream_url, m3u_profile["search_pattern"], m3u_profile["replace_pattern"])
+                return stream_url, m3u_profile["user_agent"], plan["transcode"], plan["stream_profile_id"]
+
+            # The active stream predates the plan (e.g. it was removed from the channel), look it up below
+            logger.debug(f"Active stream {stream_id} for channel {channel_id} is not in its tune plan")
+
         channel_or_stream = get_stream_object(channel_id)
 
         # Handle direct stream preview (custom streams)
@@ -61,29 +81,16 @@ def generate_stream_url(channel_id: str) -> Tuple[str, str, bool, Optional[int]]
             # Check profiles in order: default first, then others
             profiles = [default_profile] + [obj for obj in m3u_profiles if not obj.is_default]
 
-            # Try to find an available profile with connection capacity
+            # Find the first profile with connection capacity in one atomic check
             redis_client = RedisClient.get_client()
-            selected_profile = None
-
-            for profile in profiles:
-                logger.info(profile)
-
-                # Check connection availability
-                if redis_client:
-                    profile_connections_key = f"profile_connections:{profile.id}"
-                    current_connections = int(redis_client.get(profile_connections_key) or 0)
+            selected_profile = profiles[0]
 
-                    # Check if profile has available slots (or unlimited connections)
-                    if profile.max_streams == 0 or current_connections < profile.max_streams:
-                        selected_profile = profile
-                        logger.debug(f"Selected profile {profile.id} with {current_connections}/{profile.max_streams} connections for stream preview")
-                        break
-                    else:
-                        logger.debug(f"Profile {profile.id} at max connections: {current_connections}/{profile.max_streams}")
-                else:
-                    # No Redis available, use first active profile
-                    selected_profile = profile
-                    break
+            if redis_client:
+                candidates = [(stream.id, profile.id, profile.max_streams) for profile in profiles]
+                result = reserve_stream_slot(redis_client, None, candidates, mode="check")
+                selected_profile = next((p for p in profiles if result and p.id == result[1]), None)
+                if selected_profile:
+                    logger.debug(f"Selected profile {selected_profile.id} for stream preview")
 
             if not selected_profile:
                 logger.error(f"No profiles available with connection capacity for M3U account {m3u_account.id}")
@@ -235,39 +242,17 @@ def get_stream_info_for_switch(channel_id: str, target_stream_id: Optional[int]
             # Check profiles in order: default first, then others
             profiles = [default_profile] + [obj for obj in m3u_profiles if not obj.is_default]
 
-            selected_profile = None
-            for profile in profiles:
-
-                # Check connection availability
-                if redis_client:
-                    profile_connections_key = f"profile_connections:{profile.id}"
-                    current_connections = int(redis_client.get(profile_connections_key) or 0)
-
-                    # Check if this channel is already using this profile
-                    channel_using_profile = False
-                    existing_stream_id = redis_client.get(f"channel_stream:{channel.id}")
-                    if existing_stream_id:
-                        # Decode bytes to string/int for proper Redis key lookup
-                        existing_stream_id = existing_stream_id.decode('utf-8')
-                        existing_profile_id = redis_client.get(f"stream_profile:{existing_stream_id}")
-                        if existing_profile_id and int(existing_profile_id.decode('utf-8')) == profile.id:
-                            channel_using_profile = True
-                            logger.debug(f"Channel {channel.id} already using profile {profile.id}")
-
-                    # Calculate effective connections (subtract 1 if channel already using this profile)
-                    effective_connections = current_connections - (1 if channel_using_profile else 0)
-
-                    # Check if profile has available slots
-                    if profile.max_streams == 0 or effective_connections < profile.max_streams:
-                        selected_profile = profile
-                        logger.debug(f"Selected profile {profile.id} with {effective_connections}/{profile.max_streams} effective connections (current: {current_connections}, already using: {channel_using_profile})")
-                        break
-                    else:
-                        logger.debug(f"Profile {profile.id} at max connections: {effective_connections}/{profile.max_streams} (current: {current_connections}, already using: {channel_using_profile})")
-                else:
-                    # No Redis available, assume first active profile is okay
-                    selected_profile = profile
-                    break
+            selected_profile = profiles[0]
+
+            if redis_client:
+                # Only check capacity here, counting the channel's own slot as free on its current
+                # profile. Callers may still drop this stream, so the slot is moved by
+                # StreamManager.update_url once the switch actually happens.
+                candidates = [(stream.id, profile.id, profile.max_streams) for profile in profiles]
+                result = reserve_stream_slot(redis_client, channel.id, candidates, mode="check")
+                selected_profile = next((p for p in profiles if result and p.id == result[1]), None)
+                if selected_profile:
+                    logger.debug(f"Selected profile {selected_profile.id} for stream {stream.id}")
 
             if not selected_profile:
                 return {'error': 'No profiles available with connection capacity'}
@@ -420,6 +405,14 @@ def get_alternate_streams(channel_id: str, current_stream_id: Optional[int] = No
                 logger.error(f"Error finding profiles for stream {stream.id}: {inner_e}")
                 continue
 
+        # Healthy streams first, keeping the channel's order among them
+        alternate_streams = StreamHealth.order_candidates(
+            redis_client,
+            alternate_streams,
+            stream_key=lambda s: s['stream_id'],
+            profile_key=lambda s: s['profile_id'],
+        )
+
         if alternate_streams:
             stream_ids = ', '.join([str(s['stream_id']) for s in alternate_streams])
             logger.info(f"Found {len(alternate_streams)} alternate streams with available connections for channel {channel_id}: [{stream_ids}]")
@@ -557,6 +550,62 @@ def validate_stream_url(url, user_agent=None, timeout=(5, 5)):
         if 'session' in locals():
             session.close()
 
+def has_ts_sync(data: bytes, packets: int = 3) -> bool:
+    """Check whether data contains consecutive MPEG-TS packets (sync byte every 188 bytes)"""
+    for offset in range(min(TS_PACKET_SIZE, len(data) - TS_PACKET_SIZE * (packets - 1))):
+        if all(data[offset + i * TS_PACKET_SIZE] == TS_SYNC_BYTE for i in range(packets)):
+            return True
+    return False
+
+def probe_stream_url(url, user_agent=None, timeout=3):
+    """
+    Quickly check that a URL is serving a stream, for failover between alternates.
+
+    Unlike validate_stream_url this always reads the start of the body and requires
+    MPEG-TS sync bytes (or an HLS playlist), so providers that answer with an HTTP 200
+    but never send media are rejected.
+
+    Args:
+        url (str): The URL to probe
+        user_agent (str): User agent to use for the request
+        timeout (float): Connection and read timeout in seconds
+
+    Returns:
+        tuple: (is_valid, message)
+    """
+    if url.startswith(('udp://', 'rtp://', 'rtsp://')):
+        return True, "Non-HTTP protocol (UDP/RTP/RTSP) - probe skipped"
+
+    try:
+        with requests.get(
+            url,
+            headers={'User-Agent': user_agent, 'Connection': 'close'},
+            stream=True,
+            timeout=timeout,
+            allow_redirects=True
+        ) as response:
+            if not (200 <= response.status_code < 300):
+                return False, f"Invalid HTTP status: {response.status_code}"
+
+            data = b''
+            for chunk in response.iter_content(chunk_size=TS_PACKET_SIZE * 8):
+                data += chunk
+                if data.lstrip().startswith(b'#EXTM3U'):
+                    return True, "HLS playlist"
+                if has_ts_sync(data):
+                    return True, f"TS sync found in first {len(data)} bytes"
+                if len(data) >= TS_PACKET_SIZE * 64:
+                    break
+
+            return False, f"No TS sync in first {len(data)} bytes"
+
+    except requests.exceptions.Timeout:
+        return False, "Timeout"
+    except requests.exceptions.RequestException as e:
+        return False, f"Request error: {str(e)}"
+    except Exception as e:
+        return False, f"Probe error: {str(e)}"
+
 def get_connections_left(m3u_profile_id: int) -> int:
     """
     Get the number of available connections left for an M3U profile.
@@ -10,6 +10,7 @@ from django.shortcuts import get_object_or_404
 from apps.proxy.config import TSConfig as Config
 from .server import ProxyServer
 from .channel_status import ChannelStatus
+from .stream_health import StreamHealth
 from .stream_generator import create_stream_generator
 from .utils import get_client_ip
 from .redis_keys import RedisKeys
@@ -568,6 +569,7 @@ def change_stream(request, channel_id):
         new_url = data.get("url")
         user_agent = data.get("user_agent")
         stream_id = data.get("stream_id")
+        m3u_profile_id = None
 
         # If stream_id is provided, get the URL and user_agent from it
         if stream_id:
@@ -711,6 +713,26 @@ def channel_status(request, channel_id=None):
         return JsonResponse({"error": str(e)}, status=500)
 
 
+@api_view(["GET"])
+@permission_classes([IsAdmin])
+def stream_health(request):
+    """
+    Returns the rolling health statistics and score of every recently used stream
+    and M3U profile, least healthy first.
+    """
+    proxy_server = ProxyServer.get_instance()
+
+    try:
+        if not proxy_server.redis_client:
+            return JsonResponse({"error": "Redis connection not available"}, status=500)
+
+        return JsonResponse(StreamHealth.scoreboard(proxy_server.redis_client))
+
+    except Exception as e:
+        logger.error(f"Error in stream_health: {e}", exc_info=True)
+        return JsonResponse({"error": str(e)}, status=500)
+
+
 @csrf_exempt
 @api_view(["POST", "DELETE"])
 @permission_classes([IsAdmin])
@@ -885,6 +907,7 @@ def next_stream(request, channel_id):
             stream_info["url"],
             stream_info["user_agent"],
             next_stream_id,  # Pass the stream_id to be stored in Redis
+            stream_info.get("m3u_profile_id"),
         )
 
         if result.get("status") == "error":
@@ -914,3 +937,27 @@ def next_stream(request, channel_id):
     except Exception as e:
         logger.error(f"Failed to switch to next stream: {e}", exc_info=True)
         return JsonResponse({"error": str(e)}, status=500)
+
+
+@api_view(["GET"])
+@permission_classes([IsAdmin])
+def cluster_nodes(request):
+    """
+    Returns the proxy nodes sharing this Redis, with their workers' load and
+    whether each node is still heartbeating.
+    """
+    proxy_server = ProxyServer.get_instance()
+
+    try:
+        if not proxy_server.redis_client:
+            return JsonResponse({"error": "Redis connection not available"}, status=500)
+
+        return JsonResponse({
+            "node_id": proxy_server.cluster.node_id,
+            "worker_id": proxy_server.worker_id,
+            "nodes": proxy_server.cluster.get_nodes(),
+        })
+
+    except Exception as e:
+        logger.error(f"Error in cluster_nodes: {e}", exc_info=True)
+        return JsonResponse({"error": str(e)}, status=500)
@@ -224,6 +224,10 @@ CELERY_BEAT_SCHEDULE = {
         "task": "apps.channels.tasks.maintain_recurring_recordings",
         "schedule": 3600.0,  # Once an hour ensure recurring schedules stay ahead
     },
+    "refresh-epg-now-next": {
+        "task": "apps.epg.tasks.refresh_epg_now_next",
+        "schedule": 300.0,  # Keep cached on-air/next programmes ahead of the clock (NOW_NEXT_INTERVAL)
+    },
 }
 
 MEDIA_ROOT = BASE_DIR / "media"
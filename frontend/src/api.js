@@ -17,6 +17,9 @@ const host = import.meta.env.DEV
   ? `http://${window.location.hostname}:5656`
   : '';
 
+// Channels per EPG grid request
+const GRID_PAGE_SIZE = 500;
+
 const errorNotification = (message, error) => {
   let errorMessage = '';
 
@@ -1210,9 +1213,18 @@ export default class API {
 
   static async getGrid() {
     try {
-      const response = await request(`${host}/api/epg/grid/`);
+      // Fetch the grid a page of channels at a time so large lineups don't tie up one request
+      let programs = [];
+      let offset = 0;
+      while (offset !== null) {
+        const response = await request(
+          `${host}/api/epg/grid/?channel_offset=${offset}&channel_limit=${GRID_PAGE_SIZE}`
+        );
+        programs = programs.concat(response.data);
+        offset = response.next_offset ?? null;
+      }
 
-      return response.data;
+      return programs;
     } catch (e) {
       errorNotification('Failed to retrieve program grid', e);
     }